@@ -0,0 +1,79 @@
+"""Add usage rollup tables
+
+Revision ID: b7d41e9a2c53
+Revises: 8f3b2c1d9e47
+Create Date: 2025-07-28 14:32:07.512934
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d41e9a2c53"
+down_revision: Union[str, None] = "8f3b2c1d9e47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = {"usage_hourly": "hour", "usage_daily": "day"}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, precision in ROLLUP_TABLES.items():
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("period", sa.DateTime(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("model", sa.String(), nullable=False),
+            sa.Column("endpoint", sa.String(), nullable=False),
+            sa.Column("requests", sa.Integer(), nullable=False),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+            sa.Column("completion_tokens", sa.Float(), nullable=False),
+            sa.Column("total_tokens", sa.Integer(), nullable=False),
+            sa.Column("cost", sa.Float(), nullable=False),
+            sa.Column("kgco2eq_min", sa.Float(), nullable=False),
+            sa.Column("kgco2eq_max", sa.Float(), nullable=False),
+            sa.Column("kgco2eq_count", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("user_id", "period", "model", "endpoint", name=f"unique_{table}_per_period"),
+        )
+
+        # backfill the rollups with the existing usage records
+        connection = op.get_bind()
+        connection.execute(
+            sa.text(
+                f"""
+                INSERT INTO {table} (
+                    period, user_id, model, endpoint, requests, prompt_tokens, completion_tokens, total_tokens, cost, kgco2eq_min, kgco2eq_max, kgco2eq_count
+                )
+                SELECT
+                    date_trunc('{precision}', datetime),
+                    user_id,
+                    model,
+                    endpoint,
+                    COUNT(*),
+                    COALESCE(SUM(prompt_tokens), 0),
+                    COALESCE(SUM(completion_tokens), 0),
+                    COALESCE(SUM(total_tokens), 0),
+                    COALESCE(SUM(cost), 0),
+                    COALESCE(SUM(kgco2eq_min) FILTER (WHERE kgco2eq_min IS NOT NULL AND kgco2eq_max IS NOT NULL), 0),
+                    COALESCE(SUM(kgco2eq_max) FILTER (WHERE kgco2eq_min IS NOT NULL AND kgco2eq_max IS NOT NULL), 0),
+                    COUNT(*) FILTER (WHERE kgco2eq_min IS NOT NULL AND kgco2eq_max IS NOT NULL)
+                FROM usage
+                WHERE user_id IS NOT NULL AND model IS NOT NULL
+                GROUP BY 1, 2, 3, 4
+                """
+            )
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ROLLUP_TABLES:
+        op.drop_table(table)
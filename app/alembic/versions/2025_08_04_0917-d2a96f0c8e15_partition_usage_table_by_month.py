@@ -0,0 +1,72 @@
+"""Partition usage table by month
+
+Revision ID: d2a96f0c8e15
+Revises: b7d41e9a2c53
+Create Date: 2025-08-04 09:17:51.306722
+
+"""
+
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d2a96f0c8e15"
+down_revision: Union[str, None] = "b7d41e9a2c53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS_AHEAD = 2  # next partitions are then created by the API
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the partitioned table replaces the usage table, which keeps its id sequence
+    op.execute("ALTER TABLE usage RENAME TO usage_old")
+    op.execute("ALTER INDEX usage_pkey RENAME TO usage_old_pkey")
+    op.execute("CREATE TABLE usage (LIKE usage_old INCLUDING DEFAULTS) PARTITION BY RANGE (datetime)")
+    op.execute("ALTER SEQUENCE usage_id_seq OWNED BY usage.id")
+    op.create_primary_key("usage_pkey", "usage", ["id", "datetime"])
+    op.create_foreign_key("usage_user_id_fkey", "usage", "user", ["user_id"], ["id"], ondelete="CASCADE")
+    op.create_foreign_key("usage_token_id_fkey", "usage", "token", ["token_id"], ["id"], ondelete="SET NULL")
+    op.create_index(
+        "ix_usage_user_id_datetime",
+        "usage",
+        ["user_id", "datetime"],
+        postgresql_include=["model", "cost", "total_tokens", "kgco2eq_min", "kgco2eq_max"],
+    )
+
+    # one partition per month, from the first usage record to the next months
+    connection = op.get_bind()
+    first = connection.execute(sa.text("SELECT MIN(datetime) FROM usage_old")).scalar() or datetime.now()
+    month, last = _add_months(first.date(), 0), _add_months(date.today(), PARTITIONS_AHEAD)
+    while month <= last:
+        op.execute(f"CREATE TABLE usage_{month:%Y_%m} PARTITION OF usage FOR VALUES FROM ('{month}') TO ('{_add_months(month, 1)}')")
+        month = _add_months(month, 1)
+    # records outside of the monthly partitions, until the partition of their month is created by the API
+    op.execute("CREATE TABLE usage_default PARTITION OF usage DEFAULT")
+
+    op.execute("INSERT INTO usage SELECT * FROM usage_old")
+    op.drop_table("usage_old")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE usage RENAME TO usage_partitioned")
+    op.execute("ALTER INDEX usage_pkey RENAME TO usage_partitioned_pkey")
+    op.execute("CREATE TABLE usage (LIKE usage_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER SEQUENCE usage_id_seq OWNED BY usage.id")
+    op.create_primary_key("usage_pkey", "usage", ["id"])
+    op.create_foreign_key("usage_user_id_fkey", "usage", "user", ["user_id"], ["id"], ondelete="CASCADE")
+    op.create_foreign_key("usage_token_id_fkey", "usage", "token", ["token_id"], ["id"], ondelete="SET NULL")
+
+    op.execute("INSERT INTO usage SELECT * FROM usage_partitioned")
+    op.drop_table("usage_partitioned")  # partitions are dropped with the partitioned table
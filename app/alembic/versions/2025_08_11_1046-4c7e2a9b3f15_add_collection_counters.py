@@ -0,0 +1,43 @@
+"""Add collection counters
+
+Revision ID: 4c7e2a9b3f15
+Revises: d2a96f0c8e15
+Create Date: 2025-08-11 10:46:03.517284
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4c7e2a9b3f15"
+down_revision: Union[str, None] = "d2a96f0c8e15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("collection", sa.Column("documents_count", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("collection", sa.Column("chunks_count", sa.Integer(), server_default="0", nullable=False))
+    # chunks of the existing documents are stored in the vector store only, they are counted by the repair of the counters at API startup
+    op.add_column("document", sa.Column("chunks_count", sa.Integer(), nullable=True))
+
+    op.execute(
+        """
+        UPDATE collection
+        SET documents_count = counts.documents_count
+        FROM (SELECT collection_id, COUNT(*) AS documents_count FROM document GROUP BY collection_id) AS counts
+        WHERE collection.id = counts.collection_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("document", "chunks_count")
+    op.drop_column("collection", "chunks_count")
+    op.drop_column("collection", "documents_count")
@@ -14,6 +14,7 @@ from urllib.parse import urljoin
 from coredis import ConnectionPool, Redis
 from fastapi import HTTPException
 import httpx
+import orjson
 
 from app.schemas.core.configuration import ModelProviderType
 from app.schemas.core.metric import Metric
@@ -73,6 +74,8 @@ class BaseModelClient(ABC):
         self.max_context_length = None
         self.redis = Redis(connection_pool=redis)
         self.metrics_retention_ms = metrics_retention_ms
+        self.batcher = None  # optional embeddings micro-batcher, set at API start up
+        self.active_requests = 0  # number of in-flight requests, used by load aware routing strategies
 
         self.headers = {"Authorization": f"Bearer {self.key}"} if self.key else {}
 
@@ -245,10 +248,11 @@ class BaseModelClient(ABC):
 
         content_type = response.headers.get("Content-Type", "")
         if content_type == "application/json":
-            data = response.json()
+            # single decoding and encoding pass with orjson, response content can be large (embeddings)
+            data = orjson.loads(response.content)
             data.update(self._get_additional_data(json=json, data=data, stream=False, request_latency=request_latency))
             data.update(additional_data)
-            response = httpx.Response(status_code=response.status_code, content=dumps(data))
+            response = httpx.Response(status_code=response.status_code, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
 
         return response
 
@@ -268,32 +272,48 @@ class BaseModelClient(ABC):
         except Exception as e:
             logger.error(f"Failed to log request metrics in redis ts {latency_ts_key}: {e}", exc_info=True)
 
-    async def forward_request(
+    @staticmethod
+    def _parse_error_message(message: Any) -> Any:
+        """
+        Parse the error message of a model API (some backends return the error as a Python dict representation). Only short strings which
+        look like a dict or a list are evaluated, to keep the error path cheap.
+
+        Args:
+            message(Any): The error message.
+
+        Returns:
+            Any: The parsed error message, or the original message if it can't be parsed.
+        """
+        if not isinstance(message, str) or len(message) > 4096 or not message.lstrip().startswith(("{", "[")):
+            return message
+
+        try:
+            return ast.literal_eval(message)
+        except Exception:
+            return message
+
+    async def send_request(
         self,
         method: str,
+        url: str,
         json: Optional[dict] = None,
         files: Optional[dict] = None,
         data: Optional[dict] = None,
-        additional_data: Dict[str, Any] = None,
-    ) -> httpx.Response:
+    ) -> Tuple[httpx.Response, float]:
         """
-        Forward a request to a client model and add model name to the response. Optionally, add additional data to the response.
+        Send a formatted request to the client model and raise an HTTPException if the request fails. The latency of the request is logged in
+        the performance metrics of the provider, once by request sent to the provider (a batched request is logged once).
 
         Args:
             method(str): The method to use for the request.
+            url(str): The url of the request.
             json(Optional[dict]): The JSON body to use for the request.
             files(Optional[dict]): The files to use for the request.
             data(Optional[dict]): The data to use for the request.
-            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
 
         Returns:
-            httpx.Response: The response from the API.
+            tuple: The raw response from the API and the request latency in seconds.
         """
-
-        url, json, files, data = self._format_request(json=json, files=files, data=data)
-        if not additional_data:
-            additional_data = {}
-
         async with httpx.AsyncClient(timeout=self.timeout) as async_client:
             try:
                 start_time = time.perf_counter()
@@ -308,20 +328,15 @@ class BaseModelClient(ABC):
                 response.raise_for_status()
             except httpx.HTTPStatusError:
                 try:
-                    message = loads(response.text)  # format error message
-                    if "message" in message:
-                        try:
-                            message = ast.literal_eval(message["message"])
-                        except Exception:
-                            message = message["message"]
-                except JSONDecodeError:
+                    message = orjson.loads(response.content)  # format error message
+                    if isinstance(message, dict) and "message" in message:
+                        message = self._parse_error_message(message=message["message"])
+                except orjson.JSONDecodeError:
                     logger.debug(traceback.format_exc())
                     message = response.text
                 raise HTTPException(status_code=response.status_code, detail=message)
 
-        # add additional data to the response
         request_latency = end_time - start_time
-        response = self._format_response(json=json, response=response, additional_data=additional_data, request_latency=request_latency)
         asyncio.create_task(
             self._log_performance_metric(
                 metric=Metric(
@@ -333,6 +348,47 @@ class BaseModelClient(ABC):
             )
         )
 
+        return response, request_latency
+
+    async def forward_request(
+        self,
+        method: str,
+        json: Optional[dict] = None,
+        files: Optional[dict] = None,
+        data: Optional[dict] = None,
+        additional_data: Dict[str, Any] = None,
+    ) -> httpx.Response:
+        """
+        Forward a request to a client model and add model name to the response. Optionally, add additional data to the response.
+
+        Args:
+            method(str): The method to use for the request.
+            json(Optional[dict]): The JSON body to use for the request.
+            files(Optional[dict]): The files to use for the request.
+            data(Optional[dict]): The data to use for the request.
+            additional_data(Dict[str, Any]): The additional data to add to the response (default: {}).
+
+        Returns:
+            httpx.Response: The response from the API.
+        """
+
+        url, json, files, data = self._format_request(json=json, files=files, data=data)
+        if not additional_data:
+            additional_data = {}
+
+        self.active_requests += 1
+        try:
+            if self.batcher is not None and self.endpoint == ENDPOINT__EMBEDDINGS and json and not files and not data:
+                # coalesce concurrent embeddings requests, the response only contains the embeddings of this request
+                response, request_latency = await self.batcher(client=self, url=url, json=json)
+            else:
+                response, request_latency = await self.send_request(method=method, url=url, json=json, files=files, data=data)
+        finally:
+            self.active_requests -= 1
+
+        # add additional data to the response, the request latency of a batched request being the share of this request
+        response = self._format_response(json=json, response=response, additional_data=additional_data, request_latency=request_latency)
+
         return response
 
     def _format_stream_response(
@@ -409,87 +465,88 @@ class BaseModelClient(ABC):
 
         url, json, files, data = self._format_request(json=json, files=files, data=data)
 
-        async with httpx.AsyncClient(timeout=self.timeout) as async_client:
-            try:
-                async with async_client.stream(method=method, url=url, headers=self.headers, json=json, files=files, data=data) as response:
-                    buffer = list()
-                    start_time = time.perf_counter()
-                    first_token_time = None
-                    async for chunk in response.aiter_raw():
-                        # error case
-                        if response.status_code // 100 != 2:
-                            chunks = loads(chunk.decode(encoding="utf-8"))
-                            if "message" in chunks:
-                                try:
-                                    chunks["message"] = ast.literal_eval(chunks["message"])
-                                except Exception:
-                                    pass
-                            chunk = dumps(chunks).encode(encoding="utf-8")
-                            yield chunk, response.status_code
-                        # normal case
-                        else:
-                            match = re.search(rb"data: \[DONE\]", chunk)
-                            if not match:
-                                buffer.append(chunk)
-                                if first_token_time is None:
-                                    try:
-                                        # The first token comes in the first non-empty chunk of the stream
-                                        if loads((chunk.decode(encoding="utf-8")).removeprefix("data: "))["choices"][0]["delta"]["content"] != "":
-                                            first_token_time = time.perf_counter()
-                                    except Exception as e:
-                                        logger.debug("Chunk data could not be processed to compute time to first token")
-
+        self.active_requests += 1
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout) as async_client:
+                try:
+                    async with async_client.stream(method=method, url=url, headers=self.headers, json=json, files=files, data=data) as response:
+                        buffer = list()
+                        start_time = time.perf_counter()
+                        first_token_time = None
+                        async for chunk in response.aiter_raw():
+                            # error case
+                            if response.status_code // 100 != 2:
+                                chunks = loads(chunk.decode(encoding="utf-8"))
+                                if "message" in chunks:
+                                    chunks["message"] = self._parse_error_message(message=chunks["message"])
+                                chunk = dumps(chunks).encode(encoding="utf-8")
                                 yield chunk, response.status_code
-
-                            # end of the stream
+                            # normal case
                             else:
-                                last_chunks = chunk[: match.start()]
-                                done_chunk = chunk[match.start() :]
+                                match = re.search(rb"data: \[DONE\]", chunk)
+                                if not match:
+                                    buffer.append(chunk)
+                                    if first_token_time is None:
+                                        try:
+                                            # The first token comes in the first non-empty chunk of the stream
+                                            if loads((chunk.decode(encoding="utf-8")).removeprefix("data: "))["choices"][0]["delta"]["content"] != "":
+                                                first_token_time = time.perf_counter()
+                                        except Exception as e:
+                                            logger.debug("Chunk data could not be processed to compute time to first token")
 
-                                # Edge case: the stream consists in just one group of chunks
-                                if first_token_time is None and last_chunks != "" and len(buffer) == 0:
-                                    first_token_time = time.perf_counter()
-
-                                buffer.append(last_chunks)
+                                    yield chunk, response.status_code
 
-                                end_time = time.perf_counter()
-                                request_latency = end_time - start_time
-                                if first_token_time is not None:
-                                    request_time_to_first_token = first_token_time - start_time
+                                # end of the stream
                                 else:
-                                    logger.warning(f"Time to first token could not be determined for request {request_context.get().id}.")
-
-                                extra_chunk = self._format_stream_response(
-                                    json=json,
-                                    response=buffer,
-                                    additional_data=additional_data,
-                                    request_latency=request_latency,
-                                )
-                                asyncio.create_task(
-                                    self._log_performance_metric(
-                                        Metric(
-                                            timestamp=datetime.now(),
-                                            time_to_first_token_us=int(request_time_to_first_token * 1_000_000)
-                                            if first_token_time is not None
-                                            else None,
-                                            latency_ms=int(request_latency * 1_000),
-                                            model_name=self.name,
-                                            provider_url=self.url,
+                                    last_chunks = chunk[: match.start()]
+                                    done_chunk = chunk[match.start() :]
+
+                                    # Edge case: the stream consists in just one group of chunks
+                                    if first_token_time is None and last_chunks != "" and len(buffer) == 0:
+                                        first_token_time = time.perf_counter()
+
+                                    buffer.append(last_chunks)
+
+                                    end_time = time.perf_counter()
+                                    request_latency = end_time - start_time
+                                    if first_token_time is not None:
+                                        request_time_to_first_token = first_token_time - start_time
+                                    else:
+                                        logger.warning(f"Time to first token could not be determined for request {request_context.get().id}.")
+
+                                    extra_chunk = self._format_stream_response(
+                                        json=json,
+                                        response=buffer,
+                                        additional_data=additional_data,
+                                        request_latency=request_latency,
+                                    )
+                                    asyncio.create_task(
+                                        self._log_performance_metric(
+                                            Metric(
+                                                timestamp=datetime.now(),
+                                                time_to_first_token_us=int(request_time_to_first_token * 1_000_000)
+                                                if first_token_time is not None
+                                                else None,
+                                                latency_ms=int(request_latency * 1_000),
+                                                model_name=self.name,
+                                                provider_url=self.url,
+                                            )
                                         )
                                     )
-                                )
-
-                                # if error case, yield chunk
-                                if extra_chunk is None:
-                                    yield chunk, response.status_code
-                                    continue
-
-                                yield last_chunks, response.status_code
-                                yield f"data: {dumps(extra_chunk)}\n\n".encode(), response.status_code
-                                yield done_chunk, response.status_code
 
-            except (httpx.TimeoutException, httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout, httpx.PoolTimeout) as e:
-                yield dumps({"detail": "Request timed out, model is too busy."}).encode(), 504
-            except Exception as e:
-                logger.error(traceback.format_exc())
-                yield dumps({"detail": type(e).__name__}).encode(), 500
+                                    # if error case, yield chunk
+                                    if extra_chunk is None:
+                                        yield chunk, response.status_code
+                                        continue
+
+                                    yield last_chunks, response.status_code
+                                    yield f"data: {dumps(extra_chunk)}\n\n".encode(), response.status_code
+                                    yield done_chunk, response.status_code
+
+                except (httpx.TimeoutException, httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout, httpx.PoolTimeout) as e:
+                    yield dumps({"detail": "Request timed out, model is too busy."}).encode(), 504
+                except Exception as e:
+                    logger.error(traceback.format_exc())
+                    yield dumps({"detail": type(e).__name__}).encode(), 500
+        finally:
+            self.active_requests -= 1
@@ -1,9 +1,9 @@
-from json import dumps
 from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urljoin
 
 from coredis import ConnectionPool
 import httpx
+import orjson
 import requests
 
 from app.utils.variables import (
@@ -137,11 +137,11 @@ class TeiModelClient(BaseModelClient):
 
         content_type = response.headers.get("Content-Type", "")
         if content_type == "application/json":
-            data = response.json()
+            data = orjson.loads(response.content)
             if isinstance(data, list):  # for TEI reranking
                 data = {"data": data}
             data.update(self._get_additional_data(json=json, data=data, stream=False, request_latency=request_latency))
             data.update(additional_data)
-            response = httpx.Response(status_code=response.status_code, content=dumps(data))
+            response = httpx.Response(status_code=response.status_code, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
 
         return response
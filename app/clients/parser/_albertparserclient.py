@@ -1,13 +1,13 @@
-from io import BytesIO
+import asyncio
 import json
 from typing import Dict, Optional
 
 from fastapi import HTTPException
 import httpx
-import pymupdf
 
 from app.schemas.core.documents import FileType, ParserParams
 from app.schemas.parse import ParsedDocument
+from app.utils.files import open_pdf
 
 from ._baseparserclient import BaseParserClient
 
@@ -34,11 +34,8 @@ class AlbertParserClient(BaseParserClient):
             raise Exception(f"Albert API is not reachable: {e}") from e
 
     async def parse(self, params: ParserParams) -> ParsedDocument:
-        file_content = await params.file.read()
-
         try:
-            # Correct way to open PDF from bytes with PyMuPDF
-            pdf = pymupdf.open(stream=file_content, filetype="pdf")
+            pdf = await asyncio.to_thread(open_pdf, file=params.file.file)
         except Exception as e:
             # Handle corrupted or invalid PDF files
             raise HTTPException(status_code=400, detail=f"Invalid PDF file: {str(e)}")
@@ -51,7 +48,8 @@ class AlbertParserClient(BaseParserClient):
         }
 
         async with httpx.AsyncClient() as client:
-            files = {"file": (params.file.filename, BytesIO(file_content), "application/pdf")}
+            await params.file.seek(0)
+            files = {"file": (params.file.filename, params.file.file, "application/pdf")}  # streamed in the multipart body
             response = await client.post(
                 url=f"{self.URL}/v1/parse-beta",
                 files=files,
@@ -1,5 +1,7 @@
+import asyncio
 from io import BytesIO
 import json
+import re
 from typing import Dict, List
 
 from fastapi import HTTPException
@@ -7,7 +9,8 @@ import httpx
 import pymupdf
 
 from app.schemas.core.documents import FileType, ParserParams
-from app.schemas.parse import ParsedDocument, ParsedDocumentMetadata, ParsedDocumentPage
+from app.schemas.parse import ParsedDocument, ParsedDocumentMetadata, ParsedDocumentOutputFormat, ParsedDocumentPage
+from app.utils.files import open_pdf
 
 from ._baseparserclient import BaseParserClient
 
@@ -15,14 +18,21 @@ from ._baseparserclient import BaseParserClient
 class MarkerParserClient(BaseParserClient):
     """
     Class to interact with the Marker PDF API for document analysis.
+
+    Pages are sent by batches of contiguous pages (only the pages of the batch are uploaded), and batches are sent concurrently.
     """
 
     SUPPORTED_FORMATS = [FileType.PDF]
+    PAGE_SEPARATOR = "-" * 48
+    PAGE_PATTERN = re.compile(r"\n*\{(\d+)\}" + PAGE_SEPARATOR + r"\n*")
+    IMAGE_PAGE_PATTERN = re.compile(r"_page_(\d+)_")
 
-    def __init__(self, url: str, headers: Dict[str, str], timeout: int, *args, **kwargs) -> None:
+    def __init__(self, url: str, headers: Dict[str, str], timeout: int, batch_size: int = 10, max_concurrency: int = 4, *args, **kwargs) -> None:  # fmt: off
         self.url = url
         self.headers = headers
         self.timeout = timeout
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
 
         # Keep health check synchronous in __init__
         try:
@@ -49,49 +59,125 @@ class MarkerParserClient(BaseParserClient):
 
         return pages
 
-    async def parse(self, params: ParserParams) -> ParsedDocument:
-        file_content = await params.file.read()
+    def get_batches(self, pages: List[int]) -> List[List[int]]:
+        """
+        Split pages in batches of contiguous pages, with at most `batch_size` pages per batch.
 
+        Args:
+            pages(List[int]): The sorted page numbers to parse.
+
+        Returns:
+            List[List[int]]: The batches of pages.
+        """
+        batches = []
+        for page in pages:
+            if batches and batches[-1][-1] == page - 1 and len(batches[-1]) < self.batch_size:
+                batches[-1].append(page)
+            else:
+                batches.append([page])
+
+        return batches
+
+    async def parse(self, params: ParserParams) -> ParsedDocument:
         try:
-            # Correct way to open PDF from bytes with PyMuPDF
-            pdf = pymupdf.open(stream=file_content, filetype="pdf")
+            pdf = await asyncio.to_thread(open_pdf, file=params.file.file)
         except Exception as e:
             # Handle corrupted or invalid PDF files
             raise HTTPException(status_code=400, detail=f"Invalid PDF file: {str(e)}")
 
-        data = []
+        pages = self.convert_page_range(page_range=params.page_range, page_count=pdf.page_count)
+        pages = sorted(page for page in pages if 0 <= page < pdf.page_count)
+
+        # only paginated markdown output can be split back into pages, other formats are parsed page by page
+        if params.output_format == ParsedDocumentOutputFormat.MARKDOWN:
+            batches = self.get_batches(pages=pages)
+        else:
+            batches = [[page] for page in pages]
+
+        semaphore = asyncio.Semaphore(value=self.max_concurrency)
+        pdf_lock = asyncio.Lock()  # a PyMuPDF document can't be read by several threads at once
+        try:
+            async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout) as client:
+
+                async def parse_batch(batch: List[int]) -> List[ParsedDocumentPage]:
+                    async with semaphore:
+                        async with pdf_lock:
+                            file_content = await asyncio.to_thread(self._extract_pages, pdf=pdf, batch=batch)
+                        return await self._parse_batch(client=client, params=params, file_content=file_content, batch=batch)
+
+                # the first failure cancels the other batches, before the client and the PDF document are closed
+                async with asyncio.TaskGroup() as group:
+                    tasks = [group.create_task(parse_batch(batch=batch)) for batch in batches]
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
+        finally:
+            # Close the PDF document to free memory
+            pdf.close()
+
+        document = ParsedDocument(data=[page for task in tasks for page in task.result()])
+
+        return document
+
+    @staticmethod
+    def _extract_pages(pdf: pymupdf.Document, batch: List[int]) -> bytes:
+        # upload only the pages of the batch, built when the batch is sent to bound memory usage
+        document = pymupdf.open()
+        document.insert_pdf(pdf, from_page=batch[0], to_page=batch[-1])
+        file_content = document.tobytes()
+        document.close()
+
+        return file_content
+
+    async def _parse_batch(self, client: httpx.AsyncClient, params: ParserParams, file_content: bytes, batch: List[int]) -> List[ParsedDocumentPage]:  # fmt: off
+        split = params.output_format == ParsedDocumentOutputFormat.MARKDOWN  # paginated output is split back into pages
         payload = {
             "output_format": params.output_format.value,
             "force_ocr": params.force_ocr,
-            "paginate_output": params.paginate_output,
+            "paginate_output": True if split else params.paginate_output,
             "use_llm": params.use_llm,
+            "page_range": f"0-{len(batch) - 1}",
         }
-        pages = self.convert_page_range(page_range=params.page_range, page_count=pdf.page_count)
-        async with httpx.AsyncClient() as client:
-            for i in pages:
-                # Create a fresh BytesIO object for each request to avoid stream consumption issues
-                files = {"file": (params.file.filename, BytesIO(file_content), "application/pdf")}
-                payload["page_range"] = str(i)
-
-                response = await client.post(
-                    url=f"{self.url}/marker/upload",
-                    files=files,
-                    data=payload,
-                    headers=self.headers,
-                    timeout=self.timeout,
-                )
-                if response.status_code != 200:
-                    raise HTTPException(status_code=response.status_code, detail=json.loads(response.text).get("detail", "Parsing failed."))
-
-                result = response.json()
-                if not result.get("success", False):
-                    raise HTTPException(status_code=500, detail=result.get("error", "Parsing failed."))
-
-                metadata = ParsedDocumentMetadata(document_name=params.file.filename, page=i)
-                data.append(ParsedDocumentPage(content=result["output"], images=result["images"], metadata=metadata))
-
-        # Close the PDF document to free memory
-        pdf.close()
-        document = ParsedDocument(data=data)
+        files = {"file": (params.file.filename, BytesIO(file_content), "application/pdf")}
 
-        return document
+        response = await client.post(url=f"{self.url}/marker/upload", files=files, data=payload)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=json.loads(response.text).get("detail", "Parsing failed."))
+
+        result = response.json()
+        if not result.get("success", False):
+            raise HTTPException(status_code=500, detail=result.get("error", "Parsing failed."))
+
+        if not split:
+            metadata = ParsedDocumentMetadata(document_name=params.file.filename, page=batch[0])
+            return [ParsedDocumentPage(content=result["output"], images=result["images"], metadata=metadata)]
+
+        contents = self._split_pages(output=result["output"], page_count=len(batch))
+        images = [{} for _ in batch]
+        for name, image in result["images"].items():
+            match = self.IMAGE_PAGE_PATTERN.search(name)
+            index = int(match.group(1)) if match and int(match.group(1)) < len(batch) else 0
+            images[index][name] = image
+
+        data = []
+        for index, page in enumerate(batch):
+            content = contents[index]
+            if params.paginate_output:
+                content = "\n\n{" + str(page) + "}" + self.PAGE_SEPARATOR + "\n\n" + content
+            metadata = ParsedDocumentMetadata(document_name=params.file.filename, page=page)
+            data.append(ParsedDocumentPage(content=content, images=images[index], metadata=metadata))
+
+        return data
+
+    def _split_pages(self, output: str, page_count: int) -> List[str]:
+        # paginated output: "\n\n{page_id}------------------------------------------------\n\n" before each page
+        parts = self.PAGE_PATTERN.split(output)
+        if len(parts) == 1:  # not paginated
+            return [output] + [""] * (page_count - 1)
+
+        contents = [""] * page_count
+        for page_id, content in zip(parts[1::2], parts[2::2]):
+            page_id = int(page_id)
+            if page_id < page_count:
+                contents[page_id] += content.strip()
+
+        return contents
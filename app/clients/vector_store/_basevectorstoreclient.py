@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 import importlib
-from typing import List, Optional, Type
+from typing import Dict, List, Optional, Type
 
 from app.schemas.chunks import Chunk
 from app.schemas.core.configuration import VectorStoreType
@@ -49,8 +49,8 @@ class BaseVectorStoreClient(ABC):
         """Return the list of existing collection identifiers."""
 
     @abstractmethod
-    async def get_chunk_count(self, collection_id: int, document_id: int) -> Optional[int]:
-        """Return the number of chunks for *document_id* inside *collection_id* (or *None* if unavailable)."""
+    async def get_chunk_counts(self, collection_id: int, document_ids: List[int]) -> Dict[int, int]:
+        """Return the number of chunks of each of *document_ids* inside *collection_id* in one call (empty if unavailable)."""
 
     @abstractmethod
     async def delete_document(self, collection_id: int, document_id: int) -> None:
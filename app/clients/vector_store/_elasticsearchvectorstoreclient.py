@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from elasticsearch import AsyncElasticsearch, helpers
 
@@ -59,13 +59,20 @@ class ElasticsearchVectorStoreClient(BaseVectorStoreClient, AsyncElasticsearch):
         collections = await self.indices.get_alias()
         return [int(collection) for collection in collections]
 
-    async def get_chunk_count(self, collection_id: int, document_id: int) -> Optional[int]:
+    async def get_chunk_counts(self, collection_id: int, document_ids: List[int]) -> Dict[int, int]:
+        # one terms aggregation counts the chunks of all the documents
+        body = {
+            "size": 0,
+            "query": {"terms": {"metadata.document_id": document_ids}},
+            "aggs": {"documents": {"terms": {"field": "metadata.document_id", "size": len(document_ids)}}},
+        }
         try:
-            body = {"query": {"match": {"metadata.document_id": document_id}}}
-            result = await AsyncElasticsearch.count(self, index=str(collection_id), body=body)
-            return result["count"]
+            result = await AsyncElasticsearch.search(self, index=str(collection_id), body=body)
         except Exception:
-            return None
+            return {}
+
+        counts = {int(bucket["key"]): bucket["doc_count"] for bucket in result["aggregations"]["documents"]["buckets"]}
+        return {document_id: counts.get(document_id, 0) for document_id in document_ids}
 
     async def delete_document(self, collection_id: int, document_id: int) -> None:
         body = {"query": {"match": {"metadata.document_id": document_id}}}
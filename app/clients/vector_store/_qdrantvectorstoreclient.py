@@ -1,5 +1,6 @@
+import asyncio
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import uuid4
 
 from qdrant_client import AsyncQdrantClient
@@ -27,6 +28,7 @@ logger = logging.getLogger(__name__)
 
 class QdrantVectorStoreClient(BaseVectorStoreClient, AsyncQdrantClient):
     default_method = SearchMethod.SEMANTIC
+    MAX_CONCURRENT_COUNTS = 10
 
     def __init__(self, *args, **kwargs):
         kwargs.pop("type")  # remove type from kwargs to avoid passing it to the super class
@@ -58,16 +60,22 @@ class QdrantVectorStoreClient(BaseVectorStoreClient, AsyncQdrantClient):
         collections = await AsyncQdrantClient.get_collections(self)
         return [int(collection.name) for collection in collections.collections]
 
-    async def get_chunk_count(self, collection_id: int, document_id: int) -> Optional[int]:
+    async def get_chunk_counts(self, collection_id: int, document_ids: List[int]) -> Dict[int, int]:
+        # the facet API is not available with this client version, the counts are sent concurrently over the connection pool
+        semaphore = asyncio.Semaphore(value=self.MAX_CONCURRENT_COUNTS)
+
+        async def count(document_id: int) -> int:
+            count_filter = Filter(must=[FieldCondition(key="metadata.document_id", match=MatchValue(value=document_id))])
+            async with semaphore:
+                result = await AsyncQdrantClient.count(self, collection_name=str(collection_id), count_filter=count_filter, exact=True)
+            return result.count
+
         try:
-            chunks_count = await AsyncQdrantClient.count(
-                self,
-                collection_name=str(collection_id),
-                count_filter=Filter(must=[FieldCondition(key="metadata.document_id", match=MatchAny(any=[document_id]))]),
-            )
-            return chunks_count.count
-        except ResponseHandlingException as e:
-            return None
+            counts = await asyncio.gather(*[count(document_id=document_id) for document_id in document_ids])
+        except ResponseHandlingException:
+            return {}
+
+        return dict(zip(document_ids, counts))
 
     async def delete_document(self, collection_id: int, document_id: int) -> None:
         doc_filter = Filter(must=[FieldCondition(key="metadata.document_id", match=MatchAny(any=[document_id]))])
@@ -1,7 +1,10 @@
+from typing import Union
+
 from fastapi import APIRouter, Request, Security
 from fastapi.responses import JSONResponse
 
 from app.helpers._accesscontroller import AccessController
+from app.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
 from app.schemas.agents import AgentsChatCompletion, AgentsChatCompletionRequest, AgentsTools
 from app.utils.context import global_context
 from app.utils.variables import ENDPOINT__AGENTS_COMPLETIONS, ENDPOINT__AGENTS_TOOLS
@@ -10,11 +13,16 @@ router = APIRouter()
 
 
 @router.post(path=ENDPOINT__AGENTS_COMPLETIONS, dependencies=[Security(dependency=AccessController())], response_model=AgentsChatCompletion)
-async def agents_completions(request: Request, body: AgentsChatCompletionRequest) -> JSONResponse:
+async def agents_completions(request: Request, body: AgentsChatCompletionRequest) -> Union[JSONResponse, StreamingResponseWithStatusCode]:
     """
     Creates a model response for the given chat conversation with call to the MCP bridge.
+
+    With `stream`, the response of the model is streamed and the tool calls are sent as `tool_call` server-sent events (started and finished).
     """
 
+    if body.stream:
+        return StreamingResponseWithStatusCode(content=global_context.agent_manager.get_completion_stream(body), media_type="text/event-stream")
+
     response = await global_context.agent_manager.get_completion(body)
 
     return JSONResponse(status_code=response.status_code, content=response.json())
@@ -1,20 +1,29 @@
-from typing import List, Literal, Union
+import asyncio
+import io
+import re
+from typing import BinaryIO, List, Literal, Tuple, Union
+import wave
 
 from fastapi import APIRouter, File, Request, Security, UploadFile
 from fastapi.responses import JSONResponse, PlainTextResponse
+import numpy as np
 
 from app.helpers._accesscontroller import AccessController
+from app.helpers.models.routers import ModelRouter
 from app.schemas.audio import (
     AudioTranscription,
     AudioTranscriptionLanguage,
     AudioTranscriptionLanguageForm,
+    AudioTranscriptionLongAudioForm,
     AudioTranscriptionModelForm,
     AudioTranscriptionPromptForm,
     AudioTranscriptionResponseFormatForm,
     AudioTranscriptionTemperatureForm,
     AudioTranscriptionTimestampGranularitiesForm,
 )
+from app.utils.configuration import configuration
 from app.utils.context import global_context
+from app.utils.exceptions import FileSizeLimitExceededException
 from app.utils.variables import ENDPOINT__AUDIO_TRANSCRIPTIONS
 
 router = APIRouter()
@@ -30,6 +39,7 @@ async def audio_transcriptions(
     response_format: Literal["json", "text"] = AudioTranscriptionResponseFormatForm,
     temperature: float = AudioTranscriptionTemperatureForm,
     timestamp_granularities: List[str] = AudioTranscriptionTimestampGranularitiesForm,
+    long_audio: bool = AudioTranscriptionLongAudioForm,
 ) -> JSONResponse | PlainTextResponse:
     """
     Transcribes audio into the input language.
@@ -39,7 +49,10 @@ async def audio_transcriptions(
     # @TODO: Implement timestamp_granularities
     # @TODO: Implement verbose response format
 
-    file_content = await file.read()
+    # check file size
+    if file.size > configuration.settings.audio_max_file_size:
+        raise FileSizeLimitExceededException(detail=f"File size limit exceeded (max: {configuration.settings.audio_max_file_size} bytes).")
+
     model = global_context.model_registry(model=model)
     client = model.get_client(endpoint=ENDPOINT__AUDIO_TRANSCRIPTIONS)
     payload = {
@@ -51,9 +64,177 @@ async def audio_transcriptions(
     if language != "":
         payload["language"] = language.value
 
-    response = await client.forward_request(method="POST", files={"file": (file.filename, file_content, file.content_type)}, data=payload)
+    segments = []
+    if long_audio:
+        try:
+            segments = await asyncio.to_thread(
+                _split_audio,
+                file=file.file,
+                duration=configuration.settings.audio_segment_duration,
+                overlap=configuration.settings.audio_segment_overlap,
+            )
+        except (wave.Error, EOFError, ValueError):  # not a PCM WAV file, transcribed in one request
+            segments = []
+
+    if len(segments) > 1:
+        transcription = await _transcribe_segments(model=model, file=file.file, segments=segments, filename=file.filename, payload=payload)
+        if response_format == "text":
+            return PlainTextResponse(content=transcription["text"])
+
+        return JSONResponse(content=AudioTranscription(**transcription).model_dump(), status_code=200)
+
+    # the spooled file is streamed in the multipart body of the request, instead of being read in memory
+    await file.seek(0)
+    response = await client.forward_request(method="POST", files={"file": (file.filename, file.file, file.content_type)}, data=payload)
 
     if response_format == "text":
         return PlainTextResponse(content=response.text)
 
     return JSONResponse(content=AudioTranscription(**response.json()).model_dump(), status_code=response.status_code)
+
+
+def _split_audio(file: BinaryIO, duration: float, overlap: float) -> List[Tuple[int, int]]:
+    """
+    Split a PCM WAV audio into overlapping segments of about `duration` seconds, each segment being cut at the most silent moment (lowest
+    energy over 100 ms) of its last quarter.
+
+    Args:
+        file(BinaryIO): The WAV audio file.
+        duration(float): The duration of the segments in seconds.
+        overlap(float): The overlap between consecutive segments in seconds.
+
+    Returns:
+        List[Tuple[int, int]]: The first and last (excluded) frames of each segment, read from the file by `_read_segment` when transcribed.
+    """
+    file.seek(0)
+    with wave.open(file) as audio:
+        params = audio.getparams()
+        dtypes = {1: np.uint8, 2: np.int16, 4: np.int32}
+        if params.sampwidth not in dtypes:
+            raise ValueError(f"Unsupported sample width: {params.sampwidth}.")
+
+        window_size = max(int(params.framerate * 0.1), 1)
+        energy, frame_count = _get_energy(audio=audio, dtype=dtypes[params.sampwidth], window_size=window_size)
+
+    segment_size, overlap_size = int(duration * params.framerate), int(overlap * params.framerate)
+    segments, start = [], 0
+    while frame_count - start > segment_size:
+        target = start + segment_size
+        first, last = (target - segment_size // 4) // window_size, target // window_size
+        end = (first + int(np.argmin(energy[first:last]))) * window_size + window_size // 2 if last > first else target
+        segments.append((start, end))
+        start = max(end - overlap_size, (start + end) // 2)
+    segments.append((start, frame_count))
+
+    return segments
+
+
+def _read_segment(file: BinaryIO, start: int, end: int) -> Tuple[float, bytes]:
+    """
+    Read a segment of a PCM WAV audio.
+
+    Args:
+        file(BinaryIO): The WAV audio file.
+        start(int): The first frame of the segment.
+        end(int): The last frame (excluded) of the segment.
+
+    Returns:
+        Tuple[float, bytes]: The start time in seconds and the WAV audio of the segment.
+    """
+    file.seek(0)
+    with wave.open(file) as audio:
+        params = audio.getparams()
+        audio.setpos(start)
+        output = io.BytesIO()
+        with wave.open(output, "wb") as segment:
+            segment.setparams(params)
+            segment.writeframes(audio.readframes(end - start))
+
+    return start / params.framerate, output.getvalue()
+
+
+def _get_energy(audio: wave.Wave_read, dtype: type, window_size: int, chunk_size: int = 100) -> Tuple[np.ndarray, int]:
+    """
+    Compute the energy (root mean square) of each window of `window_size` frames of an audio. The audio is read by chunks of `chunk_size`
+    windows, so that only one chunk of the audio is decoded in memory at a time.
+
+    Returns:
+        Tuple[np.ndarray, int]: The energy of each complete window and the number of frames of the audio.
+    """
+    frame_width = audio.getsampwidth() * audio.getnchannels()
+    energies, frame_count = [], 0
+    while frames := audio.readframes(window_size * chunk_size):
+        samples = np.frombuffer(frames[: len(frames) // frame_width * frame_width], dtype=dtype).reshape(-1, audio.getnchannels())
+        frame_count += len(samples)
+        samples = samples.mean(axis=1, dtype=np.float32)
+        if dtype is np.uint8:  # 8 bits samples are unsigned
+            samples -= 128
+
+        # chunks are made of complete windows, only the last chunk of the audio may end with an incomplete window, which is ignored
+        window_count = len(samples) // window_size
+        energies.append(np.sqrt(np.mean(samples[: window_count * window_size].reshape(window_count, window_size) ** 2, axis=1)))
+
+    return (np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)), frame_count
+
+
+async def _transcribe_segments(model: ModelRouter, file: BinaryIO, segments: List[Tuple[int, int]], filename: str, payload: dict) -> dict:
+    """
+    Transcribe the segments of an audio concurrently, each segment request gets its own model client so that segments are distributed between
+    the model providers. Each segment is read from the file when it is transcribed, so that at most `audio_max_concurrency` segments are held
+    in memory. The transcriptions are merged, the text repeated in the overlap between consecutive segments being removed, and the
+    timestamps of the segments of the transcriptions are shifted by the start time of the audio segment.
+    """
+    semaphore = asyncio.Semaphore(value=configuration.settings.audio_max_concurrency)
+    lock = asyncio.Lock()  # segments are read from the same file handle
+
+    async def transcribe(start: int, end: int) -> Tuple[float, dict]:
+        async with semaphore:
+            async with lock:
+                offset, content = await asyncio.to_thread(_read_segment, file=file, start=start, end=end)
+            client = model.get_client(endpoint=ENDPOINT__AUDIO_TRANSCRIPTIONS)
+            # verbose format returns the timestamped segments of the transcription, needed to stitch the segments of the audio
+            data = payload | {"model": client.name, "response_format": "verbose_json"}
+            response = await client.forward_request(method="POST", files={"file": (filename, content, "audio/wav")}, data=data)
+            return offset, response.json()
+
+    # the first failure cancels the transcription of the other segments
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(transcribe(start=start, end=end)) for start, end in segments]
+    except ExceptionGroup as e:
+        raise e.exceptions[0]
+
+    transcription = {"text": "", "segments": []}
+    for task in tasks:
+        offset, result = task.result()
+        transcription["text"] = _merge_texts(previous=transcription["text"], next=result.get("text", ""))
+        if result.get("language") is not None:
+            transcription.setdefault("language", result["language"])
+        if result.get("duration") is not None:
+            transcription["duration"] = offset + result["duration"]
+
+        end = transcription["segments"][-1]["end"] if transcription["segments"] else 0
+        for segment in result.get("segments") or []:
+            segment = segment | {"start": segment["start"] + offset, "end": segment["end"] + offset}
+            if segment["start"] >= end:  # segments of the overlap are already transcribed
+                transcription["segments"].append(segment | {"id": len(transcription["segments"])})
+
+    return transcription
+
+
+def _merge_texts(previous: str, next: str, max_words: int = 20) -> str:
+    """Append a text to the previous one, without the words at the start of the text which repeat the words at the end of the previous one."""
+    previous, next = previous.strip(), next.strip()
+    if not previous or not next:
+        return previous or next
+
+    def normalize(words: List[str]) -> List[str]:
+        return [re.sub(r"\W", "", word.lower()) for word in words]
+
+    previous_words, next_words = previous.split(), next.split()
+    normalized_previous, normalized_next = normalize(previous_words[-max_words:]), normalize(next_words[:max_words])
+    for size in range(min(len(normalized_previous), len(normalized_next)), 0, -1):
+        if normalized_previous[-size:] == normalized_next[:size]:
+            return " ".join([previous] + next_words[size:])
+
+    return f"{previous} {next}"
@@ -1,7 +1,8 @@
 from typing import List, Tuple, Union
 
-from fastapi import APIRouter, Request, Security, Depends
+from fastapi import APIRouter, Depends, Request, Response, Security
 from fastapi.responses import JSONResponse
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers._accesscontroller import AccessController
@@ -18,7 +19,7 @@ router = APIRouter()
 
 
 @router.post(path=ENDPOINT__CHAT_COMPLETIONS, dependencies=[Security(dependency=AccessController())], status_code=200, response_model=Union[ChatCompletion, ChatCompletionChunk])  # fmt: off
-async def chat_completions(request: Request, body: ChatCompletionRequest, session: AsyncSession = Depends(get_db_session)) -> Union[JSONResponse, StreamingResponseWithStatusCode]:  # fmt: off
+async def chat_completions(request: Request, body: ChatCompletionRequest, session: AsyncSession = Depends(get_db_session)) -> Union[JSONResponse, Response, StreamingResponseWithStatusCode]:  # fmt: off
     """Creates a model response for the given chat conversation.
 
     **Important**: any others parameters are authorized, depending on the model backend. For example, if model is support by vLLM backend, additional
@@ -69,15 +70,30 @@ async def chat_completions(request: Request, body: ChatCompletionRequest, sessio
 
     # select client
     model = global_context.model_registry(model=body["model"])
-    client = model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
+    client = model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=body)
+
+    # response cache (search results are not cached)
+    cache, cache_key, cached = global_context.response_cache if not results else None, None, None
+    if cache:
+        cache_key = cache.get_key(endpoint=ENDPOINT__CHAT_COMPLETIONS, model=model.name, body=body, cache_control=request.headers.get("Cache-Control"))  # fmt: off
+        cached = await cache.get(key=cache_key) if cache_key else None
 
     # not stream case
     if not body["stream"]:
+        if cached:
+            return JSONResponse(content=cached, status_code=200)
+
         response = await client.forward_request(method="POST", json=body, additional_data=additional_data)
-        return JSONResponse(content=response.json(), status_code=response.status_code)
+        if cache_key:
+            await cache.set(key=cache_key, value=orjson.loads(response.content))
+
+        return Response(content=response.content, status_code=response.status_code, media_type="application/json")
 
     # stream case
-    return StreamingResponseWithStatusCode(
-        content=client.forward_stream(method="POST", json=body, additional_data=additional_data),
-        media_type="text/event-stream",
-    )
+    if cached:
+        content = cache.replay(events=cached)
+    else:
+        content = client.forward_stream(method="POST", json=body, additional_data=additional_data)
+        content = cache.tee(key=cache_key, stream=content) if cache_key else content
+
+    return StreamingResponseWithStatusCode(content=content, media_type="text/event-stream")
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from fastapi import APIRouter, Body, Depends, Path, Query, Request, Response, Security
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -7,6 +9,7 @@ from app.schemas.collections import Collection, CollectionRequest, Collections,
 from app.utils.context import global_context, request_context
 from app.sql.session import get_db_session
 from app.utils.exceptions import CollectionNotFoundException
+from app.utils.pagination import get_next_cursor
 from app.utils.variables import ENDPOINT__COLLECTIONS
 
 router = APIRouter()
@@ -63,6 +66,7 @@ async def get_collections(
     request: Request,
     offset: int = Query(default=0, ge=0, description="The offset of the collections to get."),
     limit: int = Query(default=10, ge=1, le=100, description="The limit of the collections to get."),
+    cursor: Optional[str] = Query(default=None, description="The cursor returned with the previous page, the offset is ignored."),
     session: AsyncSession = Depends(get_db_session),
 ) -> JSONResponse:
     """
@@ -77,9 +81,12 @@ async def get_collections(
             include_public=True,
             offset=offset,
             limit=limit,
+            cursor=cursor,
         )
 
-    return JSONResponse(status_code=200, content=Collections(data=data).model_dump())
+    next_cursor = get_next_cursor(data=data, limit=limit)
+
+    return JSONResponse(status_code=200, content=Collections(data=data, next_cursor=next_cursor).model_dump())
 
 
 @router.delete(path=ENDPOINT__COLLECTIONS + "/{collection}", dependencies=[Security(dependency=AccessController())], status_code=204)
@@ -16,7 +16,19 @@ async def completions(request: Request, body: CompletionRequest) -> JSONResponse
     """
 
     model = global_context.model_registry(model=body.model)
-    client = model.get_client(endpoint=ENDPOINT__COMPLETIONS)
-    response = await client.forward_request(method="POST", json=body.model_dump())
+    body = body.model_dump()
+    client = model.get_client(endpoint=ENDPOINT__COMPLETIONS, body=body)
+
+    # response cache
+    cache, cache_key = global_context.response_cache, None
+    if cache:
+        cache_key = cache.get_key(endpoint=ENDPOINT__COMPLETIONS, model=model.name, body=body, cache_control=request.headers.get("Cache-Control"))
+        cached = await cache.get(key=cache_key) if cache_key else None
+        if cached:
+            return JSONResponse(content=Completions(**cached).model_dump(), status_code=200)
+
+    response = await client.forward_request(method="POST", json=body)
+    if cache_key:
+        await cache.set(key=cache_key, value=response.json())
 
     return JSONResponse(content=Completions(**response.json()).model_dump(), status_code=response.status_code)
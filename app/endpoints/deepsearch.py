@@ -1,23 +1,27 @@
 import logging
+from typing import AsyncIterator, List, Tuple, Union
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Security
 from fastapi.responses import JSONResponse
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers._accesscontroller import AccessController
 from app.helpers._deepsearch import DeepSearchAgent
+from app.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
 from app.helpers._websearchmanager import WebSearchManager
-from app.schemas.deepsearch import DeepSearchMetadata, DeepSearchRequest, DeepSearchResponse
+from app.schemas.deepsearch import DeepSearchEvent, DeepSearchMetadata, DeepSearchRequest, DeepSearchResponse
 from app.schemas.usage import Usage
 from app.sql.session import get_db as get_session
-from app.utils.context import global_context, request_context
+from app.utils.configuration import configuration
+from app.utils.context import global_context
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.post(path="/deepsearch", dependencies=[Security(dependency=AccessController())], status_code=200, response_model=DeepSearchResponse)
-async def deepsearch(request: Request, body: DeepSearchRequest, session: AsyncSession = Depends(get_session)) -> JSONResponse:
+async def deepsearch(request: Request, body: DeepSearchRequest, session: AsyncSession = Depends(get_session)) -> Union[JSONResponse, StreamingResponseWithStatusCode]:  # fmt: off
     """
     Perform an in-depth web search and generate a comprehensive answer.
 
@@ -34,6 +38,8 @@ async def deepsearch(request: Request, body: DeepSearchRequest, session: AsyncSe
     - True (default): use domains configured in config.yml
     - False: allow all domains (no restrictions)
     - [list]: only use the domains specified in the list
+
+    With 'stream', the progress of the deep search is sent as server-sent events, the final response being streamed as it is generated.
     """
 
     try:
@@ -63,6 +69,13 @@ async def deepsearch(request: Request, body: DeepSearchRequest, session: AsyncSe
                 query_model=model,
                 limited_domains=[],
                 user_agent=getattr(web_search_manager, "user_agent", None),
+                max_concurrency=web_search_manager.max_concurrency,
+                max_concurrency_per_host=web_search_manager.max_concurrency_per_host,
+                timeout=web_search_manager.timeout,
+                max_size=web_search_manager.max_size,
+                cache=web_search_manager.cache,
+                cache_ttl=web_search_manager.cache_ttl,
+                cache_negative_ttl=web_search_manager.cache_negative_ttl,
             )
         elif isinstance(body.limited_domains, list):
             logger.info(f"Creating WebSearchManager with custom domains: {len(body.limited_domains)} domains")
@@ -71,34 +84,33 @@ async def deepsearch(request: Request, body: DeepSearchRequest, session: AsyncSe
                 query_model=model,
                 limited_domains=body.limited_domains,
                 user_agent=getattr(web_search_manager, "user_agent", None),
+                max_concurrency=web_search_manager.max_concurrency,
+                max_concurrency_per_host=web_search_manager.max_concurrency_per_host,
+                timeout=web_search_manager.timeout,
+                max_size=web_search_manager.max_size,
+                cache=web_search_manager.cache,
+                cache_ttl=web_search_manager.cache_ttl,
+                cache_negative_ttl=web_search_manager.cache_negative_ttl,
             )
 
-        deepsearch_agent = DeepSearchAgent(model=model, web_search_manager=web_search_manager)
+        deepsearch_agent = DeepSearchAgent(
+            model=model,
+            web_search_manager=web_search_manager,
+            max_concurrency=configuration.settings.search_deepsearch_max_concurrency,
+            timeout=configuration.settings.search_deepsearch_timeout,
+            max_tokens=configuration.settings.search_deepsearch_max_tokens,
+        )
 
         logger.info(f"Starting DeepSearch with model: {body.model} for prompt: {body.prompt[:100]}...")
 
+        if body.stream:
+            return StreamingResponseWithStatusCode(content=_stream_events(agent=deepsearch_agent, body=body, session=session), media_type="text/event-stream")  # fmt: off
+
         final_response, sources, metadata = await deepsearch_agent.deep_search(
             prompt=body.prompt, session=session, k=body.k, iteration_limit=body.iteration_limit, num_queries=body.num_queries, lang=body.lang
         )
+        result = _get_result(body=body, final_response=final_response, sources=sources, metadata=metadata)
 
-        metadata["model_used"] = body.model
-
-        deep_search_metadata = DeepSearchMetadata(**metadata)
-        usage = Usage(
-            prompt_tokens=metadata["total_input_tokens"],
-            completion_tokens=metadata["total_output_tokens"],
-            total_tokens=metadata["total_input_tokens"] + metadata["total_output_tokens"],
-        )
-
-        ctx = request_context.get()
-        if ctx and ctx.usage:
-            ctx.usage.prompt_tokens += usage.prompt_tokens
-            ctx.usage.completion_tokens += usage.completion_tokens
-            ctx.usage.total_tokens += usage.total_tokens
-
-        result = DeepSearchResponse(prompt=body.prompt, response=final_response, sources=sources, metadata=deep_search_metadata, usage=usage)
-
-        logger.info(f"DeepSearch completed with {body.model}: {len(sources)} sources, {metadata["elapsed_time"]:.2f}s, {usage.total_tokens} tokens")
         return JSONResponse(content=result.model_dump(), status_code=200)
 
     except HTTPException:
@@ -106,3 +118,39 @@ async def deepsearch(request: Request, body: DeepSearchRequest, session: AsyncSe
     except Exception as e:
         logger.error(f"DeepSearch failed for prompt '{body.prompt}' with model '{body.model}': {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Deep search failed: {str(e)}")
+
+
+def _get_result(body: DeepSearchRequest, final_response: str, sources: List[str], metadata: dict) -> DeepSearchResponse:
+    metadata["model_used"] = body.model
+
+    deep_search_metadata = DeepSearchMetadata(**metadata)
+    # usage of the model calls of the deep search, already added to the usage of the request context by the model client
+    usage = Usage(
+        prompt_tokens=metadata["total_input_tokens"],
+        completion_tokens=metadata["total_output_tokens"],
+        total_tokens=metadata["total_input_tokens"] + metadata["total_output_tokens"],
+    )
+
+    result = DeepSearchResponse(prompt=body.prompt, response=final_response, sources=sources, metadata=deep_search_metadata, usage=usage)
+
+    logger.info(f"DeepSearch completed with {body.model}: {len(sources)} sources, {metadata["elapsed_time"]:.2f}s, {usage.total_tokens} tokens")
+    return result
+
+
+async def _stream_events(agent: DeepSearchAgent, body: DeepSearchRequest, session: AsyncSession) -> AsyncIterator[Tuple[bytes, int]]:
+    try:
+        events = agent.deep_search_stream(
+            prompt=body.prompt, session=session, k=body.k, iteration_limit=body.iteration_limit, num_queries=body.num_queries, lang=body.lang
+        )
+        async for event in events:
+            if event["type"] == "done":
+                result = _get_result(body=body, final_response=event["response"], sources=event["sources"], metadata=event["metadata"])
+                yield b"data: " + orjson.dumps(result.model_dump()) + b"\n\n", 200
+            else:
+                yield b"data: " + orjson.dumps(DeepSearchEvent(**event).model_dump(exclude_none=True)) + b"\n\n", 200
+    except Exception as e:
+        logger.error(f"DeepSearch failed for prompt '{body.prompt}' with model '{body.model}': {str(e)}", exc_info=True)
+        yield orjson.dumps({"detail": f"Deep search failed: {str(e)}"}), 500
+        return
+
+    yield b"data: [DONE]\n\n", 200
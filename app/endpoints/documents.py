@@ -35,6 +35,7 @@ from app.schemas.parse import (
 from app.utils.context import global_context, request_context
 from app.sql.session import get_db_session
 from app.utils.exceptions import CollectionNotFoundException, DocumentNotFoundException, FileSizeLimitExceededException, InvalidJSONFormatException
+from app.utils.pagination import get_next_cursor
 from app.utils.variables import ENDPOINT__DOCUMENTS
 
 router = APIRouter()
@@ -75,14 +76,12 @@ async def create_document(
     if not global_context.document_manager:  # no vector store available
         raise CollectionNotFoundException()
 
-    file_size = len(file.file.read())
-    if file_size > FileSizeLimitExceededException.MAX_CONTENT_SIZE:
+    if file.size > FileSizeLimitExceededException.MAX_CONTENT_SIZE:
         raise FileSizeLimitExceededException()
-    file.file.seek(0)  # reset file pointer to the beginning of the file
 
     length_function = len if length_function == "len" else length_function
 
-    document = await global_context.document_manager.parse_file(
+    pages = global_context.document_manager.parse_file_pages(
         file=file,
         paginate_output=paginate_output,
         page_range=page_range,
@@ -94,7 +93,7 @@ async def create_document(
         user_id=request_context.get().user_id,
         session=session,
         collection_id=collection,
-        document=document,
+        document=pages,
         chunker=chunker,
         chunk_size=chunk_size,
         chunk_min_size=chunk_min_size,
@@ -137,6 +136,7 @@ async def get_documents(
     collection: Optional[int] = Query(default=None, description="Filter documents by collection ID"),
     limit: Optional[int] = Query(default=10, ge=1, le=100, description="The number of documents to return"),
     offset: Union[int, UUID] = Query(default=0, description="The offset of the first document to return"),
+    cursor: Optional[str] = Query(default=None, description="The cursor returned with the previous page, the offset is ignored."),
     session: AsyncSession = Depends(get_db_session),
 ) -> JSONResponse:
     """
@@ -154,10 +154,13 @@ async def get_documents(
         collection_id=collection,
         limit=limit,
         offset=offset,
+        cursor=cursor,
         user_id=request_context.get().user_id,
     )
 
-    return JSONResponse(content=Documents(data=data).model_dump(), status_code=200)
+    next_cursor = get_next_cursor(data=data, limit=limit)
+
+    return JSONResponse(content=Documents(data=data, next_cursor=next_cursor).model_dump(), status_code=200)
 
 
 @router.delete(path=ENDPOINT__DOCUMENTS + "/{document:path}", dependencies=[Security(dependency=AccessController())], status_code=204)
@@ -1,5 +1,4 @@
-from fastapi import APIRouter, Request, Security
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, Response, Security
 
 from app.helpers._accesscontroller import AccessController
 from app.schemas.embeddings import Embeddings, EmbeddingsRequest
@@ -10,7 +9,7 @@ router = APIRouter()
 
 
 @router.post(path=ENDPOINT__EMBEDDINGS, dependencies=[Security(dependency=AccessController())], status_code=200, response_model=Embeddings)
-async def embeddings(request: Request, body: EmbeddingsRequest) -> JSONResponse:
+async def embeddings(request: Request, body: EmbeddingsRequest) -> Response:
     """
     Creates an embedding vector representing the input text.
     """
@@ -19,4 +18,5 @@ async def embeddings(request: Request, body: EmbeddingsRequest) -> JSONResponse:
     client = model.get_client(endpoint=ENDPOINT__EMBEDDINGS)
     response = await client.forward_request(method="POST", json=body.model_dump())
 
-    return JSONResponse(content=Embeddings(**response.json()).model_dump(), status_code=response.status_code)
+    # the response is already formatted by the model client, pass it through without validation (vectors can weigh several megabytes)
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json")
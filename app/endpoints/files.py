@@ -42,10 +42,8 @@ async def upload_file(
     if not global_context.document_manager:  # no vector store available
         raise CollectionNotFoundException()
 
-    file_size = len(file.file.read())
-    if file_size > FileSizeLimitExceededException.MAX_CONTENT_SIZE:
+    if file.size > FileSizeLimitExceededException.MAX_CONTENT_SIZE:
         raise FileSizeLimitExceededException()
-    file.file.seek(0)  # reset file pointer to the beginning of the file
 
     if request.chunker:
         chunker_args = request.chunker.args.model_dump() if request.chunker.args else ChunkerArgs().model_dump()
@@ -80,7 +78,7 @@ async def upload_file(
         files = [(file, None)]
 
     for file, metadata in files:
-        document = await global_context.document_manager.parse_file(
+        pages = global_context.document_manager.parse_file_pages(
             file=file,
             output_format=ParsedDocumentOutputFormat.MARKDOWN.value,
             force_ocr=False,
@@ -93,7 +91,7 @@ async def upload_file(
             user_id=request_context.get().user_id,
             session=session,
             collection_id=request.collection,
-            document=document,
+            document=pages,
             chunker=chunker,
             chunk_min_size=chunker_args["chunk_min_size"],
             chunk_size=chunker_args["chunk_size"],
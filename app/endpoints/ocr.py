@@ -1,23 +1,33 @@
+import asyncio
 import base64
+import logging
+from typing import AsyncGenerator, AsyncIterator, Tuple, Union
 
-from fastapi import APIRouter, Request, Security, UploadFile
+from fastapi import APIRouter, HTTPException, Request, Security, UploadFile
 from fastapi.responses import JSONResponse
+import orjson
 import pymupdf
+from starlette.background import BackgroundTask
 
 from app.helpers._accesscontroller import AccessController
+from app.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
+from app.helpers.models.routers import ModelRouter
 from app.schemas.core.documents import FileType
-from app.schemas.ocr import DPIForm, ModelForm, PromptForm
+from app.schemas.ocr import DPIForm, ModelForm, PromptForm, StreamForm
 from app.schemas.parse import FileForm, ParsedDocument, ParsedDocumentMetadata, ParsedDocumentPage
-from app.schemas.usage import Usage
-from app.utils.context import global_context
+from app.utils.configuration import configuration
+from app.utils.context import global_context, request_context
 from app.utils.exceptions import FileSizeLimitExceededException
+from app.utils.files import open_pdf
 from app.utils.variables import ENDPOINT__OCR
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
 @router.post(path=ENDPOINT__OCR, dependencies=[Security(dependency=AccessController())], status_code=200, response_model=ParsedDocument)
-async def ocr(request: Request, file: UploadFile = FileForm, model: str = ModelForm, dpi: int = DPIForm, prompt: str = PromptForm) -> JSONResponse:
+async def ocr(request: Request, file: UploadFile = FileForm, model: str = ModelForm, dpi: int = DPIForm, prompt: str = PromptForm, stream: bool = StreamForm) -> Union[JSONResponse, StreamingResponseWithStatusCode]:  # fmt: off
     """
     Extracts text from PDF files using OCR.
     """
@@ -28,47 +38,135 @@ async def ocr(request: Request, file: UploadFile = FileForm, model: str = ModelF
     if file.size > FileSizeLimitExceededException.MAX_CONTENT_SIZE:
         raise FileSizeLimitExceededException()
 
-    # get model client
     model = global_context.model_registry(model=model)
-    client = model.get_client(endpoint=ENDPOINT__OCR)
-
-    file_content = await file.read()  # open document
-    pdf = pymupdf.open(stream=file_content, filetype="pdf")
-    document = ParsedDocument(data=[], usage=Usage())
-
-    for i, page in enumerate(pdf):  # iterate through the pages
-        image = page.get_pixmap(dpi=dpi)  # render page to an image
-        img_byte_arr = image.tobytes("png")  # convert pixmap to PNG bytes
-
-        # forward request
-        payload = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64.b64encode(img_byte_arr).decode("utf-8")}"}},
-                    ],
-                }
-            ],
-            "n": 1,
-            "stream": False,
-        }
-        response = await client.forward_request(method="POST", json=payload)  # error are automatically raised
-        response = response.json()
-        text = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-
-        # format response
-        document.data.append(
-            ParsedDocumentPage(
-                content=text,
-                images={},
-                metadata=ParsedDocumentMetadata(page=i, document_name=file.filename, **pdf.metadata),
-            )
-        )
-        document.usage = Usage(**response.get("usage", {}))
-
-    pdf.close()
+    model.get_client(endpoint=ENDPOINT__OCR)  # check the model type before reading the file
+
+    pdf = await asyncio.to_thread(open_pdf, file=file.file)  # open document, without copying the spooled file in memory
+    pages = _ocr_pages(pdf=pdf, model=model, dpi=dpi, prompt=prompt, document_name=file.filename)
+
+    if stream:
+        content = _stream_pages(pdf=pdf, pages=pages)
+        # the stream is closed once the response is sent, also if it has not been iterated until the end or at all (client disconnected)
+        background = BackgroundTask(_close_stream, stream=content, pdf=pdf)
+        return StreamingResponseWithStatusCode(content=content, media_type="text/event-stream", background=background)
+
+    try:
+        data = [page async for page in pages]
+    finally:
+        pdf.close()
+
+    data.sort(key=lambda page: page.metadata.page)
+    document = ParsedDocument(data=data, usage=request_context.get().usage)
 
     return JSONResponse(content=document.model_dump(), status_code=200)
+
+
+def _render_page(pdf: pymupdf.Document, index: int, dpi: int) -> str:
+    image = pdf[index].get_pixmap(dpi=dpi)  # render page to an image
+
+    return base64.b64encode(image.tobytes("png")).decode("utf-8")
+
+
+async def _ocr_pages(pdf: pymupdf.Document, model: ModelRouter, dpi: int, prompt: str, document_name: str) -> AsyncIterator[ParsedDocumentPage]:
+    """
+    Extract the text of the pages of a PDF file with a model, pages are yielded as soon as they are processed (not in page order).
+
+    Pages are rendered one at a time in a worker thread (a document can't be used by several threads at the same time) while previous
+    pages are processed by the model. Each page request gets its own model client, so pages are distributed between the model providers.
+    The number of rendered pages not yet processed is bounded by `ocr_max_concurrency` setting, which also bounds the memory used by the
+    rendered images. The usage of each page request is added to the usage of the request context.
+
+    Args:
+        pdf(pymupdf.Document): The PDF file.
+        model(ModelRouter): The OCR model.
+        dpi(int): The DPI to render the pages.
+        prompt(str): The prompt of the OCR.
+        document_name(str): The name of the document.
+    """
+    semaphore = asyncio.Semaphore(value=configuration.settings.ocr_max_concurrency)
+    queue = asyncio.Queue()
+    tasks = set()
+    metadata = pdf.metadata
+
+    async def ocr_page(index: int, image: str) -> None:
+        try:
+            client = model.get_client(endpoint=ENDPOINT__OCR)
+            payload = {
+                "model": model,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}},
+                        ],
+                    }
+                ],
+                "n": 1,
+                "stream": False,
+            }
+            response = await client.forward_request(method="POST", json=payload)  # error are automatically raised
+            response = orjson.loads(response.content)
+            text = response.get("choices", [{}])[0].get("message", {}).get("content", "")
+            page = ParsedDocumentPage(content=text, images={}, metadata=ParsedDocumentMetadata(page=index, document_name=document_name, **metadata))
+            await queue.put(page)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            semaphore.release()
+
+    async def render_pages() -> None:
+        for index in range(pdf.page_count):
+            await semaphore.acquire()
+            rendering = asyncio.ensure_future(asyncio.to_thread(_render_page, pdf, index, dpi))
+            try:
+                image = await asyncio.shield(rendering)
+            except asyncio.CancelledError:
+                await asyncio.gather(rendering, return_exceptions=True)  # the document is used by the thread until the end of the rendering
+                raise
+            except Exception as e:
+                semaphore.release()
+                await queue.put(e)
+                return
+            task = asyncio.create_task(ocr_page(index=index, image=image))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    renderer = asyncio.create_task(render_pages())
+    try:
+        for _ in range(pdf.page_count):
+            page = await queue.get()
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        renderer.cancel()
+        for task in list(tasks):
+            task.cancel()
+        await asyncio.gather(renderer, *tasks, return_exceptions=True)
+
+
+async def _stream_pages(pdf: pymupdf.Document, pages: AsyncIterator[ParsedDocumentPage]) -> AsyncIterator[Tuple[bytes, int]]:
+    try:
+        async for page in pages:
+            yield b"data: " + orjson.dumps(page.model_dump()) + b"\n\n", 200
+    except HTTPException as e:
+        yield orjson.dumps({"detail": e.detail}), e.status_code
+        return
+    except Exception as e:
+        logger.exception(msg=f"Failed to stream the OCR pages: {e}.")
+        yield orjson.dumps({"detail": type(e).__name__}), 500
+        return
+    finally:
+        await pages.aclose()
+        pdf.close()
+
+    # last event contains the usage of all pages
+    yield b"data: " + orjson.dumps(ParsedDocument(data=[], usage=request_context.get().usage).model_dump()) + b"\n\n", 200
+    yield b"data: [DONE]\n\n", 200
+
+
+async def _close_stream(stream: AsyncGenerator[Tuple[bytes, int], None], pdf: pymupdf.Document) -> None:
+    await stream.aclose()  # the processing of the pages is cancelled and the document is closed, if the stream has been started
+    if not pdf.is_closed:
+        pdf.close()
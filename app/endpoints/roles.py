@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from fastapi import APIRouter, Body, Depends, Path, Query, Request, Security
 from fastapi.responses import JSONResponse, Response
@@ -20,6 +20,7 @@ from app.schemas.auth import (
 from app.sql.session import get_db_session
 from app.utils.configuration import configuration
 from app.utils.context import global_context, request_context
+from app.utils.pagination import get_next_cursor
 from app.utils.variables import ENDPOINT__ROLES, ENDPOINT__ROLES_ME, ENDPOINT__TOKENS
 
 router = APIRouter()
@@ -146,16 +147,19 @@ async def get_roles(
     limit: int = Query(default=10, ge=1, le=100, description="The limit of the roles to get."),
     order_by: Literal["id", "name", "created_at", "updated_at"] = Query(default="id", description="The field to order the roles by."),
     order_direction: Literal["asc", "desc"] = Query(default="asc", description="The direction to order the roles by."),
+    cursor: Optional[str] = Query(default=None, description="The cursor returned with the previous page, the offset is ignored."),
     session: AsyncSession = Depends(get_db_session),
 ) -> JSONResponse:
     """
     Get all roles.
     """
     data = await global_context.identity_access_manager.get_roles(
-        session=session, offset=offset, limit=limit, order_by=order_by, order_direction=order_direction
+        session=session, offset=offset, limit=limit, order_by=order_by, order_direction=order_direction, cursor=cursor
     )
 
-    return JSONResponse(content=Roles(data=data).model_dump(), status_code=200)
+    next_cursor = get_next_cursor(data=data, limit=limit, order_by=order_by)
+
+    return JSONResponse(content=Roles(data=data, next_cursor=next_cursor).model_dump(), status_code=200)
 
 
 @router.post(path=ENDPOINT__TOKENS, dependencies=[Security(dependency=AccessController())], status_code=201, response_model=TokensResponse)
@@ -213,6 +217,7 @@ async def get_tokens(
     limit: int = Query(default=10, ge=1, le=100, description="The limit of the tokens to get."),
     order_by: Literal["id", "name", "created_at"] = Query(default="id", description="The field to order the tokens by."),
     order_direction: Literal["asc", "desc"] = Query(default="asc", description="The direction to order the tokens by."),
+    cursor: Optional[str] = Query(default=None, description="The cursor returned with the previous page, the offset is ignored."),
     session: AsyncSession = Depends(get_db_session),
 ) -> JSONResponse:
     """
@@ -226,6 +231,9 @@ async def get_tokens(
         limit=limit,
         order_by=order_by,
         order_direction=order_direction,
+        cursor=cursor,
     )
 
-    return JSONResponse(content=Tokens(data=data).model_dump(), status_code=200)
+    next_cursor = get_next_cursor(data=data, limit=limit, order_by=order_by)
+
+    return JSONResponse(content=Tokens(data=data, next_cursor=next_cursor).model_dump(), status_code=200)
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from fastapi import APIRouter, Depends, Query, Request, Security
 from fastapi.responses import JSONResponse
@@ -24,6 +24,7 @@ async def get_account_usage(
     request: Request,
     limit: int = Query(default=50, ge=1, le=100, description="Number of records to return per page (1-100)"),
     page: int = Query(default=1, ge=1, description="Page number (1-based)"),
+    cursor: Optional[str] = Query(default=None, description="Cursor returned with the previous page, the page is ignored"),
     order_by: Literal["datetime", "cost", "total_tokens"] = Query(default="datetime", description="Field to order by"),
     order_direction: Literal["asc", "desc"] = Query(default="desc", description="Order direction"),
     date_from: int = Query(default=None, description="Start date as Unix timestamp (default: 30 days ago)"),
@@ -35,7 +36,7 @@ async def get_account_usage(
     Get usage records for the current authenticated account.
 
     Returns usage data filtered by the current account's ID, with configurable ordering and pagination.
-    Supports pagination through page and limit parameters.
+    Supports pagination through page and limit parameters, or through the cursor returned with the previous page.
     """
     # Normalize date range
     date_from, date_to = UsageManager.normalize_date_range(date_from, date_to)
@@ -44,23 +45,25 @@ async def get_account_usage(
     base_filter = UsageManager.build_base_filter(current_user.id, date_from, date_to)
 
     # Build and execute usage query
-    query = UsageManager.build_usage_query(base_filter, order_by, order_direction, page, limit)
+    query = UsageManager.build_usage_query(base_filter, order_by, order_direction, page, limit, cursor)
     result = await session.execute(query)
     usage_records = result.scalars().all()
 
-    # Get aggregated statistics
-    aggregation_data = await UsageManager.get_usage_aggregation(session, base_filter)
+    # Count the listed records and get aggregated statistics
+    total_count = await UsageManager.count_usage_records(session, base_filter)
+    aggregation_data = await UsageManager.get_usage_aggregation(session, current_user.id, date_from, date_to)
 
     # Convert records to schema format
     usage_data = UsageManager.convert_records_to_schema(usage_records)
 
     # Calculate pagination metadata
-    pagination_meta = UsageManager.calculate_pagination_metadata(aggregation_data["total_count"], page, limit)
+    pagination_meta = UsageManager.calculate_pagination_metadata(total_count, page, limit)
+    next_cursor = UsageManager.get_next_cursor(usage_records, order_by, limit)
 
     # Build response
     response = AccountUsageResponse(
         data=usage_data,
-        total=aggregation_data["total_count"],
+        total=total_count,
         total_requests=aggregation_data["total_requests"],
         total_albert_coins=aggregation_data["total_albert_coins"],
         total_tokens=aggregation_data["total_tokens"],
@@ -68,7 +71,8 @@ async def get_account_usage(
         page=page,
         limit=limit,
         total_pages=pagination_meta["total_pages"],
-        has_more=pagination_meta["has_more"],
+        has_more=pagination_meta["has_more"] if cursor is None else next_cursor is not None,
+        next_cursor=next_cursor,
     )
 
     return JSONResponse(status_code=200, content=response.model_dump())
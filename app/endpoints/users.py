@@ -16,6 +16,7 @@ from app.schemas.auth import (
 from app.sql.session import get_db_session
 from app.utils.configuration import configuration
 from app.utils.context import global_context, request_context
+from app.utils.pagination import get_next_cursor
 from app.utils.variables import ENDPOINT__USERS, ENDPOINT__USERS_ME
 
 router = APIRouter()
@@ -136,6 +137,7 @@ async def get_users(
     limit: int = Query(default=10, ge=1, le=100, description="The limit of the users to get."),
     order_by: Literal["id", "name", "created_at", "updated_at"] = Query(default="id", description="The field to order the users by."),
     order_direction: Literal["asc", "desc"] = Query(default="asc", description="The direction to order the users by."),
+    cursor: Optional[str] = Query(default=None, description="The cursor returned with the previous page, the offset is ignored."),
     session: AsyncSession = Depends(get_db_session),
 ) -> JSONResponse:
     """
@@ -143,7 +145,9 @@ async def get_users(
     """
 
     data = await global_context.identity_access_manager.get_users(
-        session=session, role_id=role, offset=offset, limit=limit, order_by=order_by, order_direction=order_direction
+        session=session, role_id=role, offset=offset, limit=limit, order_by=order_by, order_direction=order_direction, cursor=cursor
     )
 
-    return JSONResponse(content=Users(data=data).model_dump(), status_code=200)
+    next_cursor = get_next_cursor(data=data, limit=limit, order_by=order_by)
+
+    return JSONResponse(content=Users(data=data, next_cursor=next_cursor).model_dump(), status_code=200)
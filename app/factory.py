@@ -8,13 +8,20 @@ from starlette.middleware.sessions import SessionMiddleware
 
 
 from app.endpoints import proconnect
+from app.helpers._uploadsizelimiter import UploadSizeLimiter
 from app.schemas.auth import PermissionType
 from app.schemas.core.context import RequestContext
 from app.schemas.usage import Usage
 from app.utils.context import generate_request_id, request_context
 from app.sql.session import set_get_db_func
+from app.utils.exceptions import FileSizeLimitExceededException
 from app.utils.hooks_decorator import hooks
 from app.utils.variables import (
+    ENDPOINT__AUDIO_TRANSCRIPTIONS,
+    ENDPOINT__DOCUMENTS,
+    ENDPOINT__FILES,
+    ENDPOINT__OCR,
+    ENDPOINT__PARSE,
     ROUTER__USAGE,
     ROUTER__AGENTS,
     ROUTER__AUDIO,
@@ -67,6 +74,16 @@ def create_app(db_func=None, *args, **kwargs) -> FastAPI:
     )
     app.add_middleware(SessionMiddleware, secret_key=configuration.settings.session_secret_key)
 
+    # uploads are rejected while received, with a margin for the other fields of the form (the file size is checked by the endpoints)
+    upload_paths = [f"/v1{endpoint}" for endpoint in [ENDPOINT__DOCUMENTS, ENDPOINT__FILES, ENDPOINT__OCR, ENDPOINT__PARSE]]
+    app.add_middleware(UploadSizeLimiter, max_size=FileSizeLimitExceededException.MAX_CONTENT_SIZE + 1024 * 1024, paths=upload_paths)
+    app.add_middleware(
+        UploadSizeLimiter,
+        max_size=configuration.settings.audio_max_file_size + 1024 * 1024,
+        paths=[f"/v1{ENDPOINT__AUDIO_TRANSCRIPTIONS}"],
+        detail=f"File size limit exceeded (max: {configuration.settings.audio_max_file_size} bytes).",
+    )
+
     # Set up database dependency
     # If no db_func provided, the depends module will fall back to default
     from app.endpoints import (
@@ -1,20 +1,39 @@
+import asyncio
 import json
-from typing import List
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 import httpx
 
 from app.clients.mcp_bridge import BaseMCPBridgeClient as MCPBridgeClient
 from app.helpers.models import ModelRegistry
-from app.schemas.agents import AgentsTool, AgentsChatCompletionRequest
+from app.schemas.agents import AgentsTool, AgentsChatCompletionRequest, AgentsToolCallEvent
 from app.utils.exceptions import ToolNotFoundException
 from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
 
+logger = logging.getLogger(__name__)
+
 
 class AgentManager:
-    def __init__(self, mcp_bridge: MCPBridgeClient, model_registry: ModelRegistry, max_iterations: int = 2):
+    def __init__(
+        self,
+        mcp_bridge: MCPBridgeClient,
+        model_registry: ModelRegistry,
+        max_iterations: int = 2,
+        tools_cache_ttl: int = 0,
+        tool_call_timeout: float = 30,
+    ):
         self.model_registry = model_registry
         self.mcp_bridge = mcp_bridge
         self.max_iterations = max_iterations
+        self.tools_cache_ttl = tools_cache_ttl
+        self.tool_call_timeout = tool_call_timeout
+
+        self._tools: Optional[List[AgentsTool]] = None
+        self._tools_expiration = 0.0
+        self._tools_lock = asyncio.Lock()
+        self._tools_refresh_task: Optional[asyncio.Task] = None
 
     async def get_completion(self, body: AgentsChatCompletionRequest):
         body = await self.set_tools_for_llm_request(body)
@@ -28,12 +47,13 @@ class AgentManager:
             if finish_reason in ["stop", "length"]:
                 return http_llm_response
             elif finish_reason == "tool_calls":
-                tool_config = llm_response["choices"][0]["message"]["tool_calls"][0]["function"]
-                tool_name = tool_config["name"]
-                tool_args = tool_config["arguments"]
+                message = llm_response["choices"][0]["message"]
+                body.messages.append({"role": "assistant", "content": message.get("content"), "tool_calls": message["tool_calls"]})
 
-                tool_call_result = await self.mcp_bridge.call_tool(tool_name, tool_args)
-                body.messages.append({"role": "user", "content": tool_call_result["content"][0]["text"]})
+                # all tool calls of the turn are run concurrently
+                results = await asyncio.gather(*[self.call_tool(tool_call=tool_call) for tool_call in message["tool_calls"]])
+                for tool_call, result in zip(message["tool_calls"], results):
+                    body.messages.append({"role": "tool", "tool_call_id": tool_call.get("id"), "content": result})
         last_llm_response = http_llm_response.json()
         last_llm_response["choices"][0]["finish_reason"] = "max_iterations"
         llm_response_with_new_finish_reason = httpx.Response(
@@ -44,10 +64,133 @@ class AgentManager:
         )
         return llm_response_with_new_finish_reason
 
+    async def get_completion_stream(self, body: AgentsChatCompletionRequest) -> AsyncIterator[Tuple[bytes, int]]:
+        """
+        Stream the completion. Each turn of the model is streamed: the content deltas are proxied token by token, while the tool calls are
+        run and notified by `tool_call` events (started and finished). The usage chunk is sent at the end of the stream and contains the
+        usage of all the turns.
+        """
+        body = await self.set_tools_for_llm_request(body)
+        usage_event, last_data = None, {}
+        for number_of_iterations in range(1, self.max_iterations + 1):
+            tool_calls, content, buffer = {}, [], b""
+            model = self.model_registry(model=body.model)
+            json_body = body.model_dump()
+            client = model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=json_body)
+
+            async for chunk, status_code in client.forward_stream(method="POST", json=json_body):
+                if status_code // 100 != 2:
+                    yield chunk, status_code
+                    return
+
+                # a chunk can contain several events or a part of an event
+                buffer += chunk
+                *events, buffer = buffer.split(b"\n\n")
+                for event in events:
+                    data = event.strip().removeprefix(b"data: ")
+                    if not data or data == b"[DONE]":
+                        continue
+                    data = json.loads(data)
+                    if not data.get("choices"):
+                        usage_event = event  # usage of the request, updated by each turn
+                        continue
+
+                    last_data = data
+                    choice = data["choices"][0]
+                    delta = choice.get("delta") or {}
+                    for tool_call in delta.get("tool_calls") or []:
+                        self._merge_tool_call_delta(tool_calls=tool_calls, delta=tool_call)
+                    if delta.get("tool_calls") or choice.get("finish_reason") == "tool_calls":
+                        continue
+
+                    content.append(delta.get("content") or "")
+                    yield event + b"\n\n", status_code
+
+            if not tool_calls:
+                break
+
+            if number_of_iterations == self.max_iterations:
+                last_data = last_data | {"choices": [{"index": 0, "delta": {}, "finish_reason": "max_iterations"}]}
+                last_data.pop("usage", None)
+                yield f"data: {json.dumps(last_data)}\n\n".encode(), 200
+                break
+
+            tool_calls = [tool_calls[index] for index in sorted(tool_calls)]
+            body.messages.append({"role": "assistant", "content": "".join(content) or None, "tool_calls": tool_calls})
+            results = {}
+            async for event, index, result in self._call_tools_with_events(tool_calls=tool_calls):
+                if index is not None:
+                    results[index] = result
+                yield event, 200
+            for index, tool_call in enumerate(tool_calls):
+                body.messages.append({"role": "tool", "tool_call_id": tool_call.get("id"), "content": results[index]})
+
+        if usage_event:
+            yield usage_event + b"\n\n", 200
+        yield b"data: [DONE]\n\n", 200
+
+    async def _call_tools_with_events(self, tool_calls: List[dict]) -> AsyncIterator[Tuple[bytes, Optional[int], Optional[str]]]:
+        def format_event(tool_call: dict, status: str) -> bytes:
+            event = AgentsToolCallEvent(id=tool_call.get("id"), name=tool_call["function"]["name"], status=status)
+            return f"event: tool_call\ndata: {event.model_dump_json()}\n\n".encode()
+
+        for tool_call in tool_calls:
+            yield format_event(tool_call=tool_call, status="started"), None, None
+
+        tasks = {asyncio.create_task(self.call_tool(tool_call=tool_call)): index for index, tool_call in enumerate(tool_calls)}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield format_event(tool_call=tool_calls[tasks[task]], status="finished"), tasks[task], task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    @staticmethod
+    def _merge_tool_call_delta(tool_calls: Dict[int, dict], delta: dict) -> None:
+        # the tool calls are streamed by parts, the arguments being split between several deltas
+        tool_call = tool_calls.setdefault(delta.get("index", 0), {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+        if delta.get("id"):
+            tool_call["id"] = delta["id"]
+        function = delta.get("function") or {}
+        tool_call["function"]["name"] += function.get("name") or ""
+        tool_call["function"]["arguments"] += function.get("arguments") or ""
+
+    async def call_tool(self, tool_call: dict) -> str:
+        """
+        Call a tool of the MCP bridge, errors and timeouts are returned as the result of the tool call for the model.
+
+        Args:
+            tool_call(dict): The tool call of the model.
+
+        Returns:
+            str: The result of the tool call.
+        """
+        tool_name = tool_call["function"]["name"]
+        try:
+            tool_call_result = await asyncio.wait_for(
+                self.mcp_bridge.call_tool(tool_name, tool_call["function"]["arguments"]), timeout=self.tool_call_timeout
+            )
+        except TimeoutError:
+            logger.warning(f"Tool call {tool_name} timed out.")
+            return f"Tool {tool_name} timed out."
+        except Exception as e:
+            logger.error(f"Tool call {tool_name} failed: {e}")
+            return f"Tool {tool_name} failed."
+
+        if tool_call_result is None:
+            return f"Invalid arguments for tool {tool_name}."
+
+        return tool_call_result["content"][0]["text"]
+
     async def get_llm_http_response(self, body: AgentsChatCompletionRequest):
         model = self.model_registry(model=body.model)
-        client = model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
-        http_llm_response = await client.forward_request(method="POST", json=body.model_dump())
+        body = body.model_dump()
+        client = model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS, body=body)
+        http_llm_response = await client.forward_request(method="POST", json=body)
 
         return http_llm_response
 
@@ -88,6 +231,31 @@ class AgentManager:
         return body
 
     async def get_tools_from_bridge(self) -> List[AgentsTool]:
-        tools = await self.mcp_bridge.get_tool_list()
+        """
+        Get the tools of the MCP bridge. If `tools_cache_ttl` is set, the tool list is cached: once expired, the cached list is still
+        returned while it is refreshed in background.
+        """
+        if not self.tools_cache_ttl:
+            return await self.mcp_bridge.get_tool_list()
+
+        if self._tools is None:
+            async with self._tools_lock:
+                if self._tools is None:
+                    await self._refresh_tools()
+        elif time.monotonic() >= self._tools_expiration:
+            if self._tools_refresh_task is None or self._tools_refresh_task.done():
+                self._tools_refresh_task = asyncio.create_task(self._refresh_tools())
+
+        return self._tools
+
+    async def _refresh_tools(self) -> None:
+        try:
+            tools = await self.mcp_bridge.get_tool_list()
+        except Exception as e:
+            if self._tools is None:
+                raise
+            logger.warning(f"Failed to refresh MCP bridge tools, cached tools are used: {e}")
+            return
 
-        return tools
+        self._tools = tools
+        self._tools_expiration = time.monotonic() + self.tools_cache_ttl
@@ -0,0 +1,136 @@
+import asyncio
+from hashlib import file_digest, sha256
+import logging
+import os
+from pathlib import Path
+import tempfile
+import time
+from typing import Any, BinaryIO, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class ContentCache:
+    """
+    Content-addressed cache on local disk, with least recently used eviction.
+
+    Entries are stored as files named by their key (a hash of the content and of the parameters used to compute the value), so that a
+    duplicated file or web page is parsed and vectorized only once. The access time of an entry is its modification time (updated on each
+    read), and the least recently used entries are removed when the size of the cache exceeds `max_size` bytes. The directory can be shared
+    by several API workers.
+    """
+
+    def __init__(self, directory: str, max_size: int) -> None:
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._size = sum(path.stat().st_size for path in self.directory.glob("*/*") if path.is_file())
+
+    @staticmethod
+    def get_key(*parts: Any) -> str:
+        """
+        Get the key of a cache entry.
+
+        Args:
+            parts(Any): JSON serializable parts of the key, like the hash of a file and the parameters to parse it.
+
+        Returns:
+            str: The key of the cache entry.
+        """
+        return sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    @staticmethod
+    def get_file_hash(file: BinaryIO) -> str:
+        # the file is hashed by chunks, without being read in memory
+        file.seek(0)
+        file_hash = file_digest(file, sha256).hexdigest()
+        file.seek(0)
+
+        return file_hash
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get a cache entry.
+
+        Args:
+            key(str): The key of the cache entry.
+
+        Returns:
+            Optional[Any]: The deserialized value of the cache entry, None if not found.
+        """
+        try:
+            return await asyncio.to_thread(self._read, key)
+        except Exception:
+            logger.exception(msg=f"Failed to read content cache entry {key}.")
+            return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """
+        Set a cache entry, the value is not stored if it is larger than the cache.
+
+        Args:
+            key(str): The key of the cache entry.
+            value(Any): The JSON serializable value of the cache entry.
+        """
+        try:
+            await asyncio.to_thread(self._write, key, orjson.dumps(value))
+        except Exception:
+            logger.exception(msg=f"Failed to write content cache entry {key}.")
+
+    def _get_path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _read(self, key: str) -> Optional[Any]:
+        path = self._get_path(key=key)
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        os.utime(path)  # mark the entry as recently used
+
+        return orjson.loads(content)
+
+    def _write(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_size:
+            logger.debug(msg=f"Content cache entry {key} is too large to be cached ({len(content)} bytes).")
+            return
+
+        path = self._get_path(key=key)
+        path.parent.mkdir(exist_ok=True)
+
+        # write in a temporary file and rename it, so that concurrent readers never read a partial entry
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+            file.write(content)
+        os.replace(file.name, path)
+
+        self._size += len(content)
+        if self._size > self.max_size:
+            self._evict()
+
+    def _evict(self) -> None:
+        # the directory is scanned to take into account the entries written by other API workers
+        entries = []
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_size * 0.9  # free some space to not evict on each write
+
+        for mtime, size, path in entries:
+            if self._size <= target:
+                break
+            if mtime > time.time() - 1:  # entry currently written or read
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self._size -= size
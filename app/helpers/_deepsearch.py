@@ -1,8 +1,10 @@
 import asyncio
 import logging
 import time
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, List, Optional, Tuple
 
+from fastapi import UploadFile
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers._websearchmanager import WebSearchManager
@@ -76,12 +78,30 @@ class TokenCounter:
 
 
 class DeepSearchAgent:
-    """Agent dedicated to DeepSearch using WebSearchManager."""
-
-    def __init__(self, model: ModelRouter, web_search_manager: WebSearchManager):
+    """
+    Agent dedicated to DeepSearch using WebSearchManager.
+
+    The search queries of an iteration are searched concurrently and the pages of each query are processed concurrently, with at most
+    `max_concurrency` model calls at the same time. The search stops when the `timeout` deadline is reached or when `max_tokens` tokens are
+    consumed, and the final report is generated with the contexts gathered so far.
+    """
+
+    def __init__(
+        self,
+        model: ModelRouter,
+        web_search_manager: WebSearchManager,
+        max_concurrency: int = 8,
+        timeout: float = 120,
+        max_tokens: Optional[int] = None,
+    ):
         """Initialize the DeepSearch agent with WebSearchManager."""
         self.model = model
         self.web_search_manager = web_search_manager
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self._semaphore = asyncio.Semaphore(value=max_concurrency)
+        self._events: Optional[asyncio.Queue] = None
 
     async def deep_search(
         self, prompt: str, session: AsyncSession, k: int = 5, iteration_limit: int = 2, num_queries: int = 2, lang: str = "fr"
@@ -91,6 +111,7 @@ class DeepSearchAgent:
         Returns: (final_response, sources, metadata)
         """
         start_time = time.time()
+        deadline = asyncio.get_running_loop().time() + self.timeout
         aggregated_contexts = []
         aggregated_sources = []
         all_search_queries = []
@@ -111,30 +132,10 @@ class DeepSearchAgent:
 
             while iteration < iteration_limit:
                 logger.info(f"=== Iteration {iteration + 1} ===")
-                iteration_contexts = []
-
-                for search_query in new_search_queries[:num_queries]:
-                    logger.info(f"Searching for: {search_query}")
-
-                    web_query = await self.web_search_manager.get_web_query(search_query)
-                    logger.info(f"Optimized web query: {web_query}")
-
-                    results = await self.web_search_manager.get_results(web_query, k)
-                    logger.info(f"Found {len(results)} results for '{web_query}'")
-
-                    for upload_file in results:
-                        url = upload_file.filename.replace(".html", "") if upload_file.filename else "unknown"
-                        aggregated_sources.append(url)
+                self._emit("queries", iteration=iteration + 1, queries=new_search_queries[:num_queries])
 
-                        content = await upload_file.read()
-                        if isinstance(content, bytes):
-                            content = content.decode("utf-8", errors="ignore")
-
-                        await upload_file.seek(0)
-
-                        context = await self._process_content(token_counter, url, prompt, search_query, content, lang)
-                        if context:
-                            iteration_contexts.append(context)
+                iteration_sources, iteration_contexts = await self._search(token_counter, prompt, new_search_queries[:num_queries], k, deadline, lang)
+                aggregated_sources.extend(iteration_sources)
 
                 if iteration_contexts:
                     aggregated_contexts.extend(iteration_contexts)
@@ -142,6 +143,10 @@ class DeepSearchAgent:
                 else:
                     logger.info(f"No useful context found in iteration {iteration + 1}.")
 
+                if asyncio.get_running_loop().time() >= deadline or await self._is_budget_exhausted(token_counter):
+                    logger.info("Deadline or token budget reached. Ending search.")
+                    break
+
                 if iteration_limit > 1:
                     new_search_queries = await self._get_new_search_queries(token_counter, prompt, all_search_queries, aggregated_contexts, lang)
                 else:
@@ -181,6 +186,94 @@ class DeepSearchAgent:
             logger.exception(f"Error during deep search: {e}")
             raise
 
+    async def deep_search_stream(
+        self, prompt: str, session: AsyncSession, k: int = 5, iteration_limit: int = 2, num_queries: int = 2, lang: str = "fr"
+    ) -> AsyncIterator[dict]:
+        """
+        Perform a deep search and yield its progress events as soon as they occur: the search queries of each iteration (`queries`), the
+        sources found for each search query (`sources`), the contexts extracted from the sources (`context`) and the deltas of the final
+        report streamed by the model (`report`). The last event (`done`) contains the final report, the sources and the metadata.
+        """
+        self._events = asyncio.Queue()
+        task = asyncio.create_task(
+            self.deep_search(prompt=prompt, session=session, k=k, iteration_limit=iteration_limit, num_queries=num_queries, lang=lang)
+        )
+        task.add_done_callback(lambda _: self._events.put_nowait(None))
+
+        try:
+            while (event := await self._events.get()) is not None:
+                yield event
+
+            final_report, sources, metadata = task.result()
+            yield {"type": "done", "response": final_report, "sources": sources, "metadata": metadata}
+        finally:
+            # the deep search is cancelled if the client disconnects
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self._events = None
+
+    def _emit(self, type: str, **data) -> None:
+        if self._events is not None:
+            self._events.put_nowait({"type": type, **data})
+
+    async def _search(
+        self, token_counter: TokenCounter, user_query: str, search_queries: List[str], k: int, deadline: float, lang: str = "fr"
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Search the queries concurrently and process the pages of each query concurrently. Work not done before the deadline is cancelled.
+
+        Returns: (sources, contexts), in the order of the queries and of the results of each query.
+        """
+        sources = [[] for _ in search_queries]
+        contexts = [[] for _ in search_queries]
+
+        async def process_page(index: int, position: int, upload_file: UploadFile) -> None:
+            url = upload_file.filename.removesuffix(".md") if upload_file.filename else "unknown"
+
+            content = await upload_file.read()
+            if isinstance(content, bytes):
+                content = content.decode("utf-8", errors="ignore")
+
+            await upload_file.seek(0)
+
+            contexts[index][position] = await self._process_content(token_counter, url, user_query, search_queries[index], content, lang)
+            if contexts[index][position]:
+                self._emit("context", source=url, context=contexts[index][position])
+
+        async def search_query(index: int) -> None:
+            logger.info(f"Searching for: {search_queries[index]}")
+
+            web_query = await self.web_search_manager.get_web_query(search_queries[index])
+            logger.info(f"Optimized web query: {web_query}")
+
+            results = await self.web_search_manager.get_results(web_query, k)
+            logger.info(f"Found {len(results)} results for '{web_query}'")
+
+            sources[index] = [upload_file.filename.removesuffix(".md") if upload_file.filename else "unknown" for upload_file in results]
+            contexts[index] = [""] * len(results)
+            self._emit("sources", query=search_queries[index], sources=sources[index])
+            await asyncio.gather(*[process_page(index, position, upload_file) for position, upload_file in enumerate(results)])
+
+        tasks = [asyncio.create_task(search_query(index)) for index in range(len(search_queries))]
+        done, pending = await asyncio.wait(tasks, timeout=max(deadline - asyncio.get_running_loop().time(), 0))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if pending:
+            logger.warning(f"Deadline reached, {len(pending)} search queries cancelled.")
+
+        for task in done:
+            if task.exception():
+                logger.error(f"Error during search query: {task.exception()}")
+
+        return [url for urls in sources for url in urls], [context for texts in contexts for context in texts if context]
+
+    async def _is_budget_exhausted(self, token_counter: TokenCounter) -> bool:
+        if self.max_tokens is None:
+            return False
+
+        return sum(await token_counter.get_totals()) >= self.max_tokens
+
     async def _generate_search_queries(self, token_counter: TokenCounter, user_query: str, num_queries: int = 2, lang: str = "fr") -> List[str]:
         prompt = DeepSearchPrompts.researcher(num_queries, lang)
         messages = [
@@ -335,11 +428,13 @@ class DeepSearchAgent:
 
     async def _generate_final_report(self, token_counter: TokenCounter, user_query: str, all_contexts: List[str], lang: str = "fr") -> str:
         if not all_contexts:
-            return (
+            report = (
                 "No relevant information found to answer your query."
                 if lang == "en"
                 else "Aucune information pertinente trouvée pour répondre à votre requête."
             )
+            self._emit("report", delta=report)
+            return report
 
         context_combined = "\n".join(all_contexts)
         prompt = DeepSearchPrompts.redactor(lang)
@@ -350,29 +445,86 @@ class DeepSearchAgent:
                 "content": f"User request: {user_query}\n\nRelevant contexts gathered:\n{context_combined}\n\n{prompt}\nReminder:\nUser request: {user_query}",
             },
         ]
-        report = await self._call_model_async(token_counter, messages, max_tokens=2048)
+        # the final report is generated even if the token budget is reached, to answer with the contexts gathered so far
+        if self._events is not None:
+            report = await self._stream_model_async(token_counter, messages, max_tokens=2048)
+        else:
+            report = await self._call_model_async(token_counter, messages, max_tokens=2048, ignore_budget=True)
+
         return report or ("Failed to generate report." if lang == "en" else "Échec de génération d'un rapport.")
 
-    async def _call_model_async(self, token_counter: TokenCounter, messages: List[dict], max_tokens: int = 2048) -> Optional[str]:
-        await asyncio.sleep(0.1)
+    @staticmethod
+    def _get_call_usage(usage: dict) -> dict:
+        """
+        Get the usage of a model call from the usage of its response. The model client returns the cumulative usage of the request, which
+        includes the previous model calls of the deep search, the usage of the call being its last detail.
+        """
+        if usage.get("details"):
+            return usage["details"][-1].get("usage") or {}
+
+        return usage
+
+    async def _stream_model_async(self, token_counter: TokenCounter, messages: List[dict], max_tokens: int = 2048) -> Optional[str]:
+        """Call the model in streaming mode and emit each delta of the answer as a `report` event."""
+        answer, buffer, usage = [], b"", {}
         try:
-            client = self.model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
-            resp = await client.forward_request(
-                method="POST",
-                json={
-                    "messages": messages,
-                    "temperature": 0.1,
-                    "max_tokens": max_tokens,
-                    "model": self.model,
-                },
-            )
+            async with self._semaphore:
+                client = self.model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
+                stream = client.forward_stream(
+                    method="POST",
+                    json={"messages": messages, "temperature": 0.1, "max_tokens": max_tokens, "model": self.model, "stream": True},
+                )
+                async for chunk, status_code in stream:
+                    if status_code // 100 != 2:
+                        logger.error(f"Model API error: {status_code} - {chunk}")
+                        return None
+
+                    # a chunk can contain several events or a part of an event
+                    buffer += chunk
+                    *events, buffer = buffer.split(b"\n\n")
+                    for event in events:
+                        data = event.strip().removeprefix(b"data: ")
+                        if not data or data == b"[DONE]":
+                            continue
+                        data = orjson.loads(data)
+                        usage = data.get("usage") or usage
+                        for choice in data.get("choices") or []:
+                            if delta := (choice.get("delta") or {}).get("content"):
+                                answer.append(delta)
+                                self._emit("report", delta=delta)
+
+            usage = self._get_call_usage(usage=usage)
+            await token_counter.update_tokens(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+            return "".join(answer)
+        except Exception as e:
+            logger.error(f"Error calling model: {e}")
+            return None
+
+    async def _call_model_async(
+        self, token_counter: TokenCounter, messages: List[dict], max_tokens: int = 2048, ignore_budget: bool = False
+    ) -> Optional[str]:
+        try:
+            async with self._semaphore:
+                if not ignore_budget and await self._is_budget_exhausted(token_counter):
+                    logger.info("Token budget reached, model call skipped.")
+                    return None
+
+                client = self.model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
+                resp = await client.forward_request(
+                    method="POST",
+                    json={
+                        "messages": messages,
+                        "temperature": 0.1,
+                        "max_tokens": max_tokens,
+                        "model": self.model,
+                    },
+                )
             if resp.status_code == 200:
                 result = resp.json()
                 try:
                     answer = result["choices"][0]["message"]["content"]
-                    input_tokens = result.get("usage", {}).get("prompt_tokens", 0)
-                    output_tokens = result.get("usage", {}).get("completion_tokens", 0)
-                    await token_counter.update_tokens(input_tokens, output_tokens)
+                    usage = self._get_call_usage(usage=result.get("usage") or {})
+                    await token_counter.update_tokens(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
                     return answer
                 except (KeyError, IndexError):
                     logger.error(f"Unexpected model response structure: {result}")
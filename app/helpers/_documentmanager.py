@@ -1,13 +1,14 @@
+import asyncio
 from functools import wraps
 from itertools import batched
 import logging
 import time
-from typing import Callable, List, Optional
-from uuid import uuid4
+from typing import AsyncIterator, Callable, List, Optional
 
 from fastapi import HTTPException, UploadFile
 from langchain_text_splitters import Language
-from sqlalchemy import Integer, cast, delete, distinct, func, insert, or_, select, update
+import orjson
+from sqlalchemy import Integer, cast, delete, func, insert, or_, select, update
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -17,7 +18,7 @@ from app.helpers.models.routers import ModelRouter
 from app.schemas.chunks import Chunk
 from app.schemas.collections import Collection, CollectionVisibility
 from app.schemas.documents import Chunker, Document
-from app.schemas.parse import ParsedDocument, ParsedDocumentOutputFormat
+from app.schemas.parse import ParsedDocument, ParsedDocumentOutputFormat, ParsedDocumentPage
 from app.schemas.search import Search, SearchMethod
 from app.sql.models import Collection as CollectionTable
 from app.sql.models import Document as DocumentTable
@@ -29,10 +30,13 @@ from app.utils.exceptions import (
     MultiAgentSearchNotAvailableException,
     VectorizationFailedException,
 )
+from app.utils.pagination import paginate
 from app.utils.variables import ENDPOINT__EMBEDDINGS
 
+from ._contentcache import ContentCache
 from ._multiagentmanager import MultiAgentManager
 from ._parsermanager import ParserManager
+from ._webindex import WebIndex
 from ._websearchmanager import WebSearchManager
 
 logger = logging.getLogger(__name__)
@@ -64,6 +68,7 @@ def check_dependencies(*, dependencies: List[str]) -> Callable:
 
 class DocumentManager:
     BATCH_SIZE = 32
+    REPAIR_BATCH_SIZE = 1000
 
     def __init__(
         self,
@@ -72,12 +77,14 @@ class DocumentManager:
         parser_manager: ParserManager,
         web_search_manager: Optional[WebSearchManager] = None,
         multi_agent_manager: Optional[MultiAgentManager] = None,
+        content_cache: Optional[ContentCache] = None,
     ) -> None:
         self.vector_store = vector_store
         self.vector_store_model = vector_store_model
         self.web_search_manager = web_search_manager
         self.parser_manager = parser_manager
         self.multi_agent_manager = multi_agent_manager
+        self.content_cache = content_cache
 
     @check_dependencies(dependencies=["vector_store"])
     async def create_collection(self, session: AsyncSession, user_id: int, name: str, visibility: CollectionVisibility, description: Optional[str] = None) -> int:  # fmt: off
@@ -137,25 +144,20 @@ class DocumentManager:
         await session.commit()
 
     @check_dependencies(dependencies=["vector_store"])
-    async def get_collections(self, session: AsyncSession, user_id: int, collection_id: Optional[int] = None, include_public: bool = True, offset: int = 0, limit: int = 10) -> List[Collection]:  # fmt: off
+    async def get_collections(self, session: AsyncSession, user_id: int, collection_id: Optional[int] = None, include_public: bool = True, offset: int = 0, limit: int = 10, cursor: Optional[str] = None) -> List[Collection]:  # fmt: off
         # Query basic collection data
-        statement = (
-            select(
-                CollectionTable.id,
-                CollectionTable.name,
-                UserTable.name.label("owner"),
-                CollectionTable.visibility,
-                CollectionTable.description,
-                func.count(distinct(DocumentTable.id)).label("documents"),
-                cast(func.extract("epoch", CollectionTable.created_at), Integer).label("created_at"),
-                cast(func.extract("epoch", CollectionTable.updated_at), Integer).label("updated_at"),
-            )
-            .outerjoin(DocumentTable, CollectionTable.id == DocumentTable.collection_id)
-            .outerjoin(UserTable, CollectionTable.user_id == UserTable.id)
-            .group_by(CollectionTable.id, UserTable.name)
-            .offset(offset=offset)
-            .limit(limit=limit)
-        )
+        statement = select(
+            CollectionTable.id,
+            CollectionTable.name,
+            UserTable.name.label("owner"),
+            CollectionTable.visibility,
+            CollectionTable.description,
+            CollectionTable.documents_count.label("documents"),
+            CollectionTable.chunks_count.label("chunks"),
+            cast(func.extract("epoch", CollectionTable.created_at), Integer).label("created_at"),
+            cast(func.extract("epoch", CollectionTable.updated_at), Integer).label("updated_at"),
+        ).outerjoin(UserTable, CollectionTable.user_id == UserTable.id)
+        statement = paginate(statement, columns=[CollectionTable.id], offset=offset, limit=limit, cursor=cursor)
 
         if collection_id:
             statement = statement.where(CollectionTable.id == collection_id)
@@ -178,7 +180,7 @@ class DocumentManager:
         session: AsyncSession,
         user_id: int,
         collection_id: int,
-        document: ParsedDocument,
+        document: ParsedDocument | AsyncIterator[ParsedDocumentPage],
         chunker: Chunker,
         chunk_size: int,
         chunk_overlap: int,
@@ -189,70 +191,111 @@ class DocumentManager:
         preset_separators: Optional[Language] = None,
         metadata: Optional[dict] = None,
     ) -> int:
-        # check if collection exists and prepare document chunks in a single transaction
+        """
+        Create a document in a collection. The document can be a parsed document or an async iterator of pages (see `parse_file_pages`), in
+        this case pages are chunked and vectorized as they are parsed.
+        """
+        # check if collection exists
         result = await session.execute(
-            statement=select(CollectionTable).where(CollectionTable.id == collection_id).where(CollectionTable.user_id == user_id)
+            statement=select(CollectionTable.id).where(CollectionTable.id == collection_id).where(CollectionTable.user_id == user_id)
         )
         try:
             result.scalar_one()
         except NoResultFound:
             raise CollectionNotFoundException()
 
-        try:
-            chunks = self._split(
-                document=document,
-                chunker=chunker,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                length_function=length_function,
-                is_separator_regex=is_separator_regex,
-                separators=separators,
-                chunk_min_size=chunk_min_size,
-                preset_separators=preset_separators,
-                metadata=metadata,
-            )
-        except Exception as e:
-            logger.exception(msg=f"Error during document splitting: {e}")
-            raise ChunkingFailedException(detail=f"Chunking failed: {e}")
+        pages = self._iter_pages(document=document)
+        page = await anext(pages, None)  # parsing errors of the first page are raised before the document creation
+        if page is None:
+            raise ChunkingFailedException(detail="Chunking failed: the document is empty.")
 
-        document_name = document.data[0].metadata.document_name
+        document_name = page.metadata.document_name
         try:
             result = await session.execute(
-                statement=insert(table=DocumentTable).values(name=document_name, collection_id=collection_id).returning(DocumentTable.id)
+                statement=insert(table=DocumentTable)
+                .values(name=document_name, collection_id=collection_id, chunks_count=0)
+                .returning(DocumentTable.id)
             )
         except Exception as e:
             if "foreign key constraint" in str(e).lower() or "fkey" in str(e).lower():
                 raise CollectionNotFoundException(detail=f"Collection {collection_id} no longer exists")
+            raise
         document_id = result.scalar_one()
+        await self._update_collection_counters(session=session, collection_id=collection_id, documents=1)
         await session.commit()
 
-        for chunk in chunks:
-            chunk.metadata["collection_id"] = collection_id
-            chunk.metadata["document_id"] = document_id
-            chunk.metadata["document_created_at"] = round(time.time())
+        async def upsert(chunks: List[Chunk]) -> None:
+            try:
+                await self._upsert(chunks=chunks, collection_id=collection_id)
+            except Exception as e:
+                logger.exception(msg=f"Error during document creation: {e}")
+                raise VectorizationFailedException(detail=f"Vectorization failed: {e}")
+
+        # chunks are vectorized by batches as pages are parsed, so only a window of pages and chunks are held in memory
+        created_at, chunk_id, chunks = round(time.time()), 0, []
         try:
-            await self._upsert(chunks=chunks, collection_id=collection_id)
-        except Exception as e:
-            logger.exception(msg=f"Error during document creation: {e}")
+            while page is not None:
+                try:
+                    page_chunks = self._split(
+                        document=ParsedDocument(data=[page]),
+                        chunker=chunker,
+                        chunk_size=chunk_size,
+                        chunk_overlap=chunk_overlap,
+                        length_function=length_function,
+                        is_separator_regex=is_separator_regex,
+                        separators=separators,
+                        chunk_min_size=chunk_min_size,
+                        preset_separators=preset_separators,
+                        metadata=metadata,
+                    )
+                except Exception as e:
+                    logger.exception(msg=f"Error during document splitting: {e}")
+                    raise ChunkingFailedException(detail=f"Chunking failed: {e}")
+
+                for chunk in page_chunks:
+                    chunk_id += 1
+                    chunk.id = chunk_id
+                    chunk.metadata["collection_id"] = collection_id
+                    chunk.metadata["document_id"] = document_id
+                    chunk.metadata["document_created_at"] = created_at
+                chunks.extend(page_chunks)
+
+                while len(chunks) >= self.BATCH_SIZE:
+                    await upsert(chunks=chunks[: self.BATCH_SIZE])
+                    chunks = chunks[self.BATCH_SIZE :]
+
+                page = await anext(pages, None)
+
+            if chunks:
+                await upsert(chunks=chunks)
+
+            # the chunks are counted once the document is complete, a failed document is deleted with its counters
+            # a document deleted during its ingestion is already uncounted, its chunks must not be counted
+            result = await session.execute(statement=update(table=DocumentTable).values(chunks_count=chunk_id).where(DocumentTable.id == document_id))
+            if result.rowcount:
+                await self._update_collection_counters(session=session, collection_id=collection_id, chunks=chunk_id)
+            await session.commit()
+
+        except Exception:
             await self.delete_document(session=session, user_id=user_id, document_id=document_id)
-            raise VectorizationFailedException(detail=f"Vectorization failed: {e}")
+            raise
 
         return document_id
 
     @check_dependencies(dependencies=["vector_store"])
-    async def get_documents(self, session: AsyncSession, user_id: int, collection_id: Optional[int] = None, document_id: Optional[int] = None, offset: int = 0, limit: int = 10) -> List[Document]:  # fmt: off
+    async def get_documents(self, session: AsyncSession, user_id: int, collection_id: Optional[int] = None, document_id: Optional[int] = None, offset: int = 0, limit: int = 10, cursor: Optional[str] = None) -> List[Document]:  # fmt: off
         statement = (
             select(
                 DocumentTable.id,
                 DocumentTable.name,
                 DocumentTable.collection_id,
                 cast(func.extract("epoch", DocumentTable.created_at), Integer).label("created_at"),
+                DocumentTable.chunks_count.label("chunks"),
             )
-            .offset(offset=offset)
-            .limit(limit=limit)
             .outerjoin(CollectionTable, DocumentTable.collection_id == CollectionTable.id)
             .where(or_(CollectionTable.user_id == user_id, CollectionTable.visibility == CollectionVisibility.PUBLIC))
         )
+        statement = paginate(statement, columns=[DocumentTable.id], offset=offset, limit=limit, cursor=cursor)
         if collection_id:
             statement = statement.where(DocumentTable.collection_id == collection_id)
         if document_id:
@@ -264,9 +307,18 @@ class DocumentManager:
         if document_id and len(documents) == 0:
             raise DocumentNotFoundException()
 
-        # chunks count
+        # chunks of the documents created before the chunk counters (not yet counted by the repair), with one call by collection
+        collections = {}
+        for document in documents:
+            if document.chunks is None:
+                collections.setdefault(document.collection_id, []).append(document.id)
+
+        collection_ids = list(collections)
+        counts = await asyncio.gather(*[self.vector_store.get_chunk_counts(collection_id=collection_id, document_ids=collections[collection_id]) for collection_id in collection_ids])  # fmt: off
+        chunk_counts = dict(zip(collection_ids, counts))
         for document in documents:
-            document.chunks = await self.vector_store.get_chunk_count(collection_id=document.collection_id, document_id=document.id)
+            if document.chunks is None:
+                document.chunks = chunk_counts[document.collection_id].get(document.id)
 
         return documents
 
@@ -284,12 +336,77 @@ class DocumentManager:
         except NoResultFound:
             raise DocumentNotFoundException()
 
-        await session.execute(statement=delete(table=DocumentTable).where(DocumentTable.id == document_id))
+        # the chunks are uncounted as they are when the row is deleted, the chunks of a document being ingested are counted concurrently
+        result = await session.execute(statement=delete(table=DocumentTable).where(DocumentTable.id == document_id).returning(DocumentTable.chunks_count))  # fmt: off
+        row = result.first()
+        if row is not None:  # not deleted by a concurrent request
+            await self._update_collection_counters(session=session, collection_id=document.collection_id, documents=-1, chunks=-(row.chunks_count or 0))  # fmt: off
         await session.commit()
 
         # delete the document from vector store
         await self.vector_store.delete_document(collection_id=document.collection_id, document_id=document_id)
 
+    @check_dependencies(dependencies=["vector_store"])
+    async def repair_collection_counters(self, session: AsyncSession) -> int:
+        """
+        Repair the document and chunk counters of the collections, maintained by document creations and deletions. The chunks of the
+        documents created before the counters are counted in the vector store, then the counters of the collections are recomputed.
+        Each transaction of the repair takes an advisory lock, a concurrent repair (one per API worker) is skipped.
+
+        Args:
+            session(AsyncSession): The database session.
+
+        Returns:
+            int: The number of collections whose counters were repaired.
+        """
+        last_id = 0
+        while True:
+            if not await self._lock_repair(session=session):
+                return 0
+
+            result = await session.execute(
+                statement=select(DocumentTable.id, DocumentTable.collection_id)
+                .where(DocumentTable.chunks_count.is_(None))
+                .where(DocumentTable.id > last_id)
+                .order_by(DocumentTable.id)
+                .limit(self.REPAIR_BATCH_SIZE)
+            )
+            rows = result.all()
+            if not rows:
+                await session.commit()
+                break
+
+            last_id = rows[-1].id
+            collections = {}
+            for row in rows:
+                collections.setdefault(row.collection_id, []).append(row.id)
+
+            values = []
+            for collection_id, document_ids in collections.items():
+                counts = await self.vector_store.get_chunk_counts(collection_id=collection_id, document_ids=document_ids)
+                values.extend({"id": document_id, "chunks_count": count} for document_id, count in counts.items())
+
+            if values:  # documents whose chunks can not be counted are retried by the next repair
+                await session.execute(update(DocumentTable), values)
+            await session.commit()
+
+        if not await self._lock_repair(session=session):
+            return 0
+
+        # the collections are locked before being counted: a document created meanwhile is either committed and counted, or waits for the
+        # repair to increment the counters, otherwise its increment could be overwritten by a count that misses it
+        await session.execute(statement=select(CollectionTable.id).order_by(CollectionTable.id).with_for_update())
+        documents = select(func.count(DocumentTable.id)).where(DocumentTable.collection_id == CollectionTable.id).scalar_subquery()
+        chunks = select(func.coalesce(func.sum(DocumentTable.chunks_count), 0)).where(DocumentTable.collection_id == CollectionTable.id).scalar_subquery()  # fmt: off
+        result = await session.execute(
+            statement=update(table=CollectionTable)
+            .values(documents_count=documents, chunks_count=chunks, updated_at=CollectionTable.updated_at)
+            .where(or_(CollectionTable.documents_count != documents, CollectionTable.chunks_count != chunks))
+        )
+        await session.commit()
+
+        return result.rowcount
+
     @check_dependencies(dependencies=["vector_store"])
     async def get_chunks(
         self,
@@ -336,6 +453,20 @@ class DocumentManager:
             file=file, output_format=output_format, force_ocr=force_ocr, page_range=page_range, paginate_output=paginate_output, use_llm=use_llm
         )
 
+    @check_dependencies(dependencies=["parser_manager"])
+    def parse_file_pages(
+        self,
+        file: UploadFile,
+        output_format: Optional[ParsedDocumentOutputFormat] = None,
+        force_ocr: Optional[bool] = None,
+        page_range: str = "",
+        paginate_output: Optional[bool] = None,
+        use_llm: Optional[bool] = None,
+    ) -> AsyncIterator[ParsedDocumentPage]:
+        return self.parser_manager.parse_file_pages(
+            file=file, output_format=output_format, force_ocr=force_ocr, page_range=page_range, paginate_output=paginate_output, use_llm=use_llm
+        )
+
     @check_dependencies(dependencies=["vector_store"])
     async def search_chunks(
         self,
@@ -350,11 +481,9 @@ class DocumentManager:
         web_search: bool = False,
         web_search_k: int = 5,
     ) -> List[Search]:
-        web_collection_id = None
+        web_index = None
         if web_search:
-            web_collection_id = await self._create_web_collection(session=session, user_id=user_id, prompt=prompt, k=web_search_k)
-        if web_collection_id:
-            collection_ids.append(web_collection_id)
+            web_index = await self._create_web_index(prompt=prompt, k=web_search_k)
 
         # check if collections exist
         for collection_id in collection_ids:
@@ -368,7 +497,7 @@ class DocumentManager:
             except NoResultFound:
                 raise CollectionNotFoundException(detail=f"Collection {collection_id} not found.")
 
-        if not collection_ids:
+        if not collection_ids and not web_index:
             return []  # to avoid a request to create a query vector
 
         response = await self._create_embeddings(input=[prompt])
@@ -379,66 +508,66 @@ class DocumentManager:
             _method = self.vector_store.default_method
             k = k * 4
 
-        searches = await self.vector_store.search(
-            method=_method,
-            collection_ids=collection_ids,
-            query_prompt=prompt,
-            query_vector=query_vector,
-            k=k,
-            rff_k=rff_k,
-            score_threshold=score_threshold,
-        )
+        searches = []
+        if collection_ids:
+            searches = await self.vector_store.search(
+                method=_method,
+                collection_ids=collection_ids,
+                query_prompt=prompt,
+                query_vector=query_vector,
+                k=k,
+                rff_k=rff_k,
+                score_threshold=score_threshold,
+            )
+        if web_index:
+            searches += web_index.search(
+                method=_method, query_prompt=prompt, query_vector=query_vector, k=k, rff_k=rff_k, score_threshold=score_threshold
+            )
+            searches = sorted(searches, key=lambda search: search.score, reverse=True)[:k]
+
         if method == SearchMethod.MULTIAGENT:
             if not self.multi_agent_manager:
                 raise MultiAgentSearchNotAvailableException()
             searches = await self.multi_agent_manager.search(searches=searches, prompt=prompt)
 
-        if web_collection_id:
-            await self.delete_collection(session=session, user_id=user_id, collection_id=web_collection_id)
-
         return searches
 
     @check_dependencies(dependencies=["web_search_manager"])
-    async def _create_web_collection(
-        self,
-        session: AsyncSession,
-        user_id: int,
-        prompt: str,
-        k: int = 5,
-    ) -> Optional[int]:
+    async def _create_web_index(self, prompt: str, k: int = 5) -> Optional[WebIndex]:
         web_query = await self.web_search_manager.get_web_query(prompt=prompt)
         web_results = await self.web_search_manager.get_results(query=web_query, k=k)
-        collection_id = None
-        if web_results:
-            collection_id = await self.create_collection(
-                session=session,
-                name=f"tmp_web_collection_{uuid4()}",
-                user_id=user_id,
-                visibility=CollectionVisibility.PRIVATE,
+
+        chunks = []
+        for file in web_results:
+            pages = self.parse_file_pages(
+                file=file,
+                output_format=ParsedDocumentOutputFormat.MARKDOWN.value,
+                force_ocr=False,
+                page_range="",
+                paginate_output=False,
+                use_llm=False,
             )
-            for file in web_results:
-                document = await self.parse_file(
-                    file=file,
-                    output_format=ParsedDocumentOutputFormat.MARKDOWN.value,
-                    force_ocr=False,
-                    page_range="",
-                    paginate_output=False,
-                    use_llm=False,
-                )
-                await self.create_document(
-                    session=session,
-                    user_id=user_id,
-                    collection_id=collection_id,
-                    document=document,
+            async for page in pages:
+                for chunk in self._split(
+                    document=ParsedDocument(data=[page]),
                     chunker=Chunker.RECURSIVE_CHARACTER_TEXT_SPLITTER,
                     chunk_overlap=0,
                     chunk_min_size=20,
                     chunk_size=4000,
                     length_function=len,
                     preset_separators=Language.MARKDOWN.value,
-                )
+                ):
+                    chunk.id = len(chunks) + 1
+                    chunks.append(chunk)
 
-        return collection_id
+        if not chunks:
+            return None
+
+        # web chunks are only stored in memory for the search request, batches are embedded concurrently
+        batches = [[chunk.content for chunk in batch] for batch in batched(iterable=chunks, n=self.BATCH_SIZE)]
+        embeddings = await asyncio.gather(*[self._create_embeddings(input=batch) for batch in batches])
+
+        return WebIndex(chunks=chunks, embeddings=[vector for batch in embeddings for vector in batch])
 
     def _split(
         self,
@@ -471,21 +600,67 @@ class DocumentManager:
 
         return chunks
 
+    @staticmethod
+    async def _lock_repair(session: AsyncSession) -> bool:
+        # the lock is released with the transaction
+        result = await session.execute(statement=select(func.pg_try_advisory_xact_lock(func.hashtext("collection_counters"))))
+        if not result.scalar():
+            await session.rollback()
+            return False
+
+        return True
+
+    @staticmethod
+    async def _update_collection_counters(session: AsyncSession, collection_id: int, documents: int = 0, chunks: int = 0) -> None:
+        # counters are incremented in the transaction of the document, the update date of the collection is kept
+        await session.execute(
+            statement=update(table=CollectionTable)
+            .values(
+                documents_count=CollectionTable.documents_count + documents,
+                chunks_count=CollectionTable.chunks_count + chunks,
+                updated_at=CollectionTable.updated_at,
+            )
+            .where(CollectionTable.id == collection_id)
+        )
+
+    @staticmethod
+    async def _iter_pages(document: ParsedDocument | AsyncIterator[ParsedDocumentPage]) -> AsyncIterator[ParsedDocumentPage]:
+        if isinstance(document, ParsedDocument):
+            for page in document.data:
+                yield page
+        else:
+            async for page in document:
+                yield page
+
     async def _create_embeddings(self, input: List[str]) -> list[float] | list[list[float]] | dict:
         client = self.vector_store_model.get_client(endpoint=ENDPOINT__EMBEDDINGS)
         response = await client.forward_request(
             method="POST",
             json={"input": input, "model": self.vector_store_model.name, "encoding_format": "float"},
         )
+        embeddings = [vector["embedding"] for vector in orjson.loads(response.content)["data"]]
+
+        return embeddings
+
+    async def _create_chunk_embeddings(self, input: List[str]) -> list[list[float]]:
+        # chunks of a duplicated document are embedded once by embeddings model, search prompts are not cached
+        key = self.content_cache.get_key("embeddings", self.vector_store_model.name, input) if self.content_cache else None
+        if key and (embeddings := await self.content_cache.get(key=key)) is not None:
+            return embeddings
+
+        embeddings = await self._create_embeddings(input=input)
+
+        if key:
+            await self.content_cache.set(key=key, value=embeddings)
 
-        return [vector["embedding"] for vector in response.json()["data"]]
+        return embeddings
 
     async def _upsert(self, chunks: List[Chunk], collection_id: int) -> None:
         batches = batched(iterable=chunks, n=self.BATCH_SIZE)
         for batch in batches:
             # create embeddings
             texts = [chunk.content for chunk in batch]
-            embeddings = await self._create_embeddings(input=texts)
+            embeddings = await self._create_chunk_embeddings(input=texts)
 
             # insert chunks and vectors
             await self.vector_store.upsert(collection_id=collection_id, chunks=batch, embeddings=embeddings)
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from typing import List, Literal, Optional, Tuple
 
 from jose import JWTError, jwt
-from sqlalchemy import Integer, cast, delete, distinct, insert, or_, select, text, update
+from sqlalchemy import Integer, cast, delete, distinct, insert, or_, select, update
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
@@ -24,6 +24,7 @@ from app.utils.exceptions import (
     UserAlreadyExistsException,
     UserNotFoundException,
 )
+from app.utils.pagination import paginate
 
 
 class IdentityAccessManager:
@@ -33,6 +34,20 @@ class IdentityAccessManager:
         self.master_key = master_key
         self.max_token_expiration_days = max_token_expiration_days
 
+    @staticmethod
+    def _get_order_columns(table, order_by: str) -> list:
+        # the results are ordered by their values (dates as timestamps, null names as empty strings), then by ID to be deterministic
+        if order_by == "id":
+            return [table.id]
+
+        column = getattr(table, order_by)
+        if order_by in ["created_at", "updated_at"]:
+            column = cast(func.extract("epoch", column), Integer)
+        elif column.nullable:
+            column = func.coalesce(column, "")
+
+        return [column, table.id]
+
     def _decode_token(self, token: str) -> dict:
         token = token.split(IdentityAccessManager.TOKEN_PREFIX)[1]
         return jwt.decode(token=token, key=self.master_key, algorithms=["HS256"])
@@ -141,10 +156,12 @@ class IdentityAccessManager:
         limit: int = 10,
         order_by: Literal["id", "name", "created_at", "updated_at"] = "id",
         order_direction: Literal["asc", "desc"] = "asc",
+        cursor: Optional[str] = None,
     ) -> List[Role]:
+        order_columns = self._get_order_columns(table=RoleTable, order_by=order_by)
         if role_id is None:
             # get the unique role IDs with pagination
-            statement = select(RoleTable.id).offset(offset=offset).limit(limit=limit).order_by(text(f"{order_by} {order_direction}"))
+            statement = paginate(select(RoleTable.id), columns=order_columns, order_direction=order_direction, offset=offset, limit=limit, cursor=cursor)  # fmt: off
             result = await session.execute(statement=statement)
             selected_roles = [row[0] for row in result.all()]
         else:
@@ -162,7 +179,7 @@ class IdentityAccessManager:
             .outerjoin(UserTable, RoleTable.id == UserTable.role_id)
             .where(RoleTable.id.in_(selected_roles))
             .group_by(RoleTable.id)
-            .order_by(text(f"{order_by} {order_direction}"))
+            .order_by(*[getattr(column, order_direction)() for column in order_columns])
         )
 
         result = await session.execute(role_query)
@@ -325,23 +342,21 @@ class IdentityAccessManager:
         limit: int = 10,
         order_by: Literal["id", "name", "created_at", "updated_at"] = "id",
         order_direction: Literal["asc", "desc"] = "asc",
+        cursor: Optional[str] = None,
     ) -> List[User]:
-        statement = (
-            select(
-                UserTable.id,
-                UserTable.name,
-                UserTable.role_id.label("role"),
-                UserTable.budget,
-                cast(func.extract("epoch", UserTable.expires_at), Integer).label("expires_at"),
-                cast(func.extract("epoch", UserTable.created_at), Integer).label("created_at"),
-                cast(func.extract("epoch", UserTable.updated_at), Integer).label("updated_at"),
-                UserTable.email,
-                UserTable.sub,
-            )
-            .offset(offset=offset)
-            .limit(limit=limit)
-            .order_by(text(f"{order_by} {order_direction}"))
+        statement = select(
+            UserTable.id,
+            UserTable.name,
+            UserTable.role_id.label("role"),
+            UserTable.budget,
+            cast(func.extract("epoch", UserTable.expires_at), Integer).label("expires_at"),
+            cast(func.extract("epoch", UserTable.created_at), Integer).label("created_at"),
+            cast(func.extract("epoch", UserTable.updated_at), Integer).label("updated_at"),
+            UserTable.email,
+            UserTable.sub,
         )
+        order_columns = self._get_order_columns(table=UserTable, order_by=order_by)
+        statement = paginate(statement, columns=order_columns, order_direction=order_direction, offset=offset, limit=limit, cursor=cursor)
         if user_id is not None:
             statement = statement.where(UserTable.id == user_id)
         if role_id is not None:
@@ -458,20 +473,18 @@ class IdentityAccessManager:
         limit: int = 10,
         order_by: Literal["id", "name", "created_at"] = "id",
         order_direction: Literal["asc", "desc"] = "asc",
+        cursor: Optional[str] = None,
     ) -> List[Token]:
-        statement = (
-            select(
-                TokenTable.id,
-                TokenTable.name,
-                TokenTable.token,
-                TokenTable.user_id.label("user"),
-                cast(func.extract("epoch", TokenTable.expires_at), Integer).label("expires_at"),
-                cast(func.extract("epoch", TokenTable.created_at), Integer).label("created_at"),
-            )
-            .offset(offset=offset)
-            .limit(limit=limit)
-            .order_by(text(f"{order_by} {order_direction}"))
+        statement = select(
+            TokenTable.id,
+            TokenTable.name,
+            TokenTable.token,
+            TokenTable.user_id.label("user"),
+            cast(func.extract("epoch", TokenTable.expires_at), Integer).label("expires_at"),
+            cast(func.extract("epoch", TokenTable.created_at), Integer).label("created_at"),
         ).where(TokenTable.user_id == user_id)
+        order_columns = self._get_order_columns(table=TokenTable, order_by=order_by)
+        statement = paginate(statement, columns=order_columns, order_direction=order_direction, offset=offset, limit=limit, cursor=cursor)
 
         if token_id is not None:
             statement = statement.where(TokenTable.id == token_id)
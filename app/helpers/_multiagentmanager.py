@@ -1,9 +1,10 @@
 import asyncio
 import logging
+import math
 import re
-from typing import List
-
+from typing import List, Optional, Tuple
 
+from app.helpers._contentcache import ContentCache
 from app.helpers.models.routers._modelrouter import ModelRouter
 from app.schemas.search import Search
 from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
@@ -106,11 +107,26 @@ Réponds juste à la question, ne dis rien d'autre. Tu dois faire un mélange de
 Réponse :
 """
 
-    def __init__(self, synthesis_model: ModelRouter, reranker_model: ModelRouter) -> None:
+    WINDOW_SIZE = 5
+    MAX_WINDOWS = 6
+
+    def __init__(
+        self,
+        synthesis_model: ModelRouter,
+        reranker_model: ModelRouter,
+        max_concurrency: int = 6,
+        quorum: int = 1,
+        timeout: float = 15,
+        content_cache: Optional[ContentCache] = None,
+    ) -> None:
         """Initialize MultiAgent with the given models."""
 
         self.synthesis_model = synthesis_model
         self.reranker_model = reranker_model
+        self.max_concurrency = max_concurrency
+        self.quorum = quorum
+        self.timeout = timeout
+        self.content_cache = content_cache
 
     async def search(
         self,
@@ -119,29 +135,58 @@ Réponse :
     ) -> List[Search]:
         """Multi Agents researcher."""
 
-        async def _go_agents(prompt_text, docs, refs, n_retry=0, max_retry=5, window=5):
-            chunk_batch = docs[n_retry * window : (n_retry + 1) * window]
-            inputs = [f"(Extrait : {refs[i]}) {chunk}..." for i, chunk in enumerate(chunk_batch)]
-            choice = (await self._get_rank(prompt_text, inputs))[0]
-            if choice in (0, 3) and n_retry < max_retry:
-                return await _go_agents(prompt_text, docs, refs, n_retry + 1)
-            if choice in (1, 2):
-                return searches, choice, n_retry
-            # fallback when max retries reached
-            if n_retry >= max_retry:
-                return searches, 3, n_retry
-            raise ValueError(f"Unknown choice: {choice}")
-
-        initial_docs = [s.chunk.content for s in searches]
-        initial_refs = [s.chunk.metadata.get("document_name") for s in searches]
-        searches_out, choice, n_retry = await _go_agents(prompt, initial_docs, initial_refs)
-
-        for s in searches_out:
+        docs = [s.chunk.content for s in searches]
+        refs = [s.chunk.metadata.get("document_name") for s in searches]
+        choice, n_retry = await self._get_choice(prompt=prompt, docs=docs, refs=refs)
+
+        for s in searches:
             s.chunk.metadata["choice"] = choice
             s.chunk.metadata["choice_desc"] = self.CHOICES[choice]
             s.chunk.metadata["n_retry"] = n_retry
 
-        return searches_out
+        return searches
+
+    async def _get_choice(self, prompt: str, docs: List[str], refs: List[str]) -> Tuple[int, int]:
+        """
+        Evaluate the windows of chunks with the reranker model and return the choice of the first acceptable window in rank order.
+
+        The windows are evaluated concurrently, at most `max_concurrency` at the same time in rank order (with 2, a window is evaluated
+        speculatively while the previous one is evaluated). The evaluations of the next windows are cancelled once a choice is made.
+
+        Args:
+            prompt(str): The user prompt.
+            docs(List[str]): The content of the chunks, in rank order.
+            refs(List[str]): The document names of the chunks.
+
+        Returns:
+            Tuple[int, int]: The choice and the index of the window (number of retries).
+        """
+        windows = []
+        for n_retry in range(max(1, min(math.ceil(len(docs) / self.WINDOW_SIZE), self.MAX_WINDOWS))):
+            start = n_retry * self.WINDOW_SIZE
+            windows.append([f"(Extrait : {refs[i]}) {docs[i]}..." for i in range(start, min(start + self.WINDOW_SIZE, len(docs)))])
+
+        semaphore = asyncio.Semaphore(value=self.max_concurrency)
+
+        async def get_window_choice(inputs: List[str]) -> int:
+            async with semaphore:
+                return (await self._get_rank(prompt, inputs))[0]
+
+        tasks = [asyncio.create_task(get_window_choice(inputs)) for inputs in windows]
+        try:
+            for n_retry, task in enumerate(tasks):
+                choice = await task
+                if choice in (1, 2):
+                    return choice, n_retry
+                if choice not in (0, 3):
+                    raise ValueError(f"Unknown choice: {choice}")
+
+            # fallback when no window is acceptable
+            return 3, len(tasks) - 1
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def full_multiagents(self, searches: List[Search], prompt: str) -> str:
         prompts = self._get_prompts(prompt, searches)
@@ -165,10 +210,52 @@ Réponse :
         return resp.json()["choices"][0]["message"]["content"]
 
     async def _ask_in_parallel(self, prompts: List[str]) -> List[str]:
+        """
+        Ask the agents in parallel and collect their answers as they complete. Once `timeout` is reached, the agents which have not
+        answered yet are dropped, if at least `quorum` agents have answered (otherwise, answers are awaited until the quorum is reached).
+
+        Args:
+            prompts(List[str]): The prompts of the agents.
+
+        Returns:
+            List[str]: The answers, in the order of the prompts.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
         tasks = [asyncio.create_task(self._get_completion(prm, temperature=0.2)) for prm in prompts]
-        return await asyncio.gather(*tasks)
+        quorum = min(self.quorum, len(tasks))
+        answers, errors, pending = {}, [], set(tasks)
+
+        try:
+            while pending:
+                timeout = max(deadline - loop.time(), 0) if len(answers) >= quorum else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Multi-agents timeout reached, {len(pending)} agents dropped.")
+                    break
+
+                for task in done:
+                    if task.exception():
+                        logger.error(f"Multi-agents agent failed: {task.exception()}")
+                        errors.append(task.exception())
+                    else:
+                        answers[tasks.index(task)] = task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if errors and not answers:
+            raise errors[0]
+
+        return [answers[index] for index in sorted(answers)]
 
     async def _get_rank(self, prompt: str, inputs: List[str]) -> List[int]:
+        # the verdict of the reranker model is cached for the same prompt and window of chunks
+        key = self.content_cache.get_key("reranker", self.reranker_model.name, prompt, inputs) if self.content_cache else None
+        if key and (rank := await self.content_cache.get(key=key)) is not None:
+            return rank
+
         client = self.reranker_model.get_client(endpoint=ENDPOINT__CHAT_COMPLETIONS)
         query = self.PROMPT_CHOICER.format(prompt=prompt, docs=inputs)
         resp = await client.forward_request(
@@ -183,4 +270,9 @@ Réponse :
         )
         text = resp.json()["choices"][0]["message"]["content"]
         m = re.search("[0-3]", text)
-        return [int(m.group())] if m else [0]
+        rank = [int(m.group())] if m else [0]
+
+        if key:
+            await self.content_cache.set(key=key, value=rank)
+
+        return rank
@@ -1,6 +1,12 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import multiprocessing
+import os
 from pathlib import Path
-from typing import Dict, Optional, Set
+import shutil
+import tempfile
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Set, Tuple
 
 from fastapi import HTTPException, UploadFile
 from html_to_markdown import convert_to_markdown
@@ -11,9 +17,27 @@ from app.schemas.core.documents import FileType, ParserParams
 from app.schemas.parse import ParsedDocument, ParsedDocumentMetadata, ParsedDocumentOutputFormat, ParsedDocumentPage
 from app.utils.exceptions import UnsupportedFileTypeException
 
+from ._contentcache import ContentCache
+
 logger = logging.getLogger(__name__)
 
 
+def _extract_pdf_pages(path: str, start: int, end: int) -> Tuple[int, List[str]]:
+    """
+    Extract the text of a window of pages of a PDF file, executed in a worker process.
+
+    Args:
+        path(str): The path of the PDF file.
+        start(int): The first page of the window.
+        end(int): The page after the last page of the window.
+
+    Returns:
+        Tuple[int, List[str]]: The number of pages of the PDF file and the text of the pages of the window.
+    """
+    with pymupdf.open(path, filetype="pdf") as pdf:
+        return pdf.page_count, [pdf[page_num].get_text() for page_num in range(start, min(end, pdf.page_count))]
+
+
 class ParserManager:
     EXTENSION_MAP: Dict[str, FileType] = {
         ".pdf": FileType.PDF,
@@ -50,8 +74,14 @@ class ParserManager:
         },
     }
 
-    def __init__(self, parser: Optional[ParserClient] = None, *args, **kwargs):
+    PDF_WINDOW_SIZE = 16
+
+    _executor: Optional[ProcessPoolExecutor] = None
+
+    def __init__(self, parser: Optional[ParserClient] = None, max_workers: int = 1, content_cache: Optional[ContentCache] = None, *args, **kwargs):  # fmt: off
         self.parser_client = parser
+        self.max_workers = max_workers
+        self.content_cache = content_cache
 
     def _detect_file_type(self, file: UploadFile, type: Optional[FileType] = None) -> FileType:
         """
@@ -106,34 +136,134 @@ class ParserManager:
         params = ParserParams(**params)
         file_type = self._detect_file_type(file=params.file)
 
+        key = await self._get_cache_key(params=params, file_type=file_type)
+        if key and (pages := await self.content_cache.get(key=key)) is not None:
+            return ParsedDocument(data=self._load_pages(pages=pages, params=params))
+
         method_map = {FileType.PDF: self._parse_pdf, FileType.HTML: self._parse_html, FileType.MD: self._parse_md, FileType.TXT: self._parse_txt}
+        document = await method_map[file_type](params)
+
+        if key:
+            await self.content_cache.set(key=key, value=[page.model_dump() for page in document.data])
+
+        return document
+
+    async def parse_file_pages(self, **params) -> AsyncIterator[ParsedDocumentPage]:
+        """
+        Parse a file and yield its pages as soon as they are parsed. PDF files parsed with PyMuPDF are extracted by windows of pages in a
+        process pool, so only a window of pages is held in memory. Other files are parsed at once and their pages are yielded.
+        """
+        params = ParserParams(**params)
+        file_type = self._detect_file_type(file=params.file)
+
+        key = await self._get_cache_key(params=params, file_type=file_type)
+        if key and (pages := await self.content_cache.get(key=key)) is not None:
+            for page in self._load_pages(pages=pages, params=params):
+                yield page
+            return
 
-        return await method_map[file_type](params)
+        pages = []
+        async for page in self._parse_file_pages(params=params, file_type=file_type):
+            if key:
+                pages.append(page.model_dump())
+            yield page
+
+        # only completely parsed files are cached
+        if key:
+            await self.content_cache.set(key=key, value=pages)
+
+    async def _get_cache_key(self, params: ParserParams, file_type: FileType) -> Optional[str]:
+        if self.content_cache is None:
+            return None
+
+        file_hash = await asyncio.to_thread(self.content_cache.get_file_hash, params.file.file)
+
+        # the name of the file is not part of the key, so that a file uploaded under another name is parsed once
+        parser = type(self.parser_client).__name__ if self.parser_client and file_type in self.parser_client.SUPPORTED_FORMATS else "builtin"
+        return self.content_cache.get_key("parsed_document", file_hash, parser, params.model_dump(mode="json", exclude={"file"}))
+
+    @staticmethod
+    def _load_pages(pages: List[dict], params: ParserParams) -> List[ParsedDocumentPage]:
+        pages = [ParsedDocumentPage(**page) for page in pages]
+        for page in pages:
+            page.metadata.document_name = params.file.filename
+
+        return pages
+
+    async def _parse_file_pages(self, params: ParserParams, file_type: FileType) -> AsyncIterator[ParsedDocumentPage]:
+        if file_type == FileType.PDF and not (self.parser_client and FileType.PDF in self.parser_client.SUPPORTED_FORMATS):
+            async for page in self._iter_pdf_pages(params):
+                yield page
+            return
+
+        method_map = {FileType.PDF: self._parse_pdf, FileType.HTML: self._parse_html, FileType.MD: self._parse_md, FileType.TXT: self._parse_txt}
+        document = await method_map[file_type](params)
+        for page in document.data:
+            yield page
 
     async def _parse_pdf(self, params: ParserParams) -> ParsedDocument:
         if self.parser_client and FileType.PDF in self.parser_client.SUPPORTED_FORMATS:
             document = await self.parser_client.parse(params)
             return document
 
+        return ParsedDocument(data=[page async for page in self._iter_pdf_pages(params)])
+
+    async def _iter_pdf_pages(self, params: ParserParams) -> AsyncIterator[ParsedDocumentPage]:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        path = None
         try:
-            file_content = await params.file.read()
-            pdf = pymupdf.open(stream=file_content, filetype="pdf")
-
-            document = ParsedDocument(data=[])
-            metadata = ParsedDocumentMetadata(document_name=params.file.filename)
-            for page_num in range(len(pdf)):
-                page = pdf[page_num]
-                text = page.get_text()
-                metadata.page = page_num
-                document.data.append(ParsedDocumentPage(content=text, images={}, metadata=metadata))
-
-            pdf.close()
-            return document
+            # the file is shared with the worker processes through a temporary file, to not send the whole file for each window
+            path = await asyncio.to_thread(self._write_temporary_file, params.file.file)
+
+            page_count, texts = await loop.run_in_executor(executor, _extract_pdf_pages, path, 0, self.PDF_WINDOW_SIZE)
+            start = len(texts)
+            while True:
+                # extract the next window while the current one is consumed
+                next_window = None
+                if start < page_count:
+                    next_window = loop.run_in_executor(executor, _extract_pdf_pages, path, start, start + self.PDF_WINDOW_SIZE)
+
+                for page_num, text in enumerate(texts, start=start - len(texts)):
+                    metadata = ParsedDocumentMetadata(document_name=params.file.filename, page=page_num)
+                    yield ParsedDocumentPage(content=text, images={}, metadata=metadata)
+
+                if next_window is None:
+                    break
+                _, texts = await next_window
+                start += len(texts)
 
         except Exception as e:
             logger.exception(f"Failed to parse pdf file: {e}")
             raise HTTPException(status_code=500, detail="Failed to parse pdf file.")
 
+        finally:
+            if path:
+                os.remove(path)
+
+    @staticmethod
+    def _write_temporary_file(content: BinaryIO) -> str:
+        # the uploaded file is copied by chunks, without being read in memory
+        content.seek(0)
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as file:
+            shutil.copyfileobj(content, file)
+        content.seek(0)
+
+        return file.name
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # the process pool is shared by all parser managers (including the ones created by a model reload) of the API worker
+        if ParserManager._executor is None:
+            ParserManager._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        return ParserManager._executor
+
+    @classmethod
+    def shutdown(cls) -> None:
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
     async def _parse_html(self, params: ParserParams) -> ParsedDocument:
         if self.parser_client and FileType.HTML in self.parser_client.SUPPORTED_FORMATS:
             document = await self.parser_client.parse(params)
@@ -0,0 +1,150 @@
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+
+from coredis import ConnectionPool, Redis
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Exact-match response cache for deterministic requests (`temperature` set to 0), stored in Redis.
+
+    The cache key is a hash of the canonical JSON body of the request (model, messages or prompt and sampling parameters). Streamed responses
+    are stored as a list of server-sent events and replayed as server-sent events. Responses served from the cache have `usage.cached` set
+    to true, so that billing can decide if cache hits are charged.
+    """
+
+    KEY_PREFIX = "response_cache"
+
+    def __init__(self, redis: ConnectionPool, ttl: int, max_size: int) -> None:
+        self.redis = Redis(connection_pool=redis)
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def get_key(self, endpoint: str, model: str, body: dict, cache_control: Optional[str] = None) -> Optional[str]:
+        """
+        Get the cache key of a request.
+
+        Args:
+            endpoint(str): The endpoint of the request.
+            model(str): The model name (aliases must be resolved to share the cache between aliases).
+            body(dict): The body of the request.
+            cache_control(Optional[str]): The Cache-Control header of the request, `no-cache` and `no-store` bypass the cache.
+
+        Returns:
+            Optional[str]: The cache key, None if the request is not cacheable.
+        """
+        if body.get("temperature") != 0:  # non deterministic request
+            return None
+
+        if cache_control and ("no-cache" in cache_control or "no-store" in cache_control):
+            return None
+
+        body = dumps({**body, "model": model}, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+        return f"{self.KEY_PREFIX}:{endpoint}:{sha256(body.encode(encoding="utf-8")).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[dict | List[dict]]:
+        """
+        Get a cached response, with `usage.cached` set to true.
+
+        Args:
+            key(str): The cache key of the request.
+
+        Returns:
+            Optional[dict | List[dict]]: The cached response (list of events for streamed responses), None if not found.
+        """
+        try:
+            value = await self.redis.get(key=key)
+        except Exception:
+            logger.exception(msg=f"Failed to get response {key} from cache.")
+            return None
+
+        if value is None:
+            return None
+
+        value = loads(value)
+        for data in value if isinstance(value, list) else [value]:
+            if data.get("usage"):
+                data["usage"]["cached"] = True
+
+        return value
+
+    async def set(self, key: str, value: dict | List[dict]) -> None:
+        """
+        Store a response in the cache, responses larger than the max size are not stored.
+
+        Args:
+            key(str): The cache key of the request.
+            value(dict | List[dict]): The response (list of events for streamed responses).
+        """
+        value = dumps(value)
+        if len(value) > self.max_size:
+            logger.debug(msg=f"Response {key} is too large to be cached ({len(value)} bytes).")
+            return
+
+        try:
+            await self.redis.set(key=key, value=value, ex=self.ttl)
+        except Exception:
+            logger.exception(msg=f"Failed to set response {key} in cache.")
+
+    async def tee(self, key: str, stream: AsyncIterator[Tuple[bytes, int]]) -> AsyncIterator[Tuple[bytes, int]]:
+        """
+        Forward a streamed response and store it in the cache once it is complete and successful.
+
+        Args:
+            key(str): The cache key of the request.
+            stream(AsyncIterator[Tuple[bytes, int]]): The streamed response, as (chunk, status code) tuples.
+        """
+        buffer, size, cacheable = list(), 0, True
+        async for chunk, status_code in stream:
+            yield chunk, status_code
+
+            if not cacheable:
+                continue
+
+            size += len(chunk)
+            if status_code // 100 != 2 or size > self.max_size:
+                cacheable = False
+                buffer = list()
+                continue
+
+            buffer.append(chunk)
+
+        if not cacheable or not buffer:
+            return
+
+        events, done = list(), False
+        for lines in buffer:
+            for line in lines.decode(encoding="utf-8").split(sep="\n\n"):
+                line = line.strip()
+                if not line.startswith("data: "):
+                    continue
+                line = line.removeprefix("data: ")
+                if line == "[DONE]":
+                    done = True
+                    continue
+                try:
+                    events.append(loads(line))
+                except JSONDecodeError:
+                    logger.debug(msg=f"Failed to decode JSON from streaming response on the following chunk: {line}.")
+                    return
+
+        if done and events:  # incomplete streams are not cached
+            await self.set(key=key, value=events)
+
+    @staticmethod
+    async def replay(events: List[dict]) -> AsyncIterator[Tuple[bytes, int]]:
+        """
+        Replay a cached streamed response as server-sent events.
+
+        Args:
+            events(List[dict]): The cached events of the streamed response.
+        """
+        for event in events:
+            yield f"data: {dumps(event)}\n\n".encode(), 200
+
+        yield b"data: [DONE]\n\n", 200
@@ -0,0 +1,64 @@
+from typing import List, Optional
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.exceptions import FileSizeLimitExceededException
+
+
+class UploadSizeLimiter:
+    """
+    ASGI middleware rejecting the uploads larger than `max_size` bytes while the body is still received, instead of once the whole body has
+    been spooled by the multipart parser. Requests with a larger Content-Length are rejected before the body is read, and chunked requests
+    are cut as soon as the received body exceeds the limit.
+
+    Args:
+        app(ASGIApp): The ASGI application.
+        max_size(int): The maximum size of the request body in bytes.
+        paths(List[str]): The paths of the upload endpoints (and their sub paths) whose requests are limited.
+        detail(Optional[str]): The error message of the rejected requests, the default message of FileSizeLimitExceededException if not provided.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int, paths: List[str], detail: Optional[str] = None) -> None:
+        self.app = app
+        self.max_size = max_size
+        self.paths = paths
+        self.detail = detail
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._is_limited(path=scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            await self._send_error(send=send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise self._get_exception()
+
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _is_limited(self, path: str) -> bool:
+        return any(path == limited_path or path.startswith(f"{limited_path}/") for limited_path in self.paths)
+
+    def _get_exception(self) -> FileSizeLimitExceededException:
+        return FileSizeLimitExceededException() if self.detail is None else FileSizeLimitExceededException(detail=self.detail)
+
+    async def _send_error(self, send: Send) -> None:
+        exception = self._get_exception()
+        body = orjson.dumps({"detail": exception.detail})
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")]
+        await send({"type": "http.response.start", "status": exception.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -1,17 +1,25 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import math
+import re
+from typing import Optional
 
-from sqlalchemy import desc, asc, func
+from sqlalchemy import and_, delete, func, or_, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.schemas.accounts import AccountUsage
 from app.sql.models import Usage as UsageModel
+from app.sql.models import UsageDaily, UsageHourly
+from app.utils.pagination import encode_cursor, paginate
 
 
 class UsageManager:
     """Manager class for handling usage-related database operations and data processing."""
 
+    PARTITIONS_AHEAD = 2  # number of monthly partitions of the usage table created in advance
+    PARTITION_PATTERN = re.compile(r"usage_(\d{4})_(\d{2})")
+
     @staticmethod
     def normalize_date_range(date_from: int = None, date_to: int = None) -> tuple[int, int]:
         """
@@ -51,7 +59,24 @@ class UsageManager:
         )
 
     @staticmethod
-    def build_usage_query(base_filter: tuple, order_by: str, order_direction: str, page: int, limit: int):
+    def get_order_columns(order_by: str) -> list:
+        """
+        Get the columns ordering the usage records, null costs and token counts being ordered as zeros, and the ID making the order deterministic.
+
+        Args:
+            order_by: Field to order by
+
+        Returns:
+            List of order columns
+        """
+        order_field = getattr(UsageModel, order_by)
+        if order_by != "datetime":
+            order_field = func.coalesce(order_field, 0)
+
+        return [order_field, UsageModel.id]
+
+    @staticmethod
+    def build_usage_query(base_filter: tuple, order_by: str, order_direction: str, page: int, limit: int, cursor: Optional[str] = None):
         """
         Build the main usage query with ordering and pagination.
 
@@ -59,62 +84,182 @@ class UsageManager:
             base_filter: Base filter conditions
             order_by: Field to order by
             order_direction: Order direction (asc/desc)
-            page: Page number (1-based)
+            page: Page number (1-based), ignored if a cursor is provided
             limit: Number of records per page
+            cursor: Cursor returned with the previous page (keyset pagination)
 
         Returns:
             SQLAlchemy query object
         """
         query = select(UsageModel).where(*base_filter)
+        columns = UsageManager.get_order_columns(order_by=order_by)
 
-        # Apply ordering
-        order_field = getattr(UsageModel, order_by)
-        if order_direction == "desc":
-            query = query.order_by(desc(order_field))
+        return paginate(query, columns=columns, order_direction=order_direction, offset=(page - 1) * limit, limit=limit, cursor=cursor)
+
+    @staticmethod
+    def get_next_cursor(usage_records, order_by: str, limit: int) -> Optional[str]:
+        """
+        Get the cursor of the next page from the usage records of a page.
+
+        Args:
+            usage_records: List of UsageModel records of the page
+            order_by: Field to order by
+            limit: Number of records per page
+
+        Returns:
+            Cursor of the next page, None if the page is the last one
+        """
+        if len(usage_records) < limit:
+            return None
+
+        value = getattr(usage_records[-1], order_by)
+        return encode_cursor(value if order_by == "datetime" else value or 0, usage_records[-1].id)
+
+    @staticmethod
+    def split_date_range(date_from: int, date_to: int) -> dict[str, list[tuple[datetime, datetime]]]:
+        """
+        Split a date range into the full days and the full hours it contains, served by the rollup tables, and the partial hours at its
+        bounds, served by the usage table.
+
+        Args:
+            date_from: Start date as Unix timestamp
+            date_to: End date as Unix timestamp (included)
+
+        Returns:
+            Dictionary with the "daily", "hourly" and "raw" ranges, as (start, end) tuples with excluded end
+        """
+        start = datetime.fromtimestamp(date_from)
+        end = datetime.fromtimestamp(date_to) + timedelta(microseconds=1)
+
+        hour_start = start.replace(minute=0, second=0, microsecond=0)
+        hour_start += timedelta(hours=1) if hour_start < start else timedelta(0)
+        hour_end = end.replace(minute=0, second=0, microsecond=0)
+        if hour_start >= hour_end:
+            return {"daily": [], "hourly": [], "raw": [(start, end)] if start < end else []}
+
+        day_start = hour_start.replace(hour=0)
+        day_start += timedelta(days=1) if day_start < hour_start else timedelta(0)
+        day_end = hour_end.replace(hour=0)
+        if day_start >= day_end:
+            daily, hourly = [], [(hour_start, hour_end)]
         else:
-            query = query.order_by(asc(order_field))
+            daily, hourly = [(day_start, day_end)], [(hour_start, day_start), (day_end, hour_end)]
 
-        # Apply pagination
-        offset = (page - 1) * limit
-        query = query.offset(offset).limit(limit)
+        def non_empty(ranges: list[tuple[datetime, datetime]]) -> list[tuple[datetime, datetime]]:
+            return [(range_start, range_end) for range_start, range_end in ranges if range_start < range_end]
 
-        return query
+        return {"daily": daily, "hourly": non_empty(hourly), "raw": non_empty([(start, hour_start), (hour_end, end)])}
 
     @staticmethod
-    async def get_usage_aggregation(session: AsyncSession, base_filter: tuple) -> dict:
+    async def count_usage_records(session: AsyncSession, base_filter: tuple) -> int:
         """
-        Get aggregated usage statistics for the given filters.
+        Count the usage records matching the filters, the records listed by the usage query (see `build_usage_query`).
 
         Args:
             session: Database session
             base_filter: Base filter conditions
 
+        Returns:
+            Number of usage records
+        """
+        result = await session.execute(select(func.count(UsageModel.id)).where(*base_filter))
+        return result.scalar()
+
+    @staticmethod
+    async def get_usage_aggregation(session: AsyncSession, user_id: int, date_from: int, date_to: int) -> dict:
+        """
+        Get aggregated usage statistics for the given user and date range. Full days and full hours of the range are aggregated from the rollup
+        tables, only the partial hours at the bounds of the range are aggregated from the usage table. The number of listed records is counted
+        on the usage table (see `count_usage_records`).
+
+        Args:
+            session: Database session
+            user_id: Current user ID
+            date_from: Start date as Unix timestamp
+            date_to: End date as Unix timestamp
+
         Returns:
             Dictionary with aggregated values
         """
-        # Total count query
-        count_query = select(func.count(UsageModel.id)).where(*base_filter)
-        count_result = await session.execute(count_query)
-        total_count = count_result.scalar()
+        ranges = UsageManager.split_date_range(date_from=date_from, date_to=date_to)
+
+        queries = []
+        for table, table_ranges in [(UsageDaily, ranges["daily"]), (UsageHourly, ranges["hourly"])]:
+            if not table_ranges:
+                continue
+            queries.append(
+                select(
+                    func.sum(table.requests),
+                    func.sum(table.cost),
+                    func.sum(table.total_tokens),
+                    func.sum(table.kgco2eq_min + table.kgco2eq_max) / 2,
+                    func.sum(table.kgco2eq_count),
+                ).where(table.user_id == user_id, or_(*[and_(table.period >= start, table.period < end) for start, end in table_ranges]))
+            )
 
-        # Aggregated values query
-        aggregation_query = select(
-            func.count(UsageModel.id).label("total_requests"),
-            func.coalesce(func.sum(UsageModel.cost), 0).label("total_albert_coins"),
-            func.coalesce(func.sum(UsageModel.total_tokens), 0).label("total_tokens"),
-            func.coalesce(func.avg((UsageModel.kgco2eq_min + UsageModel.kgco2eq_max) / 2) * 1000, 0).label("total_co2"),
-        ).where(*base_filter)
+        if ranges["raw"]:
+            queries.append(
+                select(
+                    func.count(UsageModel.id),
+                    func.sum(UsageModel.cost),
+                    func.sum(UsageModel.total_tokens),
+                    func.sum((UsageModel.kgco2eq_min + UsageModel.kgco2eq_max) / 2),
+                    func.count(UsageModel.kgco2eq_min + UsageModel.kgco2eq_max),
+                ).where(
+                    UsageModel.user_id == user_id,
+                    UsageModel.model.is_not(None),
+                    or_(*[and_(UsageModel.datetime >= start, UsageModel.datetime < end) for start, end in ranges["raw"]]),
+                )
+            )
 
-        aggregation_result = await session.execute(aggregation_query)
-        aggregation_data = aggregation_result.first()
+        total_requests, total_albert_coins, total_tokens, total_kgco2eq, kgco2eq_count = 0, 0.0, 0, 0.0, 0
+        for query in queries:
+            requests, cost, tokens, kgco2eq, count = (await session.execute(query)).first()
+            total_requests += requests or 0
+            total_albert_coins += cost or 0.0
+            total_tokens += tokens or 0
+            total_kgco2eq += kgco2eq or 0.0
+            kgco2eq_count += count or 0
 
         return {
-            "total_count": total_count,
-            "total_requests": aggregation_data.total_requests or 0,
-            "total_albert_coins": float(aggregation_data.total_albert_coins) if aggregation_data.total_albert_coins else 0.0,
-            "total_tokens": int(aggregation_data.total_tokens) if aggregation_data.total_tokens else 0,
-            "total_co2": float(aggregation_data.total_co2) if aggregation_data.total_co2 else 0.0,
+            "total_requests": total_requests,
+            "total_albert_coins": float(total_albert_coins),
+            "total_tokens": int(total_tokens),
+            "total_co2": float(total_kgco2eq / kgco2eq_count * 1000) if kgco2eq_count else 0.0,
+        }
+
+    @staticmethod
+    async def add_to_rollups(session: AsyncSession, usage: UsageModel) -> None:
+        """
+        Add a usage record to the hourly and daily rollup tables, in the transaction of the session. Records without user or model are not
+        aggregated, like in the usage statistics.
+
+        Args:
+            session: Database session
+            usage: Usage record
+        """
+        if usage.user_id is None or usage.model is None:
+            return
+
+        has_kgco2eq = usage.kgco2eq_min is not None and usage.kgco2eq_max is not None
+        values = {
+            "requests": 1,
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "completion_tokens": usage.completion_tokens or 0,
+            "total_tokens": usage.total_tokens or 0,
+            "cost": usage.cost or 0.0,
+            "kgco2eq_min": usage.kgco2eq_min if has_kgco2eq else 0.0,
+            "kgco2eq_max": usage.kgco2eq_max if has_kgco2eq else 0.0,
+            "kgco2eq_count": 1 if has_kgco2eq else 0,
         }
+        hour = usage.datetime.replace(minute=0, second=0, microsecond=0)
+        for table, period in [(UsageHourly, hour), (UsageDaily, hour.replace(hour=0))]:
+            statement = insert(table).values(period=period, user_id=usage.user_id, model=usage.model, endpoint=usage.endpoint, **values)
+            statement = statement.on_conflict_do_update(
+                index_elements=["user_id", "period", "model", "endpoint"],
+                set_={name: getattr(table, name) + statement.excluded[name] for name in values},
+            )
+            await session.execute(statement)
 
     @staticmethod
     def convert_records_to_schema(usage_records) -> list[AccountUsage]:
@@ -150,6 +295,7 @@ class UsageManager:
                     kwh_max=record.kwh_max,
                     kgco2eq_min=record.kgco2eq_min,
                     kgco2eq_max=record.kgco2eq_max,
+                    cached=bool(record.cached),
                 )
             )
         return usage_data
@@ -174,3 +320,82 @@ class UsageManager:
             "total_pages": total_pages,
             "has_more": has_more,
         }
+
+    @staticmethod
+    def add_months(month: date, months: int) -> date:
+        """
+        Get the first day of the month shifted by a number of months.
+
+        Args:
+            month: Day of the reference month
+            months: Number of months to add (can be negative)
+
+        Returns:
+            First day of the shifted month
+        """
+        index = month.year * 12 + month.month - 1 + months
+        return date(index // 12, index % 12 + 1, 1)
+
+    @staticmethod
+    async def maintain_partitions(session: AsyncSession, retention_months: Optional[int] = None, today: Optional[date] = None) -> list[str]:
+        """
+        Create the monthly partitions of the usage table for the current month and the next ones, and drop the partitions older than the
+        retention (a dropped partition is removed without the cost of a DELETE and of the vacuum). The hourly and daily rollups older than the
+        retention are deleted too, so the usage totals only aggregate the records that can still be listed. The records stored in the default
+        partition (when the maintenance did not run in time) are moved to the partition of their month when it is created. Concurrent
+        maintenances (one per API worker) are serialized by an advisory lock.
+
+        Args:
+            session: Database session
+            retention_months: Number of months kept in addition to the current month (default: no retention)
+            today: Current day (default: today)
+
+        Returns:
+            Names of the dropped partitions
+        """
+        today = today or date.today()
+        await session.execute(text("SELECT pg_advisory_xact_lock(hashtext('usage_partitions'))"))
+        await session.execute(text("CREATE TABLE IF NOT EXISTS usage_default PARTITION OF usage DEFAULT"))
+
+        partitions = await session.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "WHERE parent.relname = 'usage'"
+            )
+        )
+        partitions = sorted(partitions.scalars())
+
+        for offset in range(UsageManager.PARTITIONS_AHEAD + 1):
+            start, end = UsageManager.add_months(today, offset), UsageManager.add_months(today, offset + 1)
+            name = f"usage_{start:%Y_%m}"
+            if name in partitions:
+                continue
+
+            # a partition can't be added while the default partition holds records of its range, they are moved before it is attached
+            await session.execute(text(f"CREATE TABLE {name} (LIKE usage INCLUDING DEFAULTS)"))
+            await session.execute(
+                text(
+                    f"WITH moved AS (DELETE FROM usage_default WHERE datetime >= '{start}' AND datetime < '{end}' RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved"
+                )
+            )
+            await session.execute(text(f"ALTER TABLE usage ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+
+        dropped = []
+        if retention_months:
+            oldest = UsageManager.add_months(today, -retention_months)
+            for name in partitions:
+                match = UsageManager.PARTITION_PATTERN.fullmatch(name)
+                if match and date(int(match[1]), int(match[2]), 1) < oldest:
+                    await session.execute(text(f"DROP TABLE {name}"))
+                    dropped.append(name)
+
+            oldest = datetime.combine(oldest, datetime.min.time())
+            await session.execute(text(f"DELETE FROM usage_default WHERE datetime < '{oldest}'"))
+            await session.execute(delete(UsageHourly).where(UsageHourly.period < oldest))
+            await session.execute(delete(UsageDaily).where(UsageDaily.period < oldest))
+
+        await session.commit()
+
+        return dropped
@@ -0,0 +1,103 @@
+from collections import Counter
+import math
+import re
+from typing import List
+
+import numpy as np
+
+from app.schemas.chunks import Chunk
+from app.schemas.search import Search, SearchMethod
+
+
+class WebIndex:
+    """
+    Ephemeral in-memory index of the chunks of web search results, built for one search request.
+
+    Semantic search is a cosine similarity between the query vector and the chunk vectors, lexical search is a BM25 score and hybrid search
+    combines both with Reciprocal Rank Fusion (RRF), like the vector store clients. Scores are computed the same way as the vector stores, so
+    that web results can be merged with the results of the collections.
+    """
+
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    HYBRID_EXPANSION_FACTOR = 2
+    TOKEN_PATTERN = re.compile(r"\w+")
+
+    def __init__(self, chunks: List[Chunk], embeddings: List[List[float]]) -> None:
+        self.chunks = chunks
+
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms == 0, 1, norms)
+
+        self.terms = [Counter(self._tokenize(text=chunk.content)) for chunk in chunks]
+        self.lengths = np.array([sum(terms.values()) for terms in self.terms], dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if len(chunks) else 0.0
+        document_frequencies = Counter(term for terms in self.terms for term in terms)
+        self.idf = {term: math.log(1 + (len(chunks) - frequency + 0.5) / (frequency + 0.5)) for term, frequency in document_frequencies.items()}
+
+    def search(self, method: SearchMethod, query_prompt: str, query_vector: List[float], k: int, rff_k: int = 20, score_threshold: float = 0.0) -> List[Search]:  # fmt: off
+        """
+        Search the chunks of the index.
+
+        Args:
+            method(SearchMethod): The search method (semantic, lexical or hybrid).
+            query_prompt(str): The query prompt, used by lexical search.
+            query_vector(List[float]): The query vector, used by semantic search.
+            k(int): The number of results to return.
+            rff_k(int): The constant k of the RRF formula, used by hybrid search.
+            score_threshold(float): The minimum score of the results of semantic and lexical search.
+
+        Returns:
+            List[Search]: The results, sorted by decreasing score.
+        """
+        if not self.chunks:
+            return []
+
+        if method == SearchMethod.LEXICAL:
+            return self._rank(method=method, scores=self._lexical_scores(query_prompt=query_prompt), k=k, score_threshold=max(score_threshold, 1e-9))  # fmt: off
+
+        if method == SearchMethod.SEMANTIC:
+            return self._rank(method=method, scores=self._semantic_scores(query_vector=query_vector), k=k, score_threshold=score_threshold)
+
+        # hybrid search
+        expanded_k = int(k * self.HYBRID_EXPANSION_FACTOR)
+        lexical_scores = self._lexical_scores(query_prompt=query_prompt)
+        lexical_ranking = [index for index in np.argsort(-lexical_scores, kind="stable")[:expanded_k] if lexical_scores[index] > 0]
+        semantic_ranking = np.argsort(-self._semantic_scores(query_vector=query_vector), kind="stable")[:expanded_k]
+
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        for ranking in [lexical_ranking, semantic_ranking]:
+            for rank, index in enumerate(ranking):
+                scores[index] += 1 / (rff_k + rank + 1)
+
+        return self._rank(method=method, scores=scores, k=k, score_threshold=1e-9)
+
+    def _rank(self, method: SearchMethod, scores: np.ndarray, k: int, score_threshold: float) -> List[Search]:
+        searches = []
+        for index in np.argsort(-scores, kind="stable")[:k]:
+            if scores[index] < score_threshold:
+                break
+            searches.append(Search(method=method, score=float(scores[index]), chunk=self.chunks[index].model_copy(deep=True)))
+
+        return searches
+
+    def _semantic_scores(self, query_vector: List[float]) -> np.ndarray:
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+
+        return self.vectors @ (query_vector / norm if norm else query_vector)
+
+    def _lexical_scores(self, query_prompt: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        normalization = self.BM25_K1 * (1 - self.BM25_B + self.BM25_B * self.lengths / (self.average_length or 1))
+        for term in set(self._tokenize(text=query_prompt)):
+            if term not in self.idf:
+                continue
+            frequencies = np.array([terms.get(term, 0) for terms in self.terms], dtype=np.float64)
+            scores += self.idf[term] * frequencies * (self.BM25_K1 + 1) / (frequencies + normalization)
+
+        return scores
+
+    def _tokenize(self, text: str) -> List[str]:
+        return self.TOKEN_PATTERN.findall(text.lower())
@@ -1,18 +1,27 @@
+import asyncio
+from collections import defaultdict
 from io import BytesIO
 import logging
+import time
 from typing import List, Optional
 from urllib.parse import urlparse
 
 from fastapi import UploadFile
-import requests
+from html_to_markdown import convert_to_markdown
+import httpx
+from prometheus_client import Counter
 from starlette.datastructures import Headers
 
 from app.clients.web_search_engine import BaseWebSearchEngineClient as WebSearchEngineClient
 from app.helpers.models.routers import ModelRouter
 from app.utils.variables import ENDPOINT__CHAT_COMPLETIONS
 
+from ._contentcache import ContentCache
+
 logger = logging.getLogger(__name__)
 
+WEB_PAGE_CACHE_REQUESTS = Counter(name="web_page_cache_requests_total", documentation="Web page fetches by cache result (hit, revalidated, miss, negative_hit).", labelnames=["result"])  # fmt: off
+
 
 class WebSearchManager:
     GET_WEB_QUERY_PROMPT = """Tu es un spécialiste pour transformer des demandes en requête google. Tu sais écrire les meilleurs types de recherche pour arriver aux meilleurs résultats.
@@ -32,17 +41,49 @@ Exemples :
 Ne donne pas d'explications, ne mets pas de guillemets, réponds uniquement avec la requête Google qui renverra les meilleurs résultats pour la demande. Ne mets pas de mots qui ne servent à rien dans la requête Google.
 """
 
+    MAX_CONNECTIONS = 100
+
+    _client: Optional[httpx.AsyncClient] = None
+
     def __init__(
         self,
         web_search_engine: WebSearchEngineClient,
         query_model: ModelRouter,
         limited_domains: Optional[List[str]] = None,
         user_agent: Optional[str] = None,
+        max_concurrency: int = 8,
+        max_concurrency_per_host: int = 2,
+        timeout: float = 10,
+        max_size: int = 5242880,
+        cache: Optional[ContentCache] = None,
+        cache_ttl: int = 3600,
+        cache_negative_ttl: int = 300,
     ) -> None:
         self.web_search_engine = web_search_engine
         self.query_model = query_model
         self.limited_domains = [] if limited_domains is None else limited_domains
         self.user_agent = user_agent
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.timeout = timeout
+        self.max_size = max_size
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.cache_negative_ttl = cache_negative_ttl
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        # the HTTP client is shared by all web search managers of the API worker, to reuse connections and bound the number of connections
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(follow_redirects=True, limits=httpx.Limits(max_connections=cls.MAX_CONNECTIONS))
+
+        return cls._client
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
 
     async def get_web_query(self, prompt: str) -> str:
         prompt = self.GET_WEB_QUERY_PROMPT.format(prompt=prompt)
@@ -56,35 +97,158 @@ Ne donne pas d'explications, ne mets pas de guillemets, réponds uniquement avec
         return query
 
     async def get_results(self, query: str, k: int) -> List[UploadFile]:
+        """
+        Search the web and fetch the result pages concurrently.
+
+        Pages are fetched with at most `max_concurrency` concurrent requests and `max_concurrency_per_host` concurrent requests per host.
+        Pages not fetched after `timeout` seconds are skipped, as well as pages larger than `max_size` bytes. Results are returned in rank order.
+
+        Args:
+            query(str): The web search query.
+            k(int): The number of results of the web search.
+
+        Returns:
+            List[UploadFile]: The text of the fetched pages, as markdown files.
+        """
         urls = await self.web_search_engine.search(query=query, k=k)
+        urls = [url for url in urls if self._is_authorized(url=url)]
+        if not urls:
+            return []
+
+        semaphore = asyncio.Semaphore(value=self.max_concurrency)
+        host_semaphores = defaultdict(lambda: asyncio.Semaphore(value=self.max_concurrency_per_host))
+
+        async def fetch(url: str) -> Optional[str]:
+            async with host_semaphores[urlparse(url).hostname], semaphore:
+                return await self._fetch(url=url)
+
+        tasks = [asyncio.create_task(fetch(url=url)) for url in urls]
+        done, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            logger.debug(msg=f"Web page {urls[tasks.index(task)]} not fetched before the deadline, skipped.")
+            task.cancel()
+
         results = []
-        for url in urls:
-            # Parse the URL and extract the hostname
-            parsed = urlparse(url)
-            domain = parsed.hostname
-            if not domain:
-                # Skip invalid URLs
+        for url, task in zip(urls, tasks):  # rank order
+            if task not in done:
                 continue
-
-            # Check if the domain is authorized
-            if self.limited_domains:
-                # Allow exact match or subdomains of allowed domains
-                if not any(domain == allowed or domain.endswith(f".{allowed}") for allowed in self.limited_domains):
-                    # Skip unauthorized domains
-                    continue
-
-            # Fetch the content, skipping on network errors
-            try:
-                response = requests.get(url=url, headers={"User-Agent": self.user_agent}, timeout=5)
-            except requests.RequestException:
-                logger.exception("Error fetching URL: %s", url)
+            if task.exception() is not None:
+                logger.error(msg=f"Error fetching URL {url}: {task.exception()}")
                 continue
-
-            if response.status_code != 200:
+            if task.result() is None:
                 continue
 
-            file = BytesIO(response.text.encode("utf-8"))
-            file = UploadFile(filename=f"{url}.html", file=file, headers=Headers({"content-type": "text/html"}))
+            file = BytesIO(task.result().encode("utf-8"))
+            file = UploadFile(filename=f"{url}.md", file=file, headers=Headers({"content-type": "text/markdown"}))
             results.append(file)
 
         return results
+
+    def _is_authorized(self, url: str) -> bool:
+        # Parse the URL and extract the hostname
+        domain = urlparse(url).hostname
+        if not domain:
+            # Skip invalid URLs
+            return False
+
+        # Check if the domain is authorized, allow exact match or subdomains of allowed domains
+        if self.limited_domains and not any(domain == allowed or domain.endswith(f".{allowed}") for allowed in self.limited_domains):
+            return False
+
+        return True
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        """
+        Fetch the text of a web page. If a cache is provided, the text of the page is cached with its `ETag` and `Last-Modified` headers:
+        fresh entries are served from the cache, stale entries are revalidated with a conditional request. Failing pages are cached for
+        `cache_negative_ttl` seconds.
+
+        Args:
+            url(str): The URL of the web page.
+
+        Returns:
+            Optional[str]: The text of the web page (HTML converted to markdown), None if the web page can't be fetched.
+        """
+        key = self.cache.get_key("web_page", url) if self.cache else None
+        entry = await self.cache.get(key=key) if key else None
+        age = time.time() - entry["fetched_at"] if entry else None
+
+        if entry and entry["text"] is None and age < self.cache_negative_ttl:
+            WEB_PAGE_CACHE_REQUESTS.labels(result="negative_hit").inc()
+            return None
+
+        if entry and entry["text"] is not None and self._is_authorized(url=entry["url"]):
+            if age < self.cache_ttl:
+                WEB_PAGE_CACHE_REQUESTS.labels(result="hit").inc()
+                return entry["text"]
+        else:
+            entry = None
+
+        headers = {"User-Agent": self.user_agent} if self.user_agent else {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        # Fetch the content, skipping on network errors, non 200 responses and too large responses
+        try:
+            async with self.get_client().stream(method="GET", url=url, headers=headers, timeout=self.timeout) as response:
+                # redirections must stay in the authorized domains
+                if str(response.url) != url and not self._is_authorized(url=str(response.url)):
+                    logger.debug(msg=f"Web page {url} redirected to unauthorized domain {response.url}, skipped.")
+                    return None
+
+                if response.status_code == 304 and entry:
+                    WEB_PAGE_CACHE_REQUESTS.labels(result="revalidated").inc()
+                    await self.cache.set(key=key, value={**entry, "fetched_at": time.time()})
+                    return entry["text"]
+
+                html = await self._read(url=url, response=response)
+
+        except (httpx.HTTPError, LookupError, ValueError):
+            logger.exception("Error fetching URL: %s", url)
+            html, response = None, None
+
+        if key:
+            WEB_PAGE_CACHE_REQUESTS.labels(result="miss").inc()
+
+        text = None
+        if html is not None:
+            text = await asyncio.to_thread(self._clean, html)
+
+        if key:
+            await self.cache.set(
+                key=key,
+                value={
+                    "url": str(response.url) if response else url,
+                    "text": text,
+                    "etag": response.headers.get("ETag") if response else None,
+                    "last_modified": response.headers.get("Last-Modified") if response else None,
+                    "fetched_at": time.time(),
+                },
+            )
+
+        return text
+
+    async def _read(self, url: str, response: httpx.Response) -> Optional[str]:
+        if response.status_code != 200:
+            return None
+
+        if int(response.headers.get("Content-Length", 0)) > self.max_size:
+            logger.debug(msg=f"Web page {url} is too large, skipped.")
+            return None
+
+        content, size = [], 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > self.max_size:
+                logger.debug(msg=f"Web page {url} is too large, skipped.")
+                return None
+            content.append(chunk)
+
+        return b"".join(content).decode(encoding=response.encoding or "utf-8", errors="replace")
+
+    @staticmethod
+    def _clean(html: str) -> str:
+        # scripts, styles and markup are removed, only the text of the page is kept
+        return convert_to_markdown(html).strip()
@@ -1,3 +1,4 @@
+from ._embeddingsbatcher import EmbeddingsBatcher
 from ._modelregistry import ModelRegistry
 
-__all__ = ["ModelRegistry"]
+__all__ = ["EmbeddingsBatcher", "ModelRegistry"]
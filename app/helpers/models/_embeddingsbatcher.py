@@ -0,0 +1,179 @@
+import asyncio
+from json import dumps
+import logging
+from typing import Any, Dict, List, Tuple
+
+from fastapi import HTTPException
+import httpx
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.inputs = list()
+        self.callers = list()  # (future, number of inputs)
+        self.flushed = False
+        self.timer = None
+
+
+class EmbeddingsBatcher:
+    """
+    Coalesce concurrent embeddings requests of a model client in a single request.
+
+    Inputs of concurrent requests with the same parameters are collected for at most `max_wait_ms` milliseconds or until `max_batch_size`
+    inputs are collected, then sent in one request. The embeddings are split back to each caller, which computes its own usage from its
+    own inputs (usage is computed by the model client in the request context of the caller). If the batched request is rejected by the
+    model (4xx), the requests are sent separately so that the invalid inputs of a caller do not fail the other callers.
+    """
+
+    def __init__(self, max_wait_ms: int, max_batch_size: int) -> None:
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._batches: Dict[str, _Batch] = dict()
+        self._tasks = set()
+
+    async def __call__(self, client: Any, url: str, json: dict) -> Tuple[httpx.Response, float]:
+        """
+        Forward an embeddings request through the batcher.
+
+        Args:
+            client(BaseModelClient): The model client to send the batched request.
+            url(str): The url of the embeddings endpoint of the model client.
+            json(dict): The formatted JSON body of the request.
+
+        Returns:
+            tuple: The response containing only the embeddings of the request and its share of the latency of the batched request in seconds.
+        """
+        inputs = self._get_inputs(input=json["input"])
+        if len(inputs) >= self.max_batch_size:  # already a full batch
+            return await client.send_request(method="POST", url=url, json=json)
+
+        # only requests with the same parameters and the same input format can be batched together
+        params = {key: value for key, value in json.items() if key != "input"}
+        key = dumps([params, isinstance(inputs[0], str)], sort_keys=True)
+
+        batch = self._batches.get(key)
+        if batch is not None and len(batch.inputs) + len(inputs) > self.max_batch_size:
+            self._flush(client=client, url=url, params=params, key=key, batch=batch)
+            batch = None
+
+        if batch is None:
+            batch = _Batch()
+            self._batches[key] = batch
+            batch.timer = self._run(self._flush_later(client=client, url=url, params=params, key=key, batch=batch))
+
+        future = asyncio.get_running_loop().create_future()
+        batch.inputs.extend(inputs)
+        batch.callers.append((future, len(inputs)))
+
+        if len(batch.inputs) >= self.max_batch_size:
+            self._flush(client=client, url=url, params=params, key=key, batch=batch)
+
+        return await future
+
+    @staticmethod
+    def _get_inputs(input: str | List[str] | List[int] | List[List[int]]) -> List[str] | List[List[int]]:
+        if isinstance(input, str):
+            return [input]
+        if isinstance(input[0], int):  # single array of tokens
+            return [input]
+        return list(input)
+
+    def _run(self, coroutine) -> asyncio.Task:
+        # keep a reference to the task to avoid garbage collection before completion
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return task
+
+    async def _flush_later(self, client: Any, url: str, params: dict, key: str, batch: _Batch) -> None:
+        await asyncio.sleep(self.max_wait)
+        self._flush(client=client, url=url, params=params, key=key, batch=batch)
+
+    def _flush(self, client: Any, url: str, params: dict, key: str, batch: _Batch) -> None:
+        if batch.flushed:
+            return
+
+        batch.flushed = True
+        if batch.timer is not None and batch.timer is not asyncio.current_task():
+            batch.timer.cancel()
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+
+        self._run(self._send(client=client, url=url, params=params, batch=batch))
+
+    async def _send(self, client: Any, url: str, params: dict, batch: _Batch) -> None:
+        logger.debug(msg=f"send {len(batch.inputs)} inputs of {len(batch.callers)} embeddings requests to {client.name}.")
+        try:
+            response, request_latency = await client.send_request(method="POST", url=url, json={**params, "input": batch.inputs})
+            body = orjson.loads(response.content)
+            data = sorted(body["data"], key=lambda embedding: embedding["index"])
+            assert len(data) == len(batch.inputs), f"Invalid number of embeddings ({len(data)} instead of {len(batch.inputs)})."
+        except HTTPException as e:
+            if 400 <= e.status_code < 500 and len(batch.callers) > 1:
+                # the invalid inputs of a caller must not fail the other callers of the batch
+                logger.debug(msg=f"batched embeddings request to {client.name} failed ({e.status_code}), send the requests separately.")
+                await self._send_separately(client=client, url=url, params=params, batch=batch)
+            else:
+                self._set_exception(batch=batch, exception=e)
+            return
+        except Exception as e:
+            self._set_exception(batch=batch, exception=e)
+            return
+        except BaseException:  # batcher task cancelled
+            for future, _ in batch.callers:
+                future.cancel()
+            raise
+
+        # the usage of the batched request is removed, each caller computes its own usage
+        body.pop("usage", None)
+
+        offset = 0
+        for future, size in batch.callers:
+            embeddings = [{**embedding, "index": index} for index, embedding in enumerate(data[offset : offset + size])]
+            offset += size
+            if future.done():  # caller cancelled
+                continue
+
+            content = orjson.dumps({**body, "data": embeddings})
+            future.set_result(
+                (
+                    httpx.Response(status_code=response.status_code, headers={"Content-Type": "application/json"}, content=content),
+                    # each caller is charged with the share of the latency of its inputs, used to compute its carbon footprint
+                    request_latency * size / len(batch.inputs),
+                )
+            )
+
+    async def _send_separately(self, client: Any, url: str, params: dict, batch: _Batch) -> None:
+        requests, offset = list(), 0
+        for future, size in batch.callers:
+            inputs = batch.inputs[offset : offset + size]
+            offset += size
+            if not future.done():  # caller cancelled
+                requests.append(self._send_caller(client=client, url=url, json={**params, "input": inputs}, future=future))
+
+        await asyncio.gather(*requests)
+
+    @staticmethod
+    async def _send_caller(client: Any, url: str, json: dict, future: asyncio.Future) -> None:
+        try:
+            result = await client.send_request(method="POST", url=url, json=json)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        except BaseException:  # batcher task cancelled
+            future.cancel()
+            raise
+
+        if not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    def _set_exception(batch: _Batch, exception: Exception) -> None:
+        for future, _ in batch.callers:
+            if not future.done():
+                future.set_exception(exception)
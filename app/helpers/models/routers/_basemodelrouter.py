@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from itertools import cycle
 import time
+from typing import Optional
 
 from app.clients.model import BaseModelClient as ModelClient
 from app.schemas.models import ModelType
@@ -53,12 +54,13 @@ class BaseModelRouter(ABC):
         self._providers = providers
 
     @abstractmethod
-    def get_client(self, endpoint: str) -> ModelClient:
+    def get_client(self, endpoint: str, body: Optional[dict] = None) -> ModelClient:
         """
         Get a client to handle the request
 
         Args:
             endpoint(str): The type of endpoint called
+            body(Optional[dict]): The JSON body of the request, used by routing strategies based on the request content
 
         Returns:
             BaseModelClient: The available client
@@ -1,5 +1,7 @@
+from typing import Optional
+
 from app.clients.model import BaseModelClient as ModelClient
-from app.helpers.models.routers.strategies import RoundRobinRoutingStrategy, ShuffleRoutingStrategy
+from app.helpers.models.routers.strategies import PrefixHashRoutingStrategy, RoundRobinRoutingStrategy, ShuffleRoutingStrategy
 from app.schemas.core.configuration import RoutingStrategy
 from app.schemas.models import ModelType
 from app.utils.exceptions import WrongModelTypeException
@@ -30,11 +32,15 @@ class ModelRouter(BaseModelRouter):
     ) -> None:
         super().__init__(name=name, type=type, owned_by=owned_by, aliases=aliases, routing_strategy=routing_strategy, providers=providers)
 
-    def get_client(self, endpoint: str) -> ModelClient:
+        self._ring = PrefixHashRoutingStrategy.build_ring(providers) if routing_strategy == RoutingStrategy.PREFIX_HASH else None
+
+    def get_client(self, endpoint: str, body: Optional[dict] = None) -> ModelClient:
         if endpoint and self.type not in self.ENDPOINT_MODEL_TYPE_TABLE[endpoint]:
             raise WrongModelTypeException()
 
-        if self._routing_strategy == RoutingStrategy.ROUND_ROBIN:
+        if self._routing_strategy == RoutingStrategy.PREFIX_HASH:
+            strategy = PrefixHashRoutingStrategy(self._providers, self._ring, PrefixHashRoutingStrategy.get_prefix(body))
+        elif self._routing_strategy == RoutingStrategy.ROUND_ROBIN:
             strategy = RoundRobinRoutingStrategy(self._providers, self._cycle)
         else:  # ROUTER_STRATEGY__SHUFFLE
             strategy = ShuffleRoutingStrategy(self._providers)
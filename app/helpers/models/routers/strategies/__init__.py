@@ -1,5 +1,6 @@
 from ._baserountingstrategy import BaseRoutingStrategy
+from ._prefixhashroutingstrategy import PrefixHashRoutingStrategy
 from ._roundrobinroutingstrategy import RoundRobinRoutingStrategy
 from ._shuffleroutingstrategy import ShuffleRoutingStrategy
 
-__all__ = ["BaseRoutingStrategy", "RoundRobinRoutingStrategy", "ShuffleRoutingStrategy"]
+__all__ = ["BaseRoutingStrategy", "PrefixHashRoutingStrategy", "RoundRobinRoutingStrategy", "ShuffleRoutingStrategy"]
@@ -0,0 +1,91 @@
+import bisect
+from hashlib import blake2b
+from json import dumps
+import math
+import random
+from typing import List, Optional, Tuple
+
+from app.clients.model import BaseModelClient as ModelClient
+from app.helpers.models.routers.strategies import BaseRoutingStrategy
+
+
+class PrefixHashRoutingStrategy(BaseRoutingStrategy):
+    """
+    Consistent hashing with bounded loads on the prompt prefix: requests sharing the same prefix (system prompt, RAG context...) are routed
+    to the same client to benefit from its prefix cache, unless this client has more than `LOAD_FACTOR` times the average number of active
+    requests. In this case, the next client on the hash ring is chosen.
+    """
+
+    PREFIX_LENGTH = 2048  # number of leading characters of the prompt used as routing key
+    LOAD_FACTOR = 1.25
+    VIRTUAL_NODES = 100
+
+    def __init__(self, clients: List[ModelClient], ring: List[Tuple[int, int]], prefix: Optional[str] = None) -> None:
+        super().__init__(clients)
+        self.ring = ring
+        self.prefix = prefix
+
+    @staticmethod
+    def hash(value: str) -> int:
+        # stable hash across API workers (built-in hash is salted by process)
+        return int.from_bytes(blake2b(value.encode(encoding="utf-8"), digest_size=8).digest(), byteorder="big")
+
+    @classmethod
+    def build_ring(cls, clients: List[ModelClient]) -> List[Tuple[int, int]]:
+        """
+        Build the hash ring of the clients.
+
+        Args:
+            clients(List[ModelClient]): The clients of the model.
+
+        Returns:
+            List[Tuple[int, int]]: The sorted hash ring, as (hash, client index) tuples.
+        """
+        return sorted((cls.hash(f"{client.url}|{client.name}|{node}"), index) for index, client in enumerate(clients) for node in range(cls.VIRTUAL_NODES))  # fmt: off
+
+    @classmethod
+    def get_prefix(cls, body: Optional[dict] = None) -> Optional[str]:
+        """
+        Get the routing key of a request from the leading characters of its messages or prompt.
+
+        Args:
+            body(Optional[dict]): The JSON body of the request.
+
+        Returns:
+            Optional[str]: The routing key, None if the request has no messages or prompt.
+        """
+        if not body:
+            return None
+
+        if body.get("messages"):
+            prefix, length = list(), 0
+            for message in body["messages"]:
+                content = message.get("content")
+                content = content if isinstance(content, str) else dumps(content)
+                prefix.append(f"{message.get("role")}:{content}")
+                length += len(prefix[-1])
+                if length >= cls.PREFIX_LENGTH:
+                    break
+            return "\n".join(prefix)[: cls.PREFIX_LENGTH]
+
+        if body.get("prompt"):
+            prompt = body["prompt"] if isinstance(body["prompt"], str) else dumps(body["prompt"])
+            return prompt[: cls.PREFIX_LENGTH]
+
+        return None
+
+    def choose_model_client(self) -> ModelClient:
+        # bounded load: a client can't have more than LOAD_FACTOR times the average active requests (including the new one)
+        total = sum(client.active_requests for client in self.clients)
+        bound = math.ceil(self.LOAD_FACTOR * (total + 1) / len(self.clients))
+
+        if self.prefix is None:  # no routing key, choose randomly among clients under the bound
+            return random.choice([client for client in self.clients if client.active_requests < bound])
+
+        start = bisect.bisect(self.ring, self.hash(self.prefix), key=lambda node: node[0])
+        for offset in range(len(self.ring)):
+            _, index = self.ring[(start + offset) % len(self.ring)]
+            if self.clients[index].active_requests < bound:
+                return self.clients[index]
+
+        return self.clients[self.ring[start % len(self.ring)][1]]
@@ -27,6 +27,7 @@ class AccountUsage(BaseModel):
     kwh_max: Optional[float] = None
     kgco2eq_min: Optional[float] = None
     kgco2eq_max: Optional[float] = None
+    cached: bool = False
 
 
 class AccountUsageResponse(BaseModel):
@@ -45,3 +46,4 @@ class AccountUsageResponse(BaseModel):
     limit: int = Field(description="Number of records per page")
     total_pages: int = Field(description="Total number of pages")
     has_more: bool = Field(description="Whether there are more records available")
+    next_cursor: Optional[str] = Field(default=None, description="The cursor to get the next page, null if the page is the last one.")
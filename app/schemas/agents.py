@@ -70,3 +70,10 @@ class AgentsTool(BaseModel):
 class AgentsTools(BaseModel):
     object: Literal["list"] = "list"
     data: List[AgentsTool]
+
+
+class AgentsToolCallEvent(BaseModel):
+    object: Literal["agents.tool_call"] = "agents.tool_call"
+    id: Optional[str] = Field(default=None, description="ID of the tool call.")
+    name: str = Field(description="Name of the called tool.")
+    status: Literal["started", "finished"] = Field(description="Status of the tool call.")
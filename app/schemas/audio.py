@@ -19,6 +19,7 @@ AudioTranscriptionPromptForm = Form(default=None, description="Not implemented."
 AudioTranscriptionResponseFormatForm: Literal["json", "text"] = Form(default="json", description="The format of the transcript output, in one of these formats: `json` or `text`.")  # fmt: off
 AudioTranscriptionTemperatureForm: float = Form(default=0, ge=0, le=1, description="The sampling temperature, between 0 and 1. Higher values like 0.8 will make the output more random, while lower values like 0.2 will make it more focused and deterministic. If set to 0, the model will use log probability to automatically increase the temperature until certain thresholds are hit.")  # fmt: off
 AudioTranscriptionTimestampGranularitiesForm: List[str] = Form(default=["segment"], description="Not implemented.")  # fmt: off
+AudioTranscriptionLongAudioForm: bool = Form(default=False, description="If set, a WAV audio file is split at silences into overlapping segments, transcribed concurrently by the providers of the model. The transcriptions are merged, without the text repeated in the overlaps, and returned with the timestamped segments of the whole audio in json format. Other audio formats are transcribed in one request.")  # fmt: off
 
 
 class AudioTranscription(Transcription):
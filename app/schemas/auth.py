@@ -86,6 +86,7 @@ class Role(BaseModel):
 class Roles(BaseModel):
     object: Literal["list"] = "list"
     data: List[Role]
+    next_cursor: Optional[str] = Field(default=None, description="The cursor to get the next page, null if the page is the last one.")
 
 
 class UserUpdateRequest(BaseModel):
@@ -138,6 +139,7 @@ class User(BaseModel):
 class Users(BaseModel):
     object: Literal["list"] = "list"
     data: List[User]
+    next_cursor: Optional[str] = Field(default=None, description="The cursor to get the next page, null if the page is the last one.")
 
 
 class TokensResponse(BaseModel):
@@ -172,6 +174,7 @@ class Token(BaseModel):
 class Tokens(BaseModel):
     object: Literal["list"] = "list"
     data: List[Token]
+    next_cursor: Optional[str] = Field(default=None, description="The cursor to get the next page, null if the page is the last one.")
 
 
 class OAuth2LogoutRequest(BaseModel):
@@ -33,8 +33,10 @@ class Collection(BaseModel):
     created_at: int
     updated_at: int
     documents: int = 0
+    chunks: int = 0
 
 
 class Collections(BaseModel):
     object: Literal["list"] = "list"
     data: List[Collection]
+    next_cursor: Optional[str] = Field(default=None, description="The cursor to get the next page, null if the page is the last one.")
@@ -93,6 +93,7 @@ class ModelProviderType(str, Enum):
 
 
 class RoutingStrategy(str, Enum):
+    PREFIX_HASH = "prefix_hash"
     ROUND_ROBIN = "round_robin"
     SHUFFLE = "shuffle"
 
@@ -154,7 +155,7 @@ class Model(ConfigBaseModel):
     type: ModelType = Field(required=True, description="Type of the model. It will be used to identify the model type.", examples=["text-generation"])  # fmt: off
     aliases: List[constr(strip_whitespace=True, min_length=1, max_length=64)] = Field(default_factory=list, required=False, description="Aliases of the model. It will be used to identify the model by users.", examples=[["model-alias", "model-alias-2"]])  # fmt: off
     owned_by: constr(strip_whitespace=True, min_length=1, max_length=64) = Field(default=DEFAULT_APP_NAME, required=False, description="Owner of the model displayed in `/v1/models` endpoint.", examples=["my-app"])  # fmt: off
-    routing_strategy: RoutingStrategy = Field(default=RoutingStrategy.SHUFFLE, required=False, description="Routing strategy for load balancing between providers of the model. It will be used to identify the model type.", examples=["round_robin"])  # fmt: off
+    routing_strategy: RoutingStrategy = Field(default=RoutingStrategy.SHUFFLE, required=False, description="Routing strategy for load balancing between providers of the model. It will be used to identify the model type. With `prefix_hash`, chat completions and completions requests sharing the same prompt prefix are routed to the same provider (to benefit from its prefix cache) as long as this provider is not overloaded.", examples=["round_robin"])  # fmt: off
     providers: List[ModelProvider] = Field(required=True, description="API providers of the model. If there are multiple providers, the model will be load balanced between them according to the routing strategy. The different models have to the same type.")  # fmt: off
 
     @model_validator(mode="after")
@@ -252,6 +253,8 @@ class MarkerDependency(ConfigBaseModel):
     url: constr(strip_whitespace=True, min_length=1) = Field(required=True, description="Marker API url.")  # fmt: off
     headers: Dict[str, str] = Field(default_factory=dict, required=False, description="Marker API request headers.", examples=[{"Authorization": "Bearer my-api-key"}])  # fmt: off
     timeout: int = Field(default=DEFAULT_TIMEOUT, ge=1, required=False, description="Timeout for the Marker API requests.", examples=[10])  # fmt: off
+    batch_size: int = Field(default=10, ge=1, required=False, description="Maximum number of contiguous pages sent in one request to Marker API (only the pages of the batch are uploaded). Only used for markdown output, the other formats are parsed page by page.", examples=[10])  # fmt: off
+    max_concurrency: int = Field(default=4, ge=1, required=False, description="Maximum number of concurrent requests to Marker API for one document.", examples=[4])  # fmt: off
 
 
 @custom_validation_error(url="https://github.com/etalab-ia/opengatellm/blob/main/docs/configuration.md#postgresdependency")
@@ -380,6 +383,33 @@ class Settings(ConfigBaseModel):
     # other
     disabled_routers: List[Routers] = Field(default_factory=list, description="Disabled routers to limits services of the API.", examples=[["agents", "embeddings"]])  # fmt: off
 
+    # models
+    models_reload_interval: Optional[int] = Field(default=None, ge=1, required=False, description="If provided, the configuration file is checked every `models_reload_interval` seconds and the models are reloaded without restarting the API workers when the file has changed. Models can also be reloaded by sending a SIGHUP signal to the API workers.")  # fmt: off
+
+    embeddings_batching_max_wait_ms: Optional[int] = Field(default=None, ge=1, required=False, description="If provided, concurrent embeddings requests to the same model provider are coalesced in a single request (micro-batching). Inputs are collected for at most `embeddings_batching_max_wait_ms` milliseconds or until `embeddings_batching_max_size` inputs are collected. Usage is still computed for each request.")  # fmt: off
+    embeddings_batching_max_size: int = Field(default=32, ge=1, required=False, description="Maximum number of inputs in a coalesced embeddings request. Must not exceed the maximum batch size of the model providers (`max_client_batch_size` for TEI).")  # fmt: off
+
+    # audio
+    audio_segment_duration: float = Field(default=60, gt=0, required=False, description="Duration in seconds of the segments of a long audio file (see `long_audio` parameter of `/v1/audio/transcriptions` endpoint). Segments are cut at the most silent moment of their last quarter.")  # fmt: off
+    audio_segment_overlap: float = Field(default=1, ge=0, required=False, description="Overlap in seconds between consecutive segments of a long audio file, so that words at the boundaries are not cut.")  # fmt: off
+    audio_max_concurrency: int = Field(default=8, ge=1, required=False, description="Maximum number of segments of a long audio file transcribed concurrently.")  # fmt: off
+    audio_max_file_size: int = Field(default=500 * 1024 * 1024, ge=1, required=False, description="Maximum size in bytes of the audio files uploaded to the `/v1/audio/transcriptions` endpoint. Larger uploads are rejected while received.")  # fmt: off
+
+    # ocr
+    ocr_max_concurrency: int = Field(default=4, ge=1, required=False, description="Maximum number of pages processed concurrently by the model in `/v1/ocr` endpoint. Pages are rendered in a background thread while previous pages are processed by the model.")  # fmt: off
+
+    # parser
+    parser_max_workers: int = Field(default=1, ge=1, required=False, description="Number of worker processes used to extract the text of PDF files when PDF files are not parsed by the parser dependency. Pages are extracted by windows and consumed by chunking and vectorization as they are extracted.")  # fmt: off
+
+    # content cache
+    content_cache_directory: Optional[str] = Field(default=None, required=False, description="If provided, parsed documents and chunk embeddings are cached on local disk in this directory, by hash of the file content, parser parameters and embeddings model. Uploading the same file to another collection or indexing the same web page skips parsing and vectorization. The directory can be shared by the API workers.")  # fmt: off
+    content_cache_max_size: int = Field(default=1073741824, ge=1, required=False, description="Maximum size in bytes of the content cache, the least recently used entries are removed when the cache exceeds this size.")  # fmt: off
+
+    # response cache
+    response_cache_ttl: Optional[int] = Field(default=None, ge=1, required=False, description="If provided, deterministic requests (`temperature` set to 0) to `/v1/chat/completions` and `/v1/completions` endpoints are cached in Redis for `response_cache_ttl` seconds and identical requests are served from the cache, streamed responses are replayed. Requests with search are not cached. Clients can bypass the cache with the `Cache-Control: no-cache` header.")  # fmt: off
+    response_cache_max_size: int = Field(default=1048576, ge=1, required=False, description="Maximum size in bytes of a cached response, larger responses are not cached.")  # fmt: off
+    response_cache_charge_hits: bool = Field(default=True, required=False, description="If false, responses served from the response cache don't decrease the user budget. Cache hits are always logged in usage with the `cached` flag.")  # fmt: off
+
     # metrics
     metrics_retention_ms: int = Field(default=40000, ge=1, description="Retention time for metrics in milliseconds.")  # fmt: off
 
@@ -405,6 +435,8 @@ class Settings(ConfigBaseModel):
 
     # mcp
     mcp_max_iterations: int = Field(default=2, ge=2, description="Maximum number of iterations for MCP agents in `/v1/agents/completions` endpoint.")  # fmt: off
+    mcp_tools_cache_ttl: int = Field(default=300, ge=0, description="Time to live in seconds of the cached list of tools of the MCP bridge. Once expired, the cached list is still used while it is refreshed in background. If 0, the list of tools is requested to the MCP bridge for each request.")  # fmt: off
+    mcp_tool_call_timeout: float = Field(default=30, gt=0, description="Timeout in seconds of a tool call of MCP agents in `/v1/agents/completions` endpoint. The tool calls requested by the model in the same turn are run concurrently.")  # fmt: off
 
     # auth
     auth_master_key: constr(strip_whitespace=True, min_length=1) = Field(default="changeme", required=False, description="Master key for the API. This key has all permissions and cannot be modified or deleted. This key is used to create the first role and the first user. This key is also used to encrypt user tokens, watch out if you modify the master key, you'll need to update all user API keys.")  # fmt: off
@@ -415,6 +447,7 @@ class Settings(ConfigBaseModel):
 
     # monitoring
     monitoring_postgres_enabled: bool = Field(default=True, required=False, description="If true, the log usage will be written in the PostgreSQL database.")  # fmt: off
+    monitoring_postgres_usage_retention_months: Optional[int] = Field(default=None, ge=1, required=False, description="Number of months of usage records kept in the PostgreSQL database, in addition to the current month. The usage table is partitioned by month and the partitions older than the retention are dropped daily, with the hourly and daily usage rollups of the same months. If not provided, usage records are kept forever.")  # fmt: off
     monitoring_prometheus_enabled: bool = Field(default=True, required=False, description="If true, Prometheus metrics will be exposed in the `/metrics` endpoint.")  # fmt: off
 
     # vector store
@@ -424,10 +457,24 @@ class Settings(ConfigBaseModel):
     search_web_query_model: Optional[str] = Field(default=None, required=False, description="Model used to query the web in the web search. Is required if a web search dependency is provided (Brave or DuckDuckGo). This model must be defined in the `models` section and have type `text-generation` or `image-text-to-text`.")  # fmt: off
     search_web_limited_domains: List[str] = Field(default_factory=list, description="Limited domains for the web search. If provided, the web search will be limited to these domains.")  # fmt: off
     search_web_user_agent: Optional[str] = Field(default=None, required=False, description="User agent to scrape the web. If provided, the web search will use this user agent.")  # fmt: off
+    search_web_max_concurrency: int = Field(default=8, ge=1, required=False, description="Maximum number of web pages fetched concurrently for a web search.")  # fmt: off
+    search_web_max_concurrency_per_host: int = Field(default=2, ge=1, required=False, description="Maximum number of web pages of the same host fetched concurrently for a web search.")  # fmt: off
+    search_web_timeout: float = Field(default=10, gt=0, required=False, description="Deadline in seconds to fetch the web pages of a web search, web pages not fetched before the deadline are skipped.")  # fmt: off
+    search_web_max_size: int = Field(default=5242880, ge=1, required=False, description="Maximum size in bytes of a fetched web page, larger web pages are skipped.")  # fmt: off
+    search_web_cache_ttl: int = Field(default=3600, ge=0, required=False, description="If the content cache is enabled (see `content_cache_directory`), the text of fetched web pages is cached and served from the cache for `search_web_cache_ttl` seconds. After this delay, the web page is revalidated with a conditional request (`ETag` and `Last-Modified` headers).")  # fmt: off
+    search_web_cache_negative_ttl: int = Field(default=300, ge=0, required=False, description="If the content cache is enabled (see `content_cache_directory`), web pages which failed to be fetched are not fetched again for `search_web_cache_negative_ttl` seconds.")  # fmt: off
+
+    # search - deepsearch
+    search_deepsearch_max_concurrency: int = Field(default=8, ge=1, required=False, description="Maximum number of concurrent model calls of a deepsearch in `/v1/deepsearch` endpoint. Search queries and web pages are processed concurrently.")  # fmt: off
+    search_deepsearch_timeout: float = Field(default=120, gt=0, required=False, description="Deadline in seconds of the search of a deepsearch in `/v1/deepsearch` endpoint. Once reached, the search is stopped and the response is generated with the contexts gathered so far.")  # fmt: off
+    search_deepsearch_max_tokens: Optional[int] = Field(default=None, ge=1, required=False, description="Token budget of the search of a deepsearch in `/v1/deepsearch` endpoint. Once the input and output tokens consumed reach this budget, the search is stopped and the response is generated with the contexts gathered so far. If not provided, the budget is not limited.")  # fmt: off
 
     # search - multi agents
     search_multi_agents_synthesis_model: Optional[str] = Field(default=None, required=False, description="Model used to synthesize the results of multi-agents search. If not provided, multi-agents search is disabled. This model must be defined in the `models` section and have type `text-generation` or `image-text-to-text`.")  # fmt: off
     search_multi_agents_reranker_model: Optional[str] = Field(default=None, required=False, description="Model used to rerank the results of multi-agents search. If not provided, multi-agents search is disabled. This model must be defined in the `models` section and have type `text-generation` or `image-text-to-text`.")  # fmt: off
+    search_multi_agents_reranker_max_concurrency: int = Field(default=6, ge=1, required=False, description="Maximum number of windows of 5 chunks evaluated concurrently by the reranker model in multi-agents search (at most 6 windows are evaluated). With 1, windows are evaluated one after the other; with 2, the next window is evaluated speculatively. If the content cache is enabled (see `content_cache_directory`), the verdicts of the reranker model are cached.")  # fmt: off
+    search_multi_agents_quorum: int = Field(default=1, ge=1, required=False, description="Minimum number of agents answers awaited before the synthesis of multi-agents search, even after `search_multi_agents_timeout`.")  # fmt: off
+    search_multi_agents_timeout: float = Field(default=15, gt=0, required=False, description="Delay in seconds after which the agents of multi-agents search which have not answered yet are dropped, if `search_multi_agents_quorum` agents have answered. Before this delay, the answers of all agents are awaited.")  # fmt: off
 
     # session
     session_secret_key: Optional[str] = Field(default=None, description='Secret key for session middleware. If not provided, the master key will be used.', examples=["knBnU1foGtBEwnOGTOmszldbSwSYLTcE6bdibC8bPGM"])  # fmt: off
@@ -14,6 +14,7 @@ class GlobalContext(BaseModel):
     limiter: Optional[Any] = None
     model_registry: Optional[Any] = None
     parser_manager: Optional[Any] = None
+    response_cache: Optional[Any] = None
     tokenizer: Optional[Any] = None
 
 
@@ -1,4 +1,5 @@
-from typing import List, Union
+from enum import Enum
+from typing import List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field
 
@@ -13,6 +14,7 @@ class DeepSearchRequest(BaseModel):
     num_queries: int = Field(default=2, ge=1, le=5, description="Number of queries to generate per iteration")
     lang: str = Field(default="fr", description="Language for the search (fr or en)")
     limited_domains: Union[bool, List[str]] = Field(default=True, description="Allowed domains handling: True = use default config, False = all domains allowed, [list] = custom domains")  # fmt: off
+    stream: bool = Field(default=False, description="If set, the progress of the deep search is sent as data-only server-sent events (generated queries, sources found, extracted contexts and deltas of the final response). The last event is the complete deep search result and the stream is terminated by a `data: [DONE]` message.")  # fmt: off
 
 
 class DeepSearchMetadata(BaseModel):
@@ -32,3 +34,22 @@ class DeepSearchResponse(BaseModel):
     sources: List[str] = Field(description="List of source URLs")
     metadata: DeepSearchMetadata = Field(description="Metadata about the search process")
     usage: Usage = Field(description="Usage information for the request")
+
+
+class DeepSearchEventType(str, Enum):
+    QUERIES = "queries"
+    SOURCES = "sources"
+    CONTEXT = "context"
+    REPORT = "report"
+
+
+class DeepSearchEvent(BaseModel):
+    object: Literal["deepsearch.event"] = "deepsearch.event"
+    type: DeepSearchEventType = Field(description="Type of the event: search queries of an iteration, sources found for a search query, context extracted from a source or delta of the response.")  # fmt: off
+    iteration: Optional[int] = Field(default=None, description="Iteration of the search queries (queries event)")
+    queries: Optional[List[str]] = Field(default=None, description="Search queries of the iteration (queries event)")
+    query: Optional[str] = Field(default=None, description="Search query (sources event)")
+    sources: Optional[List[str]] = Field(default=None, description="URLs of the sources found for the search query (sources event)")
+    source: Optional[str] = Field(default=None, description="URL of the source (context event)")
+    context: Optional[str] = Field(default=None, description="Context extracted from the source (context event)")
+    delta: Optional[str] = Field(default=None, description="Delta of the response (report event)")
@@ -37,6 +37,7 @@ class Document(BaseModel):
 class Documents(BaseModel):
     object: Literal["list"] = "list"
     data: List[Document]
+    next_cursor: Optional[str] = Field(default=None, description="The cursor to get the next page, null if the page is the last one.")
 
 
 class DocumentResponse(BaseModel):
@@ -10,3 +10,4 @@ Je veux une sortie au format markdown. Tu dois respecter le format de sortie pou
 ModelForm: str = Form(default=..., description="The model to use for the OCR.")  # fmt: off
 DPIForm: int = Form(default=150, ge=100, le=600, description="The DPI to use for the OCR (each page will be rendered as an image at this DPI).")  # fmt: off
 PromptForm: str = Form(default=DEFAULT_PROMPT, description="The prompt to use for the OCR.")  # fmt: off
+StreamForm: bool = Form(default=False, description="If set, each page is sent as a data-only server-sent event as soon as it is processed (pages can be received out of order, see `metadata.page`). The last event contains the usage of the request and the stream is terminated by a `data: [DONE]` message.")  # fmt: off
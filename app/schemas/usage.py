@@ -35,4 +35,5 @@ class Detail(BaseModel):
 
 
 class Usage(BaseUsage):
+    cached: bool = Field(default=False, description="Whether the response has been served from the response cache.")
     details: List[Detail] = []
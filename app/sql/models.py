@@ -1,6 +1,6 @@
 from http import HTTPMethod
 
-from sqlalchemy import Column, DateTime, Enum, Float, ForeignKey, Integer, String, UniqueConstraint, func
+from sqlalchemy import DDL, Boolean, Column, DateTime, Enum, Float, ForeignKey, Index, Integer, String, UniqueConstraint, event, func
 from sqlalchemy.orm import backref, declarative_base, relationship
 
 from app.schemas.auth import LimitType, PermissionType
@@ -12,8 +12,9 @@ Base = declarative_base()
 class Usage(Base):
     __tablename__ = "usage"
 
-    id = Column(Integer, primary_key=True)
-    datetime = Column(DateTime, nullable=False, default=func.now())
+    # the table is partitioned by month, so the partition key is part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    datetime = Column(DateTime, primary_key=True, nullable=False, default=func.now())
     duration = Column(Integer, nullable=True)
     time_to_first_token = Column(Integer, nullable=True)
     user_id = Column(ForeignKey(column="user.id", ondelete="CASCADE"), nullable=True)
@@ -31,14 +32,57 @@ class Usage(Base):
     kwh_max = Column(Float, nullable=True)
     kgco2eq_min = Column(Float, nullable=True)
     kgco2eq_max = Column(Float, nullable=True)
+    cached = Column(Boolean, nullable=False, default=False, server_default="false")
 
     user = relationship(argument="User", backref=backref(name="usage", cascade="all, delete-orphan"))
     token = relationship(argument="Token", backref=backref(name="usage"))
 
+    __table_args__ = (
+        Index("ix_usage_user_id_datetime", "user_id", "datetime", postgresql_include=["model", "cost", "total_tokens", "kgco2eq_min", "kgco2eq_max"]),
+        {"postgresql_partition_by": "RANGE (datetime)"},
+    )
+
     def __repr__(self):
         return f"<Usage (id={self.id}, datetime={self.datetime}, user_id={self.user_id}, token_id={self.token_id}, endpoint={self.endpoint}, duration={self.duration})>"
 
 
+# records outside of the monthly partitions (created by the API) are stored in the default partition, so that usage logging never fails
+event.listen(Usage.__table__, "after_create", DDL("CREATE TABLE IF NOT EXISTS usage_default PARTITION OF usage DEFAULT").execute_if(dialect="postgresql"))  # fmt: off
+
+
+class UsageRollupMixin:
+    """
+    Usage aggregated by period (start of the hour or of the day) and by user, model and endpoint, maintained incrementally by the usage
+    writer. The carbon footprint is only aggregated for the requests with both bounds, counted by `kgco2eq_count`.
+    """
+
+    id = Column(Integer, primary_key=True)
+    period = Column(DateTime, nullable=False)
+    user_id = Column(ForeignKey(column="user.id", ondelete="CASCADE"), nullable=False)
+    model = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False)
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Float, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0)
+    kgco2eq_min = Column(Float, nullable=False, default=0)
+    kgco2eq_max = Column(Float, nullable=False, default=0)
+    kgco2eq_count = Column(Integer, nullable=False, default=0)
+
+
+class UsageHourly(UsageRollupMixin, Base):
+    __tablename__ = "usage_hourly"
+
+    __table_args__ = (UniqueConstraint("user_id", "period", "model", "endpoint", name="unique_usage_hourly_per_period"),)
+
+
+class UsageDaily(UsageRollupMixin, Base):
+    __tablename__ = "usage_daily"
+
+    __table_args__ = (UniqueConstraint("user_id", "period", "model", "endpoint", name="unique_usage_daily_per_period"),)
+
+
 class Role(Base):
     __tablename__ = "role"
 
@@ -111,6 +155,8 @@ class Collection(Base):
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
     visibility = Column(Enum(CollectionVisibility), nullable=False)
+    documents_count = Column(Integer, default=0, server_default="0", nullable=False)  # maintained by the document manager
+    chunks_count = Column(Integer, default=0, server_default="0", nullable=False)  # maintained by the document manager
     created_at = Column(DateTime, default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=func.now(), nullable=False, onupdate=func.now())
 
@@ -123,6 +169,7 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     collection_id = Column(Integer, ForeignKey(column="collection.id", ondelete="CASCADE"), nullable=False)
     name = Column(String, nullable=False)
+    chunks_count = Column(Integer, nullable=True)  # null for the documents created before the counters, until they are repaired
     created_at = Column(DateTime, default=func.now(), nullable=False)
 
     collection = relationship(argument="Collection", backref=backref(name="document", cascade="all, delete-orphan"))
@@ -5,6 +5,8 @@ from fastapi.testclient import TestClient
 import pytest
 
 from app.sql.models import Usage as UsageModel
+from app.sql.models import UsageDaily, UsageHourly
+from app.utils.hooks_decorator import log_usage
 from app.utils.variables import ENDPOINT__USAGE
 
 
@@ -239,6 +241,48 @@ class TestUsage:
             db_session.query(UsageModel).filter(UsageModel.user_id == user_with_permissions["id"]).delete()
             db_session.commit()
 
+    def test_usage_logged_by_log_usage_is_aggregated(self, client: TestClient, users, tokens, db_session):
+        """Test that the usage logged by log_usage is listed and aggregated in the totals, which are served by the rollup tables"""
+        user_with_permissions, _ = users
+        token_with_permissions, _ = tokens
+
+        before = client.get_with_permissions(url=f"/v1{ENDPOINT__USAGE}").json()
+
+        # Log usage records two days ago, served by the daily rollup, and now, served by the usage table
+        for test_datetime in [datetime.now() - timedelta(days=2), datetime.now() - timedelta(seconds=1)]:
+            usage = UsageModel(
+                datetime=test_datetime,
+                user_id=user_with_permissions["id"],
+                token_id=token_with_permissions["id"],
+                endpoint="/test/log_usage",
+                method=HTTPMethod.POST,
+                model="test_model_log_usage",
+                prompt_tokens=100,
+                completion_tokens=50,
+                total_tokens=150,
+                cost=0.01,
+                status=200,
+            )
+            client.portal.call(log_usage, None, usage, test_datetime)
+
+        try:
+            response = client.get_with_permissions(url=f"/v1{ENDPOINT__USAGE}")
+            assert response.status_code == 200, response.text
+
+            data = response.json()
+            assert data["total"] == before["total"] + 2
+            assert data["total_requests"] == before["total_requests"] + 2
+            assert data["total_tokens"] == before["total_tokens"] + 300
+            assert data["total_albert_coins"] == pytest.approx(before["total_albert_coins"] + 0.02)
+            assert len([record for record in data["data"] if record["endpoint"] == "/test/log_usage"]) == 2
+
+        finally:
+            # Clean up test data
+            db_session.query(UsageModel).filter(UsageModel.endpoint == "/test/log_usage").delete()
+            db_session.query(UsageHourly).filter(UsageHourly.endpoint == "/test/log_usage").delete()
+            db_session.query(UsageDaily).filter(UsageDaily.endpoint == "/test/log_usage").delete()
+            db_session.commit()
+
     def test_invalid_parameters(self, client: TestClient):
         """Test validation of query parameters"""
 
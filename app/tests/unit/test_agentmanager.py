@@ -1,3 +1,5 @@
+import asyncio
+import copy
 import json
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
@@ -26,7 +28,7 @@ class TestMCPLoop:
     @pytest.fixture
     def mock_llm_registry(self, mock_llm_client):
         mock_llm_registry = MagicMock()
-        mock_llm_registry.return_value = SimpleNamespace(get_client=lambda endpoint: mock_llm_client)
+        mock_llm_registry.return_value = SimpleNamespace(get_client=lambda endpoint, body=None: mock_llm_client)
         return mock_llm_registry
 
     @pytest.fixture
@@ -130,7 +132,15 @@ class TestMCPLoop:
 
             assert second_call_llm_client_arguments == {
                 "json": {
-                    "messages": [{"content": "Je veux que tu fasses une action", "role": "user"}, {"content": "tool call result", "role": "user"}],
+                    "messages": [
+                        {"content": "Je veux que tu fasses une action", "role": "user"},
+                        {
+                            "role": "assistant",
+                            "content": None,
+                            "tool_calls": [{"function": {"name": "tool_1", "arguments": "arguments for tool call"}}],
+                        },
+                        {"role": "tool", "tool_call_id": None, "content": "tool call result"},
+                    ],
                     "model": "albert-large",
                     "tool_choice": "auto",
                     "tools": [
@@ -180,7 +190,15 @@ class TestMCPLoop:
 
             assert second_call_llm_client_arguments == {
                 "json": {
-                    "messages": [{"content": "Je veux que tu fasses une action", "role": "user"}, {"content": "tool call result", "role": "user"}],
+                    "messages": [
+                        {"content": "Je veux que tu fasses une action", "role": "user"},
+                        {
+                            "role": "assistant",
+                            "content": None,
+                            "tool_calls": [{"function": {"name": "tool_1", "arguments": "arguments for tool call"}}],
+                        },
+                        {"role": "tool", "tool_call_id": None, "content": "tool call result"},
+                    ],
                     "model": "albert-large",
                     "tool_choice": "auto",
                     "tools": [
@@ -265,7 +283,15 @@ class TestMCPLoop:
 
             assert second_call_llm_client_arguments == {
                 "json": {
-                    "messages": [{"content": "Je veux que tu fasses une action", "role": "user"}, {"content": "tool call result", "role": "user"}],
+                    "messages": [
+                        {"content": "Je veux que tu fasses une action", "role": "user"},
+                        {
+                            "role": "assistant",
+                            "content": None,
+                            "tool_calls": [{"function": {"name": "tool_1", "arguments": "arguments for tool call"}}],
+                        },
+                        {"role": "tool", "tool_call_id": None, "content": "tool call result"},
+                    ],
                     "model": "albert-large",
                     "tools": [{"function": {"description": "First tool description", "name": "tool_1", "parameters": {}}, "type": "function"}],
                     "tool_choice": agents_choice,
@@ -273,3 +299,131 @@ class TestMCPLoop:
                 "method": "POST",
             }
             assert mock_llm_client.forward_request.call_count == number_of_rounds
+
+    class TestToolCalls:
+        @pytest.mark.asyncio
+        async def test_get_completion_runs_all_tool_calls_concurrently(self, agent_manager, mock_mcp_bridge, mock_llm_client):
+            # GIVEN a model requesting 2 tool calls in the same turn, one of them timing out
+            agent_manager.tool_call_timeout = 0.2
+            mock_mcp_bridge.get_tool_list.return_value = [
+                AgentsTool(server="mcp_server_1", name="tool_1", description="First tool description", input_schema={}),
+                AgentsTool(server="mcp_server_1", name="tool_2", description="Second tool description", input_schema={}),
+            ]
+            tool_calls = [
+                {"id": "call_1", "type": "function", "function": {"name": "tool_1", "arguments": "{}"}},
+                {"id": "call_2", "type": "function", "function": {"name": "tool_2", "arguments": "{}"}},
+            ]
+            mock_llm_client.forward_request.side_effect = [
+                SimpleNamespace(
+                    text=json.dumps({"choices": [{"finish_reason": "tool_calls", "message": {"role": "assistant", "tool_calls": tool_calls}}]})
+                ),
+                SimpleNamespace(
+                    status_code=200,
+                    text=json.dumps({"choices": [{"finish_reason": "stop", "message": {"content": "message from llm"}}]}),
+                    headers={},
+                    request=None,
+                ),
+            ]
+
+            async def call_tool(tool_name, params):
+                await asyncio.sleep(0.1 if tool_name == "tool_1" else 5)
+                return {"content": [{"text": f"{tool_name} result"}]}
+
+            mock_mcp_bridge.call_tool.side_effect = call_tool
+            body = TestMCPBody(
+                messages=[{"content": "Je veux que tu fasses deux actions", "role": "user"}], model="albert-large", tools=[{"type": "all"}]
+            )
+
+            # WHEN
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await agent_manager.get_completion(body)
+
+            # THEN the tool calls are run concurrently and their results are sent as tool messages
+            assert loop.time() - start < 0.5
+            messages = mock_llm_client.forward_request.call_args_list[1][1]["json"]["messages"]
+            assert messages[1] == {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            assert messages[2:] == [
+                {"role": "tool", "tool_call_id": "call_1", "content": "tool_1 result"},
+                {"role": "tool", "tool_call_id": "call_2", "content": "Tool tool_2 timed out."},
+            ]
+
+    class TestToolsCache:
+        @pytest.mark.asyncio
+        async def test_get_tools_from_bridge_is_cached_and_refreshed_in_background(self, mock_mcp_bridge, mock_llm_registry):
+            # GIVEN an agent manager with a tools cache
+            agent_manager = AgentManager(mock_mcp_bridge, mock_llm_registry, tools_cache_ttl=60)
+            first_tools = [AgentsTool(server="mcp_server_1", name="tool_1", description="First tool description", input_schema={})]
+            second_tools = [AgentsTool(server="mcp_server_1", name="tool_2", description="Second tool description", input_schema={})]
+            mock_mcp_bridge.get_tool_list.side_effect = [first_tools, second_tools]
+
+            # WHEN/THEN the tools are requested once while the cache is fresh
+            assert await agent_manager.get_tools_from_bridge() == first_tools
+            assert await agent_manager.get_tools_from_bridge() == first_tools
+            assert mock_mcp_bridge.get_tool_list.call_count == 1
+
+            # WHEN/THEN expired tools are returned while they are refreshed in background
+            agent_manager._tools_expiration = 0
+            assert await agent_manager.get_tools_from_bridge() == first_tools
+            await agent_manager._tools_refresh_task
+            assert await agent_manager.get_tools_from_bridge() == second_tools
+
+    class TestGetCompletionStream:
+        @pytest.mark.asyncio
+        async def test_get_completion_stream_runs_tools_and_streams_final_turn(self, agent_manager, mock_mcp_bridge, mock_llm_client):
+            # GIVEN a first turn streaming a tool call by parts and a second turn streaming the answer
+            mock_mcp_bridge.get_tool_list.return_value = [
+                AgentsTool(server="mcp_server_1", name="tool_1", description="First tool description", input_schema={}),
+            ]
+            mock_mcp_bridge.call_tool.return_value = {"content": [{"text": "tool call result"}]}
+
+            def sse(*events: dict) -> bytes:
+                return b"".join(b"data: " + json.dumps(event).encode() + b"\n\n" for event in events) + b"data: [DONE]\n\n"
+
+            tool_call_deltas = [
+                {"index": 0, "id": "call_1", "function": {"name": "tool_1", "arguments": '{"a"'}},
+                {"index": 0, "function": {"arguments": ": 1}"}},
+            ]
+            turns = [
+                sse(
+                    *[{"id": "1", "choices": [{"index": 0, "delta": {"tool_calls": [delta]}}]} for delta in tool_call_deltas],
+                    {"id": "1", "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]},
+                    {"id": "1", "choices": [], "usage": {"total_tokens": 10}},
+                ),
+                sse(
+                    {"id": "2", "choices": [{"index": 0, "delta": {"content": "Hello"}}]},
+                    {"id": "2", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+                    {"id": "2", "choices": [], "usage": {"total_tokens": 30}},
+                ),
+            ]
+            requests = []
+
+            async def forward_stream(method: str, json: dict):
+                requests.append(copy.deepcopy(json))
+                turn = turns[len(requests) - 1]
+                for index in range(0, len(turn), 25):
+                    yield turn[index : index + 25], 200
+
+            mock_llm_client.forward_stream = forward_stream
+            body = TestMCPBody(
+                messages=[{"content": "Je veux que tu fasses une action", "role": "user"}], model="albert-large", tools=[{"type": "all"}], stream=True
+            )
+
+            # WHEN
+            chunks = [chunk async for chunk, status_code in agent_manager.get_completion_stream(body)]
+
+            # THEN the tool call is notified, the answer is streamed and the usage of the last turn is sent before [DONE]
+            output = b"".join(chunks).decode()
+            assert output.count("event: tool_call") == 2
+            assert '"status":"started"' in output and '"status":"finished"' in output
+            assert "Hello" in output and "tool_calls" not in output
+            assert output.endswith('"usage": {"total_tokens": 30}}\n\ndata: [DONE]\n\n')
+            mock_mcp_bridge.call_tool.assert_called_once_with("tool_1", '{"a": 1}')
+            assert requests[1]["messages"][1:] == [
+                {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [{"id": "call_1", "type": "function", "function": {"name": "tool_1", "arguments": '{"a": 1}'}}],
+                },
+                {"role": "tool", "tool_call_id": "call_1", "content": "tool call result"},
+            ]
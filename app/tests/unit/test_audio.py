@@ -0,0 +1,127 @@
+import asyncio
+import io
+from unittest.mock import MagicMock
+import wave
+
+import numpy as np
+from fastapi import HTTPException
+import pytest
+
+from app.endpoints.audio import _merge_texts, _read_segment, _split_audio, _transcribe_segments
+
+
+def _wav(seconds: float, silences: list[float], rate: int = 8000) -> bytes:
+    """Create a mono WAV audio of a sine tone, with 200 ms silences at the given times."""
+    time = np.arange(int(seconds * rate)) / rate
+    samples = 10_000 * np.sin(2 * np.pi * 440 * time)
+    for silence in silences:
+        samples[int(silence * rate) : int((silence + 0.2) * rate)] = 0
+
+    output = io.BytesIO()
+    with wave.open(output, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(rate)
+        audio.writeframes(samples.astype(np.int16).tobytes())
+
+    return output.getvalue()
+
+
+def _get_frame_count(content: bytes) -> int:
+    with wave.open(io.BytesIO(content)) as audio:
+        return audio.getnframes()
+
+
+def test_split_audio_at_silences():
+    # GIVEN an audio of 25 seconds with silences in the last quarter of the 10 seconds segments
+    content = _wav(seconds=25, silences=[8.5, 17.0])
+
+    # WHEN the audio is split in segments of 10 seconds with 1 second of overlap
+    file = io.BytesIO(content)
+    segments = _split_audio(file=file, duration=10, overlap=1)
+
+    # THEN segments are cut in the silences and overlap
+    assert [start / 8000 for start, _ in segments] == pytest.approx([0, 7.6, 16.1], abs=0.1)
+    assert [(end - start) / 8000 for start, end in segments] == pytest.approx([8.6, 9.5, 25 - 16.1], abs=0.1)
+
+    # THEN each segment is read from the file as a WAV audio
+    offset, segment = _read_segment(file=file, start=segments[-1][0], end=segments[-1][1])
+    assert offset == segments[-1][0] / 8000
+    with wave.open(io.BytesIO(segment)) as audio:
+        assert audio.getnframes() / audio.getframerate() == pytest.approx(25 - 16.1, abs=0.1)
+
+
+def test_split_audio_rejects_non_wav_files():
+    with pytest.raises(Exception):
+        _split_audio(file=io.BytesIO(b"ID3 not a wav file"), duration=10, overlap=1)
+
+
+def test_merge_texts_removes_overlap():
+    assert (
+        _merge_texts(previous="Bonjour à tous, merci d'être", next="merci d'être venus aujourd'hui.")
+        == "Bonjour à tous, merci d'être venus aujourd'hui."
+    )
+    assert _merge_texts(previous="Bonjour.", next="Au revoir.") == "Bonjour. Au revoir."
+    assert _merge_texts(previous="", next="Bonjour.") == "Bonjour."
+
+
+@pytest.mark.asyncio
+async def test_transcribe_segments_distributes_segments_between_providers():
+    # GIVEN a model with 2 providers and 3 segments of an audio of 25 seconds (identified by their number of frames)
+    clients = [MagicMock(name="provider"), MagicMock(name="provider")]
+    texts = {80_000: "un deux trois", 88_000: "trois quatre", 48_000: "cinq"}
+    calls = []
+
+    for index, client in enumerate(clients):
+        client.name = f"whisper-{index}"
+
+        async def forward_request(method: str, files: dict, data: dict, client=client):
+            calls.append((data["model"], data["response_format"]))
+            return MagicMock(json=lambda: {"text": texts[_get_frame_count(files["file"][1])], "language": "french", "duration": 10.0, "segments": [{"start": 0.5, "end": 1.5, "text": "..."}]})  # fmt: off
+
+        client.forward_request = forward_request
+
+    model = MagicMock()
+    model.get_client.side_effect = lambda endpoint: clients[model.get_client.call_count % 2]
+    file = io.BytesIO(_wav(seconds=25, silences=[]))
+    segments = [(0, 80_000), (72_000, 160_000), (152_000, 200_000)]
+
+    # WHEN the segments are transcribed
+    transcription = await _transcribe_segments(model=model, file=file, segments=segments, filename="audio.wav", payload={"temperature": 0})
+
+    # THEN segments are sent to both providers, with timestamps requested, and transcriptions are merged with shifted timestamps
+    assert len(calls) == 3 and set(calls) == {("whisper-0", "verbose_json"), ("whisper-1", "verbose_json")}
+    assert transcription["text"] == "un deux trois quatre cinq"
+    assert transcription["language"] == "french" and transcription["duration"] == 29.0
+    assert [(segment["id"], segment["start"]) for segment in transcription["segments"]] == [(0, 0.5), (1, 9.5), (2, 19.5)]
+
+
+@pytest.mark.asyncio
+async def test_transcribe_segments_cancels_other_segments_on_failure():
+    # GIVEN a model which fails to transcribe the last segment while the other segments are being transcribed
+    cancelled = []
+
+    async def forward_request(method: str, files: dict, data: dict):
+        frame_count = _get_frame_count(files["file"][1])
+        if frame_count == 48_000:
+            raise HTTPException(status_code=500, detail="Transcription failed.")
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(frame_count)
+            raise
+
+    client = MagicMock()
+    client.name = "whisper"
+    client.forward_request = forward_request
+    model = MagicMock()
+    model.get_client.return_value = client
+
+    # WHEN the segments are transcribed
+    with pytest.raises(HTTPException) as e:
+        file = io.BytesIO(_wav(seconds=25, silences=[]))
+        await _transcribe_segments(model=model, file=file, segments=[(0, 80_000), (72_000, 160_000), (152_000, 200_000)], filename="audio.wav", payload={})  # fmt: off
+
+    # THEN the error is raised and the transcription of the other segments is cancelled
+    assert e.value.status_code == 500
+    assert sorted(cancelled) == [80_000, 88_000]
@@ -0,0 +1,85 @@
+from io import BytesIO
+import os
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import UploadFile
+import pytest
+from starlette.datastructures import Headers
+
+from app.helpers._contentcache import ContentCache
+from app.helpers._documentmanager import DocumentManager
+from app.helpers._parsermanager import ParserManager
+from app.schemas.chunks import Chunk
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ContentCache(directory=str(tmp_path), max_size=1_000)
+
+
+@pytest.mark.asyncio
+async def test_set_and_get(cache):
+    # GIVEN an entry in the cache
+    key = cache.get_key("embeddings", "my-model", ["hello", "world"])
+    await cache.set(key=key, value=[[0.1, 0.2], [0.3, 0.4]])
+
+    # WHEN/THEN the entry is found with the same key parts, not with other parts
+    assert await cache.get(key=cache.get_key("embeddings", "my-model", ["hello", "world"])) == [[0.1, 0.2], [0.3, 0.4]]
+    assert await cache.get(key=cache.get_key("embeddings", "other-model", ["hello", "world"])) is None
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entries_are_evicted(cache):
+    # GIVEN 3 entries of 300 bytes, the first one being read after the second one
+    for name in ["first", "second", "third"]:
+        await cache.set(key=cache.get_key(name), value="a" * 298)
+    for index, name in enumerate(["second", "first", "third"]):
+        path = cache._get_path(key=cache.get_key(name))
+        os.utime(path, (time.time() - 100 + index, time.time() - 100 + index))
+
+    # WHEN a fourth entry is stored, exceeding the max size
+    await cache.set(key=cache.get_key("fourth"), value="a" * 298)
+
+    # THEN the least recently used entries are evicted
+    assert await cache.get(key=cache.get_key("second")) is None
+    assert await cache.get(key=cache.get_key("fourth")) is not None
+    assert cache._size <= cache.max_size
+
+
+@pytest.mark.asyncio
+async def test_duplicated_file_is_parsed_once(cache):
+    # GIVEN a parser manager with a content cache
+    manager = ParserManager(content_cache=cache)
+    manager._parse_txt = AsyncMock(wraps=manager._parse_txt)
+
+    def upload_file(filename: str) -> UploadFile:
+        return UploadFile(filename=filename, file=BytesIO(b"Hello world"), headers=Headers({"content-type": "text/plain"}))
+
+    # WHEN the same file is parsed twice, under different names
+    first = [page async for page in manager.parse_file_pages(file=upload_file(filename="first.txt"))]
+    with patch.object(cache, "set") as set:
+        second = [page async for page in manager.parse_file_pages(file=upload_file(filename="second.txt"))]
+
+    # THEN the file is parsed once and the cached pages have the name of the uploaded file
+    manager._parse_txt.assert_called_once()
+    set.assert_not_called()
+    assert first[0].content == second[0].content
+    assert second[0].metadata.document_name == "second.txt"
+
+
+@pytest.mark.asyncio
+async def test_document_manager_caches_chunk_embeddings_only(cache):
+    # GIVEN a document manager with a content cache
+    manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=MagicMock(), parser_manager=AsyncMock(), content_cache=cache)
+    manager.vector_store_model.name = "my-model"
+    manager._create_embeddings = AsyncMock(side_effect=lambda input: [[0.1] for _ in input])
+
+    # WHEN the same chunks are upserted twice
+    chunks = [Chunk(id=1, content="hello", metadata={}), Chunk(id=2, content="world", metadata={})]
+    await manager._upsert(chunks=chunks, collection_id=1)
+    await manager._upsert(chunks=chunks, collection_id=1)
+
+    # THEN the chunks are embedded once, and only the chunk embeddings are written to the cache
+    manager._create_embeddings.assert_awaited_once_with(input=["hello", "world"])
+    assert len(os.listdir(cache.directory)) == 1
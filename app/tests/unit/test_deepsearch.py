@@ -0,0 +1,159 @@
+import asyncio
+from io import BytesIO
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import UploadFile
+import orjson
+import pytest
+
+from app.helpers._deepsearch import DeepSearchAgent
+
+
+def _usage(state: MagicMock, prompt_tokens: int, completion_tokens: int = 0) -> dict:
+    """Return the cumulative usage of the request, with the usage of the call as last detail, as the model client does."""
+    state.details.append({"id": f"call-{len(state.details)}", "model": "model", "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}})  # fmt: off
+    prompt_tokens = sum(detail["usage"]["prompt_tokens"] for detail in state.details)
+    completion_tokens = sum(detail["usage"]["completion_tokens"] for detail in state.details)
+
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens, "details": list(state.details)}  # fmt: off
+
+
+def _model(state: MagicMock, delay: float = 0.05, usage: int = 10) -> MagicMock:
+    async def forward_request(method: str, json: dict):
+        state.active += 1
+        state.max_active = max(state.max_active, state.active)
+        state.calls += 1
+        await asyncio.sleep(delay)
+        state.active -= 1
+
+        content = json["messages"][-1]["content"]
+        if "liste python" in content or "Python list" in content:
+            answer = '["query 1", "query 2"]' if state.calls == 1 else "[]"
+        elif "'oui'" in content:
+            answer = "oui"
+        else:
+            answer = "context"
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"choices": [{"message": {"content": answer}}], "usage": _usage(state=state, prompt_tokens=usage)}
+
+        return response
+
+    model = MagicMock()
+    model.get_client.return_value = MagicMock(forward_request=forward_request)
+
+    return model
+
+
+def _web_search_manager(k: int, delays: dict = {}) -> MagicMock:
+    async def get_results(query: str, k: int):
+        await asyncio.sleep(delays.get(query, 0))
+        return [UploadFile(filename=f"https://{query}/{index}.md", file=BytesIO(b"page content")) for index in range(k)]
+
+    manager = MagicMock()
+    manager.get_web_query = AsyncMock(side_effect=lambda query: query.replace(" ", "-"))
+    manager.get_results = get_results
+
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_deep_search_processes_queries_and_pages_concurrently():
+    # GIVEN 2 queries of 5 pages, each page needing 2 model calls of 50 ms
+    state = MagicMock(active=0, max_active=0, calls=0, details=[])
+    agent = DeepSearchAgent(model=_model(state=state), web_search_manager=_web_search_manager(k=5), max_concurrency=4)
+
+    # WHEN the deep search is performed
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    report, sources, metadata = await agent.deep_search(prompt="prompt", session=None, k=5, iteration_limit=1, num_queries=2)
+
+    # THEN model calls are concurrent, bounded by the max concurrency, and sources are in the order of the queries and results
+    assert state.calls == 1 + 2 * 5 * 2 + 1
+    assert state.max_active == 4
+    assert loop.time() - start < 0.05 * state.calls / 2
+    assert sources == [f"https://query-{query}/{index}" for query in [1, 2] for index in range(5)]
+    assert report == "context"
+
+
+@pytest.mark.asyncio
+async def test_deep_search_stops_at_deadline():
+    # GIVEN a query whose results are fetched after the deadline
+    state = MagicMock(active=0, max_active=0, calls=0, details=[])
+    web_search_manager = _web_search_manager(k=1, delays={"query-2": 5})
+    agent = DeepSearchAgent(model=_model(state=state, delay=0), web_search_manager=web_search_manager, timeout=0.5)
+
+    # WHEN the deep search is performed
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    report, sources, metadata = await agent.deep_search(prompt="prompt", session=None, k=1, iteration_limit=2, num_queries=2)
+
+    # THEN the late query is cancelled, no other iteration is performed and the report is generated with the contexts gathered so far
+    assert loop.time() - start < 1
+    assert sources == ["https://query-1/0"]
+    assert metadata["iterations"] == 1
+    assert report == "context"
+
+
+@pytest.mark.asyncio
+async def test_deep_search_stops_at_token_budget():
+    # GIVEN a token budget reached after the generation of the search queries
+    state = MagicMock(active=0, max_active=0, calls=0, details=[])
+    agent = DeepSearchAgent(model=_model(state=state, delay=0, usage=100), web_search_manager=_web_search_manager(k=2), max_tokens=100)
+
+    # WHEN the deep search is performed
+    report, sources, metadata = await agent.deep_search(prompt="prompt", session=None, k=2, iteration_limit=2, num_queries=2)
+
+    # THEN pages are not processed by the model but the final report is still generated
+    assert state.calls == 1
+    assert len(sources) == 4
+    assert metadata["total_input_tokens"] == 100
+    assert "Aucune information" in report
+
+
+@pytest.mark.asyncio
+async def test_deep_search_counts_the_tokens_of_each_model_call():
+    # GIVEN a token budget of 4 model calls, model calls being sequential
+    state = MagicMock(active=0, max_active=0, calls=0, details=[])
+    model = _model(state=state, delay=0, usage=100)
+    agent = DeepSearchAgent(model=model, web_search_manager=_web_search_manager(k=1), max_concurrency=1, max_tokens=400)
+
+    # WHEN the deep search is performed
+    report, sources, metadata = await agent.deep_search(prompt="prompt", session=None, k=1, iteration_limit=2, num_queries=2)
+
+    # THEN the budget is reached after the queries generation, the evaluation of both pages and the extraction of the first page
+    # THEN the final report is generated in spite of the budget, with the context of the first page
+    assert state.calls == 5
+    assert metadata["total_input_tokens"] == 500
+    assert report == "context"
+
+
+@pytest.mark.asyncio
+async def test_deep_search_stream():
+    # GIVEN a model streaming the final report in chunks which split the events
+    state = MagicMock(active=0, max_active=0, calls=0, details=[])
+    model = _model(state=state, delay=0)
+
+    async def forward_stream(method: str, json: dict):
+        assert json["stream"] is True
+        events = [{"choices": [{"delta": {"content": "Final "}}]}, {"choices": [{"delta": {"content": "report"}}]}, {"choices": [], "usage": _usage(state=state, prompt_tokens=7, completion_tokens=2)}]  # fmt: off
+        stream = b"".join(b"data: " + orjson.dumps(event) + b"\n\n" for event in events) + b"data: [DONE]\n\n"
+        for index in range(0, len(stream), 20):
+            yield stream[index : index + 20], 200
+
+    model.get_client.return_value.forward_stream = forward_stream
+    agent = DeepSearchAgent(model=model, web_search_manager=_web_search_manager(k=1))
+
+    # WHEN the deep search is streamed
+    events = [event async for event in agent.deep_search_stream(prompt="prompt", session=None, k=1, iteration_limit=1, num_queries=2)]
+
+    # THEN progress events are sent before the deltas of the report, and the last event contains the result
+    types = [event["type"] for event in events]
+    assert types[0] == "queries" and types.count("sources") == 2 and types.count("context") == 2
+    assert [event["delta"] for event in events if event["type"] == "report"] == ["Final ", "report"]
+    assert types[-1] == "done"
+    assert events[-1]["response"] == "Final report"
+    assert events[-1]["sources"] == ["https://query-1/0", "https://query-2/0"]
+
+    # THEN the tokens of each model call are counted once: queries generation, 2 calls by page and the streamed report
+    assert events[-1]["metadata"]["total_input_tokens"] == 10 + 2 * 2 * 10 + 7
+    assert events[-1]["metadata"]["total_output_tokens"] == 2
@@ -1,12 +1,16 @@
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from fastapi import HTTPException
 import pytest
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.helpers._documentmanager import DocumentManager
+from app.schemas.chunks import Chunk
 from app.schemas.documents import Chunker
 from app.schemas.parse import ParsedDocument, ParsedDocumentMetadata, ParsedDocumentPage
+from app.schemas.search import Search, SearchMethod
 from app.utils.exceptions import CollectionNotFoundException
 
 
@@ -183,3 +187,253 @@ async def test_create_document_other_integrity_error_not_collection_related():
                 separators=["\n\n", "\n", " "],
                 chunk_min_size=50,
             )
+
+
+@pytest.mark.asyncio
+async def test_create_document_from_pages():
+    """Test that pages are chunked and vectorized by batches as they are parsed."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    document_manager.BATCH_SIZE = 2
+    document_manager._create_embeddings = AsyncMock(side_effect=lambda input: [[0.0] for _ in input])
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=42))
+
+    async def pages():
+        for i in range(3):
+            yield ParsedDocumentPage(content=f"Content of page {i}", images={}, metadata=ParsedDocumentMetadata(document_name="test.pdf", page=i))
+
+    document_id = await document_manager.create_document(
+        session=mock_session,
+        user_id=1,
+        collection_id=123,
+        document=pages(),
+        chunker=Chunker.NO_SPLITTER,
+        chunk_size=1000,
+        chunk_overlap=0,
+        length_function=len,
+        chunk_min_size=0,
+    )
+
+    assert document_id == 42
+    upserted = [call.kwargs["chunks"] for call in document_manager.vector_store.upsert.call_args_list]
+    assert [[chunk.id for chunk in chunks] for chunks in upserted] == [[1, 2], [3]]
+    assert [chunk.metadata["page"] for chunks in upserted for chunk in chunks] == [0, 1, 2]
+    assert all(chunk.metadata["document_id"] == 42 for chunks in upserted for chunk in chunks)
+
+
+@pytest.mark.asyncio
+async def test_create_document_from_pages_parsing_error():
+    """Test that the document is deleted when a page fails to be parsed."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    document_manager._create_embeddings = AsyncMock(side_effect=lambda input: [[0.0] for _ in input])
+    document_manager.delete_document = AsyncMock()
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=42))
+
+    async def pages():
+        yield ParsedDocumentPage(content="Content of page 0", images={}, metadata=ParsedDocumentMetadata(document_name="test.pdf", page=0))
+        raise HTTPException(status_code=500, detail="Failed to parse pdf file.")
+
+    with pytest.raises(HTTPException):
+        await document_manager.create_document(
+            session=mock_session,
+            user_id=1,
+            collection_id=123,
+            document=pages(),
+            chunker=Chunker.NO_SPLITTER,
+            chunk_size=1000,
+            chunk_overlap=0,
+            length_function=len,
+            chunk_min_size=0,
+        )
+
+    document_manager.delete_document.assert_called_once_with(session=mock_session, user_id=1, document_id=42)
+
+
+@pytest.mark.asyncio
+async def test_search_chunks_with_web_search():
+    """Test that web results are searched in an ephemeral index and merged with the results of the collections."""
+
+    document_manager = DocumentManager(
+        vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock(), web_search_manager=AsyncMock()
+    )
+    document_manager.create_collection = AsyncMock()
+    document_manager._create_embeddings = AsyncMock(side_effect=lambda input: [[1.0, 0.0] if "albert" in text else [0.0, 1.0] for text in input])
+    document_manager.web_search_manager.get_results.return_value = ["page"]
+    collection_search = Search(method=SearchMethod.SEMANTIC, score=0.5, chunk=Chunk(id=1, content="collection chunk", metadata={}))
+    document_manager.vector_store.search.return_value = [collection_search]
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    async def pages(**kwargs):
+        for i, content in enumerate(["albert is an api for public services", "another page about the web"]):
+            yield ParsedDocumentPage(content=content, images={}, metadata=ParsedDocumentMetadata(document_name="https://albert.fr.md", page=i))
+
+    document_manager.parser_manager.parse_file_pages = pages
+
+    searches = await document_manager.search_chunks(
+        session=mock_session, collection_ids=[1], user_id=1, prompt="albert", method=SearchMethod.SEMANTIC, k=2, rff_k=20, web_search=True
+    )
+
+    # no temporary collection is created and web chunks are embedded in one request
+    document_manager.create_collection.assert_not_called()
+    assert document_manager._create_embeddings.call_count == 2
+    assert [search.chunk.content for search in searches] == ["albert is an api for public services", "collection chunk"]
+    assert searches[0].chunk.metadata["document_name"] == "https://albert.fr.md"
+
+
+@pytest.mark.asyncio
+async def test_get_documents_counts_chunks_by_collection():
+    """Test that the chunks of the documents not counted yet are counted with one call by collection instead of one call by document."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    document_manager.vector_store.get_chunk_counts.side_effect = lambda collection_id, document_ids: {document_id: document_id * 10 for document_id in document_ids}  # fmt: off
+    rows = [MagicMock(_asdict=MagicMock(return_value={"id": i, "name": f"doc{i}", "collection_id": 1 + i % 2, "created_at": 0, "chunks": None})) for i in range(1, 6)]  # fmt: off
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(all=MagicMock(return_value=rows))
+
+    documents = await document_manager.get_documents(session=mock_session, user_id=1)
+
+    assert document_manager.vector_store.get_chunk_counts.await_count == 2
+    document_manager.vector_store.get_chunk_counts.assert_any_await(collection_id=2, document_ids=[1, 3, 5])
+    assert [document.chunks for document in documents] == [10, 20, 30, 40, 50]
+
+
+@pytest.mark.asyncio
+async def test_get_documents_uses_chunk_counters():
+    """Test that the vector store is only called for the documents whose chunks are not counted yet."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    document_manager.vector_store.get_chunk_counts.side_effect = lambda collection_id, document_ids: {document_id: document_id * 10 for document_id in document_ids}  # fmt: off
+    chunks = {1: 4, 2: None, 3: 0}
+    rows = [MagicMock(_asdict=MagicMock(return_value={"id": i, "name": f"doc{i}", "collection_id": 1, "created_at": 0, "chunks": chunks[i]})) for i in range(1, 4)]  # fmt: off
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(all=MagicMock(return_value=rows))
+
+    documents = await document_manager.get_documents(session=mock_session, user_id=1)
+
+    document_manager.vector_store.get_chunk_counts.assert_awaited_once_with(collection_id=1, document_ids=[2])
+    assert [document.chunks for document in documents] == [4, 20, 0]
+
+
+def _collection_counters(session: AsyncMock) -> list:
+    statements = [call.kwargs.get("statement", call.args[0] if call.args else None) for call in session.execute.call_args_list]
+    statements = [statement.compile(dialect=postgresql.dialect()) for statement in statements if str(statement).startswith("UPDATE collection")]
+    return [(statement.params["documents_count_1"], statement.params["chunks_count_1"]) for statement in statements]
+
+
+@pytest.mark.asyncio
+async def test_create_document_updates_collection_counters():
+    """Test that the document is counted with its creation and its chunks once they are all vectorized."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    document_manager._create_embeddings = AsyncMock(side_effect=lambda input: [[0.0] for _ in input])
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=42))
+
+    pages = [ParsedDocumentPage(content=f"Content of page {i}", images={}, metadata=ParsedDocumentMetadata(document_name="test.pdf", page=i)) for i in range(3)]  # fmt: off
+    await document_manager.create_document(
+        session=mock_session,
+        user_id=1,
+        collection_id=123,
+        document=ParsedDocument(data=pages),
+        chunker=Chunker.NO_SPLITTER,
+        chunk_size=1000,
+        chunk_overlap=0,
+        length_function=len,
+        chunk_min_size=0,
+    )
+
+    assert _collection_counters(session=mock_session) == [(1, 0), (0, 3)]
+
+
+@pytest.mark.asyncio
+async def test_create_document_deleted_during_ingestion_does_not_count_its_chunks():
+    """Test that the chunks of a document deleted before the end of its ingestion are not counted in its collection."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    document_manager._create_embeddings = AsyncMock(side_effect=lambda input: [[0.0] for _ in input])
+    mock_session = AsyncMock(spec=AsyncSession)
+
+    async def execute(statement):
+        # the update of the chunks of the document matches no row once the document is deleted
+        return MagicMock(scalar_one=MagicMock(return_value=42), rowcount=0 if str(statement).startswith("UPDATE document") else 1)
+
+    mock_session.execute.side_effect = execute
+
+    pages = [ParsedDocumentPage(content=f"Content of page {i}", images={}, metadata=ParsedDocumentMetadata(document_name="test.pdf", page=i)) for i in range(3)]  # fmt: off
+    await document_manager.create_document(
+        session=mock_session,
+        user_id=1,
+        collection_id=123,
+        document=ParsedDocument(data=pages),
+        chunker=Chunker.NO_SPLITTER,
+        chunk_size=1000,
+        chunk_overlap=0,
+        length_function=len,
+        chunk_min_size=0,
+    )
+
+    assert _collection_counters(session=mock_session) == [(1, 0)]
+
+
+@pytest.mark.asyncio
+async def test_delete_document_updates_collection_counters():
+    """Test that the document and its chunks are uncounted in the transaction of the deletion."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    mock_session = AsyncMock(spec=AsyncSession)
+    document = MagicMock(collection_id=123, chunks_count=0)
+    # the chunks of the document are counted by its ingestion before the row is deleted
+    mock_session.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=document), first=MagicMock(return_value=MagicMock(chunks_count=7)))  # fmt: off
+
+    await document_manager.delete_document(session=mock_session, user_id=1, document_id=42)
+
+    assert _collection_counters(session=mock_session) == [(-1, -7)]
+    mock_session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_repair_collection_counters():
+    """Test that the chunks of the documents without counter are counted by collection, then the counters of the collections are recomputed."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    document_manager.REPAIR_BATCH_SIZE = 3
+    document_manager.vector_store.get_chunk_counts.side_effect = lambda collection_id, document_ids: {document_id: 5 for document_id in document_ids}  # fmt: off
+    batches = [[MagicMock(id=1, collection_id=1), MagicMock(id=2, collection_id=2), MagicMock(id=3, collection_id=1)], [MagicMock(id=4, collection_id=2)], []]  # fmt: off
+    mock_session = AsyncMock(spec=AsyncSession)
+    results = [MagicMock(all=MagicMock(return_value=batch)) for batch in batches]
+
+    def execute(statement, *args):
+        if "pg_try_advisory_xact_lock" in str(statement):
+            return MagicMock(scalar=MagicMock(return_value=True))
+        if "FOR UPDATE" in str(statement):
+            return MagicMock()
+        return results.pop(0) if str(statement).startswith("SELECT") else MagicMock(rowcount=2)
+
+    mock_session.execute.side_effect = execute
+
+    repaired = await document_manager.repair_collection_counters(session=mock_session)
+
+    assert repaired == 2
+    assert document_manager.vector_store.get_chunk_counts.await_count == 3
+    updates = [call.args[1] for call in mock_session.execute.call_args_list if len(call.args) > 1]
+    assert updates == [[{"id": 1, "chunks_count": 5}, {"id": 3, "chunks_count": 5}, {"id": 2, "chunks_count": 5}], [{"id": 4, "chunks_count": 5}]]
+    assert "WHERE collection.documents_count != (SELECT count(document.id)" in str(mock_session.execute.call_args_list[-1].kwargs["statement"])
+
+
+@pytest.mark.asyncio
+async def test_repair_collection_counters_skipped_by_concurrent_repair():
+    """Test that a repair is skipped when another API worker holds the repair lock."""
+
+    document_manager = DocumentManager(vector_store=AsyncMock(), vector_store_model=AsyncMock(), parser_manager=AsyncMock())
+    mock_session = AsyncMock(spec=AsyncSession)
+    mock_session.execute.return_value = MagicMock(scalar=MagicMock(return_value=False))
+
+    repaired = await document_manager.repair_collection_counters(session=mock_session)
+
+    assert repaired == 0
+    assert mock_session.execute.await_count == 1
+    document_manager.vector_store.get_chunk_counts.assert_not_awaited()
+    mock_session.rollback.assert_awaited_once()
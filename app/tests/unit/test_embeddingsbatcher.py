@@ -0,0 +1,169 @@
+import asyncio
+from json import dumps
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from coredis import ConnectionPool
+from fastapi import HTTPException
+import httpx
+import pytest
+
+from app.clients.model import BaseModelClient
+from app.helpers.models import EmbeddingsBatcher
+from app.utils.variables import ENDPOINT__EMBEDDINGS
+
+
+def _mock_client():
+    async def send_request(method, url, json):
+        data = [{"object": "embedding", "index": index, "embedding": [float(len(input))]} for index, input in enumerate(json["input"])]
+        content = dumps({"object": "list", "model": json["model"], "data": data, "usage": {"prompt_tokens": 99, "total_tokens": 99}})
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=content), 0.5
+
+    client = MagicMock()
+    client.send_request = AsyncMock(side_effect=send_request)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_coalesced_and_split_back():
+    # GIVEN a batcher and three concurrent callers
+    client = _mock_client()
+    batcher = EmbeddingsBatcher(max_wait_ms=10, max_batch_size=32)
+
+    # WHEN the callers send their inputs concurrently
+    results = await asyncio.gather(
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "a"}),
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": ["bb", "ccc"]}),
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": ["dddd"]}),
+    )
+
+    # THEN a single request is sent to the model and each caller only receives its own embeddings
+    client.send_request.assert_called_once()
+    assert client.send_request.call_args.kwargs["json"]["input"] == ["a", "bb", "ccc", "dddd"]
+
+    bodies = [response.json() for response, _ in results]
+    assert [[embedding["embedding"][0] for embedding in body["data"]] for body in bodies] == [[1.0], [2.0, 3.0], [4.0]]
+    assert [[embedding["index"] for embedding in body["data"]] for body in bodies] == [[0], [0, 1], [0]]
+
+    # THEN each caller is charged with the share of the latency of its inputs
+    assert [latency for _, latency in results] == [0.125, 0.25, 0.125]
+
+    # THEN the usage of the batched request is not returned to the callers (computed by each caller)
+    assert all("usage" not in body for body in bodies)
+    assert all(response.headers["Content-Type"] == "application/json" for response, _ in results)
+
+
+@pytest.mark.asyncio
+async def test_requests_with_different_parameters_are_not_coalesced():
+    # GIVEN a batcher
+    client = _mock_client()
+    batcher = EmbeddingsBatcher(max_wait_ms=10, max_batch_size=32)
+
+    # WHEN concurrent callers request different dimensions
+    await asyncio.gather(
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "a", "dimensions": 256}),
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "b", "dimensions": 512}),
+    )
+
+    # THEN one request is sent by set of parameters
+    assert client.send_request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_is_flushed_when_max_batch_size_is_reached():
+    # GIVEN a batcher with a long delay but a small batch size
+    client = _mock_client()
+    batcher = EmbeddingsBatcher(max_wait_ms=60_000, max_batch_size=2)
+
+    # WHEN two callers fill the batch
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "a"}),
+            batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "b"}),
+        ),
+        timeout=1,
+    )
+
+    # THEN the batch is sent without waiting for the delay
+    client.send_request.assert_called_once()
+    assert len(results) == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_propagated_to_all_callers():
+    # GIVEN a model which fails
+    client = MagicMock()
+    client.send_request = AsyncMock(side_effect=HTTPException(status_code=504, detail="Request timed out, model is too busy."))
+    batcher = EmbeddingsBatcher(max_wait_ms=10, max_batch_size=32)
+
+    # WHEN concurrent callers send their inputs
+    results = await asyncio.gather(
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "a"}),
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "b"}),
+        return_exceptions=True,
+    )
+
+    # THEN each caller receives the error
+    assert all(isinstance(result, HTTPException) and result.status_code == 504 for result in results)
+
+
+@pytest.mark.asyncio
+async def test_invalid_inputs_of_a_caller_do_not_fail_the_other_callers():
+    # GIVEN a model which rejects the requests containing an invalid input
+    async def send_request(method, url, json):
+        if "invalid" in json["input"]:
+            raise HTTPException(status_code=400, detail="Input is too long.")
+        data = [{"object": "embedding", "index": index, "embedding": [float(len(input))]} for index, input in enumerate(json["input"])]
+        content = dumps({"object": "list", "model": json["model"], "data": data})
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=content), 0.5
+
+    client = MagicMock()
+    client.send_request = AsyncMock(side_effect=send_request)
+    batcher = EmbeddingsBatcher(max_wait_ms=10, max_batch_size=32)
+
+    # WHEN a caller sends an invalid input concurrently with other callers
+    results = await asyncio.gather(
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": "a"}),
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": ["invalid"]}),
+        batcher(client=client, url="http://tei/v1/embeddings", json={"model": "embeddings", "input": ["bb", "ccc"]}),
+        return_exceptions=True,
+    )
+
+    # THEN the requests are sent separately after the failure of the batched request
+    assert client.send_request.call_count == 4
+    assert [call.kwargs["json"]["input"] for call in client.send_request.call_args_list[1:]] == [["a"], ["invalid"], ["bb", "ccc"]]
+
+    # THEN only the caller with the invalid input receives the error, with its own latency for the others
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 400
+    assert [embedding["embedding"][0] for embedding in results[0][0].json()["data"]] == [1.0]
+    assert [embedding["embedding"][0] for embedding in results[2][0].json()["data"]] == [2.0, 3.0]
+    assert results[0][1] == results[2][1] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_latency_of_batched_request_is_logged_once():
+    # GIVEN a model client with a batcher, whose provider answers a batched request in 400 ms
+    client = BaseModelClient(url="http://tei", key=None, timeout=10, model_name="embeddings", model_carbon_footprint_zone="WOR", model_carbon_footprint_total_params=0, model_carbon_footprint_active_params=0, model_cost_prompt_tokens=0, model_cost_completion_tokens=0, redis=ConnectionPool(), metrics_retention_ms=1000)  # fmt: off
+    client.endpoint = ENDPOINT__EMBEDDINGS
+    client.ENDPOINT_TABLE = {ENDPOINT__EMBEDDINGS: "/v1/embeddings"}
+    client.batcher = EmbeddingsBatcher(max_wait_ms=10, max_batch_size=32)
+    client._log_performance_metric = AsyncMock()
+
+    async def request(self, method, url, json, **kwargs):
+        data = [{"object": "embedding", "index": index, "embedding": [0.0]} for index, _ in enumerate(json["input"])]
+        return httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=dumps({"object": "list", "data": data}), request=httpx.Request(method, url))  # fmt: off
+
+    # WHEN concurrent requests are coalesced in one request to the provider
+    with (
+        patch("httpx.AsyncClient.request", request),
+        patch("app.clients.model._basemodelclient.time.perf_counter", side_effect=[0.0, 0.4]),
+        patch("app.clients.model._basemodelclient.global_context", MagicMock(tokenizer=MagicMock(USAGE_COMPLETION_ENDPOINTS={}))),
+    ):
+        await asyncio.gather(
+            client.forward_request(method="POST", json={"model": "embeddings", "input": "a"}),
+            client.forward_request(method="POST", json={"model": "embeddings", "input": ["b", "c", "d"]}),
+        )
+    await asyncio.sleep(0)
+
+    # THEN the real latency of the batched request is logged once in the performance metrics of the provider
+    client._log_performance_metric.assert_awaited_once()
+    assert client._log_performance_metric.call_args.kwargs["metric"].latency_ms == 400
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.utils import lifespan
+from app.utils.context import global_context
+
+
+@pytest.fixture
+def restore_global_context():
+    previous = (global_context.model_registry, global_context.agent_manager, global_context.document_manager)
+    yield
+    global_context.model_registry, global_context.agent_manager, global_context.document_manager = previous
+
+
+@pytest.mark.asyncio
+async def test_reload_models_swaps_registry_and_managers(restore_global_context):
+    # GIVEN a running API with a model registry and managers
+    old_registry, old_agent_manager, old_document_manager = MagicMock(), MagicMock(), MagicMock()
+    global_context.model_registry = old_registry
+    global_context.agent_manager = old_agent_manager
+    global_context.document_manager = old_document_manager
+
+    new_registry = MagicMock(models=["model-a", "model-b"])
+
+    async def setup_model_registry(configuration, global_context, dependencies):
+        global_context.model_registry = new_registry
+
+    async def setup_agent_manager(configuration, global_context, dependencies):
+        global_context.agent_manager = ("agent_manager", global_context.model_registry)
+
+    async def setup_document_manager(configuration, global_context, dependencies):
+        global_context.document_manager = ("document_manager", global_context.model_registry)
+
+    # WHEN the models are reloaded
+    with (
+        patch.object(lifespan, "Configuration"),
+        patch.object(lifespan, "_setup_model_registry", side_effect=setup_model_registry),
+        patch.object(lifespan, "_setup_agent_manager", side_effect=setup_agent_manager),
+        patch.object(lifespan, "_setup_document_manager", side_effect=setup_document_manager),
+    ):
+        result = await lifespan.reload_models(dependencies=SimpleNamespace())
+
+    # THEN the new registry and the managers built on it are swapped in the global context
+    assert result is True
+    assert global_context.model_registry is new_registry
+    assert global_context.agent_manager == ("agent_manager", new_registry)
+    assert global_context.document_manager == ("document_manager", new_registry)
+
+
+@pytest.mark.asyncio
+async def test_reload_models_keeps_current_models_on_failure(restore_global_context):
+    # GIVEN a running API with a model registry and managers
+    old_registry, old_agent_manager, old_document_manager = MagicMock(), MagicMock(), MagicMock()
+    global_context.model_registry = old_registry
+    global_context.agent_manager = old_agent_manager
+    global_context.document_manager = old_document_manager
+
+    # WHEN the reload fails because a required model is unreachable
+    with (
+        patch.object(lifespan, "Configuration"),
+        patch.object(lifespan, "_setup_model_registry", AsyncMock(side_effect=ValueError("Vector store embedding model must be reachable."))),
+        patch.object(lifespan, "_setup_agent_manager", AsyncMock()) as mock_setup_agent_manager,
+        patch.object(lifespan, "_setup_document_manager", AsyncMock()),
+    ):
+        result = await lifespan.reload_models(dependencies=SimpleNamespace())
+
+    # THEN the current registry and managers are kept
+    assert result is False
+    mock_setup_agent_manager.assert_not_called()
+    assert global_context.model_registry is old_registry
+    assert global_context.agent_manager is old_agent_manager
+    assert global_context.document_manager is old_document_manager
+
+
+@pytest.mark.asyncio
+async def test_setup_document_manager_keeps_helpers_independent_of_models():
+    # GIVEN the dependencies initialized at API start up, with a content cache and a parser manager
+    configuration = MagicMock()
+    configuration.settings.search_multi_agents_synthesis_model = None
+    dependencies = SimpleNamespace(vector_store=MagicMock(), web_search_engine=None, content_cache=MagicMock(), parser_manager=MagicMock())
+    contexts = [SimpleNamespace(model_registry=MagicMock()), SimpleNamespace(model_registry=MagicMock())]
+
+    # WHEN the document manager is set up at start up and by a reload of the models
+    for context in contexts:
+        await lifespan._setup_document_manager(configuration=configuration, global_context=context, dependencies=dependencies)
+
+    # THEN the document managers use the new models, but the same content cache and parser manager
+    assert contexts[0].document_manager is not contexts[1].document_manager
+    assert all(context.document_manager.content_cache is dependencies.content_cache for context in contexts)
+    assert all(context.document_manager.parser_manager is dependencies.parser_manager for context in contexts)
@@ -0,0 +1,110 @@
+import asyncio
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException, UploadFile
+import httpx
+import pymupdf
+import pytest
+
+from app.clients.parser import MarkerParserClient
+from app.schemas.core.documents import ParserParams
+from app.schemas.parse import ParsedDocumentOutputFormat
+
+
+def _params(page_count: int, output_format: ParsedDocumentOutputFormat, page_range: str = "") -> ParserParams:
+    pdf = pymupdf.open()
+    for index in range(page_count):
+        page = pdf.new_page(width=200, height=200)
+        page.insert_text((20, 20), f"page {index}")
+    file = UploadFile(file=BytesIO(pdf.tobytes()), filename="test.pdf")
+
+    return ParserParams(file=file, output_format=output_format, force_ocr=False, page_range=page_range, paginate_output=False, use_llm=False)
+
+
+@pytest.fixture
+def marker():
+    with patch("app.clients.parser._markerparserclient.httpx.get", return_value=MagicMock(status_code=200)):
+        client = MarkerParserClient(url="http://marker:8000", headers={}, timeout=10, batch_size=3, max_concurrency=2)
+
+    state = MagicMock(active=0, max_active=0, uploads=[])
+
+    async def post(self, url: str, files: dict, data: dict):
+        state.active += 1
+        state.max_active = max(state.max_active, state.active)
+        await asyncio.sleep(0.01)
+        state.active -= 1
+
+        pdf = pymupdf.open(stream=files["file"][1].read(), filetype="pdf")
+        texts = [page.get_text().strip() for page in pdf]
+        state.uploads.append(texts)
+        if data["paginate_output"]:
+            output = "".join("\n\n{" + str(index) + "}" + "-" * 48 + "\n\n" + text for index, text in enumerate(texts))
+        else:
+            output = texts[0]
+        images = {f"_page_{index}_Picture_0.jpeg": text for index, text in enumerate(texts)}
+
+        return httpx.Response(status_code=200, json={"success": True, "output": output, "images": images})
+
+    with patch("app.clients.parser._markerparserclient.httpx.AsyncClient.post", new=post):
+        yield client, state
+
+
+@pytest.mark.asyncio
+async def test_parse_sends_batches_of_contiguous_pages(marker):
+    # GIVEN a PDF of 8 pages and a page range with a gap
+    client, state = marker
+    params = _params(page_count=8, output_format=ParsedDocumentOutputFormat.MARKDOWN, page_range="0-4,6-7")
+
+    # WHEN the document is parsed
+    document = await client.parse(params=params)
+
+    # THEN only the pages of each batch are uploaded, batches are concurrent and pages are returned in order
+    assert sorted(state.uploads) == [["page 0", "page 1", "page 2"], ["page 3", "page 4"], ["page 6", "page 7"]]
+    assert state.max_active == 2
+    assert [page.metadata.page for page in document.data] == [0, 1, 2, 3, 4, 6, 7]
+    assert all(page.content == f"page {page.metadata.page}" for page in document.data)
+    assert all(list(page.images.values()) == [f"page {page.metadata.page}"] for page in document.data)
+
+
+@pytest.mark.asyncio
+async def test_parse_html_page_by_page(marker):
+    # GIVEN a PDF of 3 pages parsed to HTML, which can't be split back into pages
+    client, state = marker
+    params = _params(page_count=3, output_format=ParsedDocumentOutputFormat.HTML)
+
+    # WHEN the document is parsed
+    document = await client.parse(params=params)
+
+    # THEN each page is uploaded alone
+    assert sorted(state.uploads) == [["page 0"], ["page 1"], ["page 2"]]
+    assert [page.content for page in document.data] == ["page 0", "page 1", "page 2"]
+
+
+@pytest.mark.asyncio
+async def test_parse_failure_cancels_other_batches():
+    # GIVEN a Marker API failing on the first batch while the other batches are still running
+    with patch("app.clients.parser._markerparserclient.httpx.get", return_value=MagicMock(status_code=200)):
+        client = MarkerParserClient(url="http://marker:8000", headers={}, timeout=10, batch_size=1, max_concurrency=3)
+    completed = []
+
+    async def post(self, url: str, files: dict, data: dict):
+        texts = [page.get_text().strip() for page in pymupdf.open(stream=files["file"][1].read(), filetype="pdf")]
+        if texts == ["page 0"]:
+            return httpx.Response(status_code=500, json={"detail": "Marker failed."})
+        await asyncio.sleep(1)
+        completed.append(texts)
+
+        return httpx.Response(status_code=200, json={"success": True, "output": texts[0], "images": {}})
+
+    params = _params(page_count=3, output_format=ParsedDocumentOutputFormat.MARKDOWN)
+
+    # WHEN the document is parsed
+    with patch("app.clients.parser._markerparserclient.httpx.AsyncClient.post", new=post):
+        with pytest.raises(HTTPException) as exc_info:
+            await client.parse(params=params)
+
+    # THEN the error of the failed batch is raised and the other batches are cancelled
+    assert exc_info.value.status_code == 500
+    assert exc_info.value.detail == "Marker failed."
+    assert completed == []
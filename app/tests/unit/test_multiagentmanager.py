@@ -0,0 +1,139 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.helpers._contentcache import ContentCache
+from app.helpers._multiagentmanager import MultiAgentManager
+from app.schemas.chunks import Chunk
+from app.schemas.search import Search, SearchMethod
+
+
+def _searches(count: int) -> list[Search]:
+    return [Search(method=SearchMethod.SEMANTIC, score=1.0, chunk=Chunk(id=i, content=f"chunk {i}", metadata={"document_name": "doc"})) for i in range(count)]  # fmt: off
+
+
+def _manager(choices: dict, delays: dict = {}, **kwargs) -> tuple[MultiAgentManager, MagicMock]:
+    state = MagicMock(active=0, max_active=0, windows=[], completed=[])
+    manager = MultiAgentManager(synthesis_model=MagicMock(), reranker_model=MagicMock(), **kwargs)
+
+    async def get_rank(prompt: str, inputs: list[str]) -> list[int]:
+        window = int(inputs[0].split("chunk ")[1].removesuffix("...")) // 5
+        state.windows.append(window)
+        state.active += 1
+        state.max_active = max(state.max_active, state.active)
+        await asyncio.sleep(delays.get(window, 0.05))
+        state.active -= 1
+        state.completed.append(window)
+        return [choices[window]]
+
+    manager._get_rank = get_rank
+
+    return manager, state
+
+
+@pytest.mark.asyncio
+async def test_search_evaluates_windows_concurrently():
+    # GIVEN 4 windows of chunks, the second one being acceptable and evaluated after the third one
+    manager, state = _manager(choices={0: 3, 1: 1, 2: 2, 3: 0}, delays={1: 0.1})
+
+    # WHEN the search is performed
+    searches = await manager.search(searches=_searches(count=20), prompt="prompt")
+
+    # THEN windows are evaluated concurrently and the first acceptable window in rank order is chosen, although evaluated last
+    assert state.max_active == 4
+    assert state.completed[-1] == 1
+    assert all(search.chunk.metadata["choice"] == 1 and search.chunk.metadata["n_retry"] == 1 for search in searches)
+
+
+@pytest.mark.asyncio
+async def test_search_speculative_evaluation():
+    # GIVEN a reranker evaluating 2 windows at a time and an acceptable first window
+    manager, state = _manager(choices={0: 2, 1: 1, 2: 1, 3: 1}, max_concurrency=2)
+
+    # WHEN the search is performed
+    searches = await manager.search(searches=_searches(count=20), prompt="prompt")
+
+    # THEN at most 2 windows are evaluated at the same time, and the evaluations are stopped once the first window is accepted
+    assert state.max_active == 2
+    assert 3 not in state.windows
+    assert searches[0].chunk.metadata["choice"] == 2 and searches[0].chunk.metadata["n_retry"] == 0
+
+
+@pytest.mark.asyncio
+async def test_search_no_acceptable_window():
+    manager, state = _manager(choices={0: 3, 1: 0})
+
+    searches = await manager.search(searches=_searches(count=8), prompt="prompt")
+
+    assert searches[0].chunk.metadata["choice"] == 3 and searches[0].chunk.metadata["n_retry"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_rank_is_cached(tmp_path):
+    # GIVEN a reranker model and a content cache
+    manager = MultiAgentManager(synthesis_model=MagicMock(), reranker_model=MagicMock(), content_cache=ContentCache(directory=str(tmp_path), max_size=10_000))  # fmt: off
+    manager.reranker_model.name = "reranker"
+    response = MagicMock()
+    response.json.return_value = {"choices": [{"message": {"content": "1"}}]}
+
+    async def forward_request(method: str, json: dict):
+        return response
+
+    client = MagicMock(forward_request=MagicMock(side_effect=forward_request))
+    manager.reranker_model.get_client.return_value = client
+
+    # WHEN the same window is evaluated twice for the same prompt
+    assert await manager._get_rank("prompt", ["chunk 0"]) == [1]
+    assert await manager._get_rank("prompt", ["chunk 0"]) == [1]
+    assert await manager._get_rank("other prompt", ["chunk 0"]) == [1]
+
+    # THEN the reranker model is called once per prompt
+    assert client.forward_request.call_count == 2
+
+
+def _synthesis_manager(delays: dict, **kwargs) -> tuple[MultiAgentManager, list[str]]:
+    """Create a manager whose agents answer after the given delays, agents without delay never answer unless cancelled."""
+    manager = MultiAgentManager(synthesis_model=MagicMock(), reranker_model=MagicMock(), **kwargs)
+    cancelled = []
+
+    async def get_completion(prompt: str, temperature: float = 0.2) -> str:
+        try:
+            if delays[prompt] is None:
+                await asyncio.Event().wait()
+            else:
+                await asyncio.sleep(delays[prompt])
+        except asyncio.CancelledError:
+            cancelled.append(prompt)
+            raise
+        return f"answer {prompt}"
+
+    manager._get_completion = get_completion
+
+    return manager, cancelled
+
+
+@pytest.mark.asyncio
+async def test_ask_in_parallel_drops_slow_agents_after_timeout():
+    # GIVEN a straggler agent which never answers
+    manager, cancelled = _synthesis_manager(delays={"a": 0.02, "b": None, "c": 0}, quorum=1, timeout=0.2)
+
+    # WHEN the agents are asked
+    answers = await manager._ask_in_parallel(["a", "b", "c"])
+
+    # THEN the straggler is cancelled at the timeout and the answers are in the order of the prompts
+    assert cancelled == ["b"]
+    assert answers == ["answer a", "answer c"]
+
+
+@pytest.mark.asyncio
+async def test_ask_in_parallel_waits_for_quorum():
+    # GIVEN a timeout reached before the quorum
+    manager, cancelled = _synthesis_manager(delays={"a": 0.01, "b": 0.3, "c": None}, quorum=2, timeout=0.05)
+
+    # WHEN the agents are asked
+    answers = await manager._ask_in_parallel(["a", "b", "c"])
+
+    # THEN answers are awaited until the quorum is reached, the other agents being cancelled
+    assert answers == ["answer a", "answer b"]
+    assert cancelled == ["c"]
@@ -0,0 +1,162 @@
+import asyncio
+import tempfile
+from types import SimpleNamespace
+from typing import Optional
+from unittest.mock import MagicMock, patch
+
+from fastapi import HTTPException
+import orjson
+import pymupdf
+import pytest
+
+from app.endpoints import ocr
+from app.endpoints.ocr import _close_stream, _ocr_pages, _stream_pages
+from app.utils.files import open_pdf
+
+
+def _pdf(page_count: int) -> pymupdf.Document:
+    pdf = pymupdf.open()
+    for index in range(page_count):
+        page = pdf.new_page(width=200, height=200)
+        page.insert_text((20, 20), f"page {index}")
+
+    return pymupdf.open(stream=pdf.tobytes(), filetype="pdf")
+
+
+def _model(delays: dict, fail_page: Optional[int] = None):
+    state = SimpleNamespace(active=0, max_active=0, clients=0)
+
+    async def forward_request(method: str, json: dict):
+        page = len(calls)  # pages are rendered and sent in order
+        calls.append(page)
+        state.active += 1
+        state.max_active = max(state.max_active, state.active)
+        try:
+            await asyncio.sleep(delays.get(page, 0.05))
+            if page == fail_page:
+                raise HTTPException(status_code=504, detail="Request timed out, model is too busy.")
+            return SimpleNamespace(content=orjson.dumps({"choices": [{"message": {"content": f"text {page}"}}]}))
+        finally:
+            state.active -= 1
+
+    def get_client(endpoint: str):
+        state.clients += 1
+        return SimpleNamespace(forward_request=forward_request)
+
+    calls = []
+    return MagicMock(get_client=get_client), state
+
+
+@pytest.mark.asyncio
+async def test_ocr_pages_are_processed_concurrently():
+    # GIVEN a PDF of 6 pages and a model whose first page is the slowest
+    pdf = _pdf(page_count=6)
+    model, state = _model(delays={0: 0.3})
+
+    # WHEN the pages are processed with a concurrency of 3
+    with patch("app.endpoints.ocr.configuration") as configuration:
+        configuration.settings.ocr_max_concurrency = 3
+        pages = [page async for page in _ocr_pages(pdf=pdf, model=model, dpi=100, prompt="ocr", document_name="test.pdf")]
+
+    # THEN all pages are returned as soon as they are processed, concurrency is bounded and each page gets its own client
+    assert len(pages) == 6
+    assert pages[-1].metadata.page == 0
+    assert sorted(page.metadata.page for page in pages) == list(range(6))
+    assert all(page.content == f"text {page.metadata.page}" for page in pages)
+    assert state.max_active == 3
+    assert state.clients == 6
+    pdf.close()
+
+
+@pytest.mark.asyncio
+async def test_ocr_pages_stream_stops_on_error():
+    # GIVEN a PDF of 4 pages and a model failing on the second page
+    pdf = _pdf(page_count=4)
+    model, _ = _model(delays={}, fail_page=1)
+
+    # WHEN the pages are streamed
+    with patch("app.endpoints.ocr.configuration") as configuration, patch("app.endpoints.ocr.request_context"):
+        configuration.settings.ocr_max_concurrency = 1
+        pages = _ocr_pages(pdf=pdf, model=model, dpi=100, prompt="ocr", document_name="test.pdf")
+        chunks = [chunk async for chunk in _stream_pages(pdf=pdf, pages=pages)]
+
+    # THEN the first page is streamed, followed by the error and no [DONE] message
+    assert chunks[0][1] == 200 and orjson.loads(chunks[0][0].removeprefix(b"data: "))["metadata"]["page"] == 0
+    assert chunks[-1] == (b'{"detail":"Request timed out, model is too busy."}', 504)
+    assert len(chunks) == 2
+    assert pdf.is_closed
+
+
+@pytest.mark.asyncio
+async def test_ocr_pages_stream_returns_an_error_on_unexpected_exception():
+    # GIVEN a PDF of 4 pages whose second page can't be rendered
+    pdf = _pdf(page_count=4)
+    model, _ = _model(delays={})
+    render_page = ocr._render_page
+
+    def failing_render_page(pdf: pymupdf.Document, index: int, dpi: int) -> str:
+        if index == 1:
+            raise RuntimeError("Invalid page.")
+        return render_page(pdf, index, dpi)
+
+    # WHEN the pages are streamed
+    with patch("app.endpoints.ocr.configuration") as configuration, patch("app.endpoints.ocr.request_context"), patch("app.endpoints.ocr._render_page", failing_render_page):  # fmt: off
+        configuration.settings.ocr_max_concurrency = 1
+        pages = _ocr_pages(pdf=pdf, model=model, dpi=100, prompt="ocr", document_name="test.pdf")
+        chunks = [chunk async for chunk in _stream_pages(pdf=pdf, pages=pages)]
+
+    # THEN the stream ends with an internal error, without [DONE] message
+    assert chunks[-1] == (b'{"detail":"RuntimeError"}', 500)
+    assert all(status_code == 200 for _, status_code in chunks[:-1])
+    assert pdf.is_closed
+
+
+@pytest.mark.asyncio
+async def test_close_stream_never_iterated():
+    # GIVEN a stream of pages which is never iterated (client disconnected before the response)
+    pdf = _pdf(page_count=2)
+    model, state = _model(delays={})
+    pages = _ocr_pages(pdf=pdf, model=model, dpi=100, prompt="ocr", document_name="test.pdf")
+    stream = _stream_pages(pdf=pdf, pages=pages)
+
+    # WHEN the stream is closed after the response
+    await _close_stream(stream=stream, pdf=pdf)
+
+    # THEN the document is closed without processing the pages
+    assert pdf.is_closed
+    assert state.clients == 0
+
+
+@pytest.mark.asyncio
+async def test_close_stream_partially_iterated():
+    # GIVEN a stream of pages interrupted after the first page (client disconnected)
+    pdf = _pdf(page_count=4)
+    model, state = _model(delays={})
+
+    with patch("app.endpoints.ocr.configuration") as configuration, patch("app.endpoints.ocr.request_context"):
+        configuration.settings.ocr_max_concurrency = 1
+        pages = _ocr_pages(pdf=pdf, model=model, dpi=100, prompt="ocr", document_name="test.pdf")
+        stream = _stream_pages(pdf=pdf, pages=pages)
+        await anext(stream)
+
+        # WHEN the stream is closed after the response
+        await _close_stream(stream=stream, pdf=pdf)
+
+    # THEN the processing of the other pages is cancelled before the document is closed
+    assert pdf.is_closed
+    assert state.active == 0
+    assert state.clients < 4
+
+
+@pytest.mark.parametrize("max_size", [1, 1024 * 1024])
+def test_open_pdf_from_spooled_file(max_size: int):
+    # GIVEN an uploaded PDF spooled on disk or in memory
+    file = tempfile.SpooledTemporaryFile(max_size=max_size)
+    file.write(_pdf(page_count=2).tobytes())
+
+    # WHEN the PDF is opened
+    pdf = open_pdf(file=file)
+
+    # THEN the file spooled on disk is memory mapped instead of being read
+    assert isinstance(pdf.stream, memoryview if max_size == 1 else bytes)
+    assert [page.get_text().strip() for page in pdf] == ["page 0", "page 1"]
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.helpers._identityaccessmanager import IdentityAccessManager
+from app.helpers._usagemanager import UsageManager
+from app.schemas.auth import Token
+from app.sql.models import Token as TokenTable
+from app.sql.models import Usage
+from app.utils.exceptions import InvalidCursorException
+from app.utils.pagination import decode_cursor, encode_cursor, get_next_cursor, paginate
+
+
+def _compile(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_paginate_without_cursor_uses_offset():
+    statement = paginate(select(TokenTable.id), columns=[TokenTable.id], offset=20, limit=10)
+
+    assert _compile(statement).endswith("ORDER BY token.id ASC \n LIMIT 10 OFFSET 20")
+
+
+def test_paginate_with_cursor_starts_after_the_last_item():
+    # GIVEN the cursor of a page of tokens ordered by name
+    columns = IdentityAccessManager._get_order_columns(table=TokenTable, order_by="name")
+    cursor = get_next_cursor(data=[Token(id=1, name="a", token="sk-1", user=1, created_at=0), Token(id=7, name="b", token="sk-7", user=1, created_at=0)], limit=2, order_by="name")  # fmt: off
+
+    # WHEN the next page is requested
+    statement = paginate(select(TokenTable.id), columns=columns, order_direction="desc", offset=20, limit=2, cursor=cursor)
+
+    # THEN the rows are filtered on the values of the last item instead of being skipped, the offset being ignored
+    sql = _compile(statement)
+    assert "WHERE (coalesce(token.name, ''), token.id) < ('b', 7)" in sql
+    assert "OFFSET" not in sql
+
+
+def test_get_next_cursor_of_the_last_page_is_none():
+    assert get_next_cursor(data=[Token(id=1, name="a", token="sk-1", user=1, created_at=0)], limit=2) is None
+
+
+def test_decode_cursor_converts_dates():
+    cursor = UsageManager.get_next_cursor([Usage(id=3, datetime=datetime(2025, 7, 1, 10, 42, 0, 5))], order_by="datetime", limit=1)
+
+    assert decode_cursor(cursor=cursor, columns=UsageManager.get_order_columns(order_by="datetime")) == [datetime(2025, 7, 1, 10, 42, 0, 5), 3]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor(1, 2), encode_cursor(None), "é"])
+def test_decode_invalid_cursor_raises(cursor):
+    with pytest.raises(InvalidCursorException):
+        decode_cursor(cursor=cursor, columns=[TokenTable.id])
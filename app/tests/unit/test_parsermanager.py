@@ -3,6 +3,7 @@ from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
 from fastapi import HTTPException, UploadFile
 from starlette.datastructures import Headers
 from io import BytesIO
+import pymupdf
 
 from app.helpers._parsermanager import ParserManager
 from app.clients.parser import BaseParserClient as ParserClient
@@ -21,6 +22,16 @@ def create_binary_upload_file(content: bytes, filename: str, content_type: str)
     return UploadFile(filename=filename, file=BytesIO(content), headers=Headers({"content-type": content_type}))
 
 
+def create_pdf_upload_file(texts: list, filename: str) -> UploadFile:
+    """Helper function to create UploadFile of a PDF file with one page per text."""
+    pdf = pymupdf.open()
+    for text in texts:
+        page = pdf.new_page()
+        page.insert_text((72, 72), text)
+
+    return create_binary_upload_file(pdf.tobytes(), filename, "application/pdf")
+
+
 class TestParserManagerInit:
     """Test ParserManager initialization."""
 
@@ -222,24 +233,29 @@ class TestParserManagerParsePdf:
     @pytest.mark.asyncio
     async def test_parse_pdf_fallback_to_pymupdf(self):
         """Test PDF parsing fallback to PyMuPDF when no parser client."""
-        file = create_binary_upload_file(b"%PDF-1.4 fake pdf content", "test.pdf", "application/pdf")
+        file = create_pdf_upload_file(["Page content"], "test.pdf")
+
+        manager = ParserManager()
+
+        result = await manager._parse_pdf(ParserParams(file=file))
 
-        mock_pdf = MagicMock()
-        mock_page = MagicMock()
-        mock_page.get_text.return_value = "Page content"
-        mock_pdf.__len__.return_value = 1
-        mock_pdf.__getitem__.return_value = mock_page
+        assert isinstance(result, ParsedDocument)
+        assert len(result.data) == 1
+        assert result.data[0].content.strip() == "Page content"
+        assert result.data[0].metadata.document_name == "test.pdf"
+
+    @pytest.mark.asyncio
+    async def test_parse_file_pages_by_windows(self):
+        """Test PDF pages are yielded in order when extracted by windows of pages."""
+        file = create_pdf_upload_file([f"Page {i}" for i in range(5)], "test.pdf")
 
         manager = ParserManager()
 
-        with patch("pymupdf.open", return_value=mock_pdf):
-            result = await manager._parse_pdf(ParserParams(file=file))
+        with patch.object(ParserManager, "PDF_WINDOW_SIZE", 2):
+            pages = [page async for page in manager.parse_file_pages(file=file)]
 
-            assert isinstance(result, ParsedDocument)
-            assert len(result.data) == 1
-            assert result.data[0].content == "Page content"
-            assert result.data[0].metadata.document_name == "test.pdf"
-            mock_pdf.close.assert_called_once()
+        assert [page.content.strip() for page in pages] == [f"Page {i}" for i in range(5)]
+        assert [page.metadata.page for page in pages] == list(range(5))
 
     @pytest.mark.asyncio
     async def test_parse_pdf_pymupdf_exception(self):
@@ -456,20 +472,16 @@ class TestParserManagerEdgeCases:
         mock_parser = MagicMock(spec=ParserClient)
         mock_parser.SUPPORTED_FORMATS = []  # No supported formats
 
-        file = create_binary_upload_file(b"%PDF-1.4 fake pdf content", "test.pdf", "application/pdf")
+        file = create_pdf_upload_file(["Page content"], "test.pdf")
 
         manager = ParserManager(parser=mock_parser)
 
         # Should fall back to built-in parsing
-        with patch("pymupdf.open") as mock_pymupdf:
-            mock_pdf = MagicMock()
-            mock_pdf.__len__.return_value = 0
-            mock_pymupdf.return_value = mock_pdf
-
-            result = await manager._parse_pdf(ParserParams(file=file))
+        result = await manager._parse_pdf(ParserParams(file=file))
 
-            assert isinstance(result, ParsedDocument)
-            mock_pymupdf.assert_called_once()
+        assert isinstance(result, ParsedDocument)
+        assert result.data[0].content.strip() == "Page content"
+        mock_parser.parse.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_parse_file_integration_txt(self):
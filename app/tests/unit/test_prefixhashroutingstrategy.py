@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from app.helpers.models.routers.strategies import PrefixHashRoutingStrategy
+
+
+def _clients(count: int):
+    return [SimpleNamespace(url=f"http://vllm-{index}:8000", name="my-model", active_requests=0) for index in range(count)]
+
+
+def test_same_prefix_is_routed_to_same_client():
+    # GIVEN a model with 4 clients and requests sharing a long system prompt
+    clients = _clients(count=4)
+    ring = PrefixHashRoutingStrategy.build_ring(clients)
+    system = {"role": "system", "content": "You are a helpful assistant. " * 100}
+
+    # WHEN requests with different user messages are routed
+    chosen = set()
+    for question in ["Hello", "What time is it?", "Tell me a joke"]:
+        prefix = PrefixHashRoutingStrategy.get_prefix(body={"messages": [system, {"role": "user", "content": question}]})
+        chosen.add(id(PrefixHashRoutingStrategy(clients, ring, prefix).choose_model_client()))
+
+    # THEN they are all routed to the same client
+    assert len(chosen) == 1
+
+
+def test_different_prefixes_are_spread_between_clients():
+    # GIVEN a model with 4 clients
+    clients = _clients(count=4)
+    ring = PrefixHashRoutingStrategy.build_ring(clients)
+
+    # WHEN requests with different prompts are routed
+    chosen = set()
+    for index in range(100):
+        prefix = PrefixHashRoutingStrategy.get_prefix(body={"messages": [{"role": "user", "content": f"prompt {index}"}]})
+        chosen.add(id(PrefixHashRoutingStrategy(clients, ring, prefix).choose_model_client()))
+
+    # THEN all clients receive requests
+    assert len(chosen) == 4
+
+
+def test_overloaded_client_is_skipped():
+    # GIVEN the client of a prefix is overloaded
+    clients = _clients(count=4)
+    ring = PrefixHashRoutingStrategy.build_ring(clients)
+    prefix = PrefixHashRoutingStrategy.get_prefix(body={"prompt": "Once upon a time"})
+    preferred = PrefixHashRoutingStrategy(clients, ring, prefix).choose_model_client()
+    preferred.active_requests = 10
+
+    # WHEN the request is routed
+    client = PrefixHashRoutingStrategy(clients, ring, prefix).choose_model_client()
+
+    # THEN another client is chosen, and the choice is stable
+    assert client is not preferred
+    assert PrefixHashRoutingStrategy(clients, ring, prefix).choose_model_client() is client
+
+
+def test_get_prefix():
+    # GIVEN/WHEN/THEN the routing key is built from the leading characters of the messages or the prompt
+    assert PrefixHashRoutingStrategy.get_prefix(body=None) is None
+    assert PrefixHashRoutingStrategy.get_prefix(body={"input": "hello"}) is None
+    assert PrefixHashRoutingStrategy.get_prefix(body={"messages": [{"role": "user", "content": "hello"}]}) == "user:hello"
+    assert len(PrefixHashRoutingStrategy.get_prefix(body={"prompt": "a" * 10_000})) == PrefixHashRoutingStrategy.PREFIX_LENGTH
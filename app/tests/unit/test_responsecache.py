@@ -0,0 +1,112 @@
+from json import dumps
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.helpers._responsecache import ResponseCache
+
+
+@pytest.fixture
+def cache():
+    with patch("app.helpers._responsecache.Redis"):
+        cache = ResponseCache(redis=MagicMock(), ttl=60, max_size=10_000)
+    cache.redis = MagicMock()
+    cache.redis.get = AsyncMock(return_value=None)
+    cache.redis.set = AsyncMock()
+    return cache
+
+
+def test_get_key_only_for_deterministic_requests(cache):
+    # GIVEN requests with different temperatures
+    body = {"model": "my-alias", "messages": [{"role": "user", "content": "Hello"}], "stream": False}
+
+    # WHEN/THEN only requests with temperature set to 0 are cacheable
+    assert cache.get_key(endpoint="/chat/completions", model="my-model", body={**body, "temperature": 0.7}) is None
+    assert cache.get_key(endpoint="/chat/completions", model="my-model", body={**body, "temperature": 0}) is not None
+
+    # WHEN/THEN the cache is bypassed with Cache-Control header
+    assert cache.get_key(endpoint="/chat/completions", model="my-model", body={**body, "temperature": 0}, cache_control="no-cache") is None
+
+
+def test_get_key_is_canonical(cache):
+    # GIVEN the same request with different key orders and model aliases
+    body_1 = {"model": "my-alias", "temperature": 0, "messages": [{"role": "user", "content": "Hello"}]}
+    body_2 = {"messages": [{"content": "Hello", "role": "user"}], "temperature": 0, "model": "my-model"}
+
+    # WHEN the keys are computed with the resolved model name
+    key_1 = cache.get_key(endpoint="/chat/completions", model="my-model", body=body_1)
+    key_2 = cache.get_key(endpoint="/chat/completions", model="my-model", body=body_2)
+
+    # THEN the keys are equal and differ from another endpoint
+    assert key_1 == key_2
+    assert key_1 != cache.get_key(endpoint="/completions", model="my-model", body=body_1)
+
+
+@pytest.mark.asyncio
+async def test_get_marks_usage_as_cached(cache):
+    # GIVEN a cached response
+    cache.redis.get.return_value = dumps({"id": "chatcmpl-1", "usage": {"prompt_tokens": 3, "cached": False}}).encode()
+
+    # WHEN the response is read from the cache
+    response = await cache.get(key="response_cache:/chat/completions:abc")
+
+    # THEN the usage is marked as cached
+    assert response["usage"]["cached"] is True
+
+
+@pytest.mark.asyncio
+async def test_set_skips_large_responses(cache):
+    # GIVEN a response larger than the max size
+    cache.max_size = 10
+
+    # WHEN the response is stored
+    await cache.set(key="response_cache:/chat/completions:abc", value={"content": "a very long response"})
+
+    # THEN it is not stored
+    cache.redis.set.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_tee_stores_complete_stream_and_replay_it(cache):
+    # GIVEN a complete streamed response
+    chunks = [
+        b'data: {"id": "1", "choices": [{"index": 0, "delta": {"content": "Hel"}}]}\n\n',
+        b'data: {"id": "1", "choices": [{"index": 0, "delta": {"content": "lo"}}]}\n\n',
+        b'data: {"id": "1", "choices": [], "usage": {"prompt_tokens": 3, "cached": false}}\n\ndata: [DONE]\n\n',
+    ]
+
+    async def stream():
+        for chunk in chunks:
+            yield chunk, 200
+
+    # WHEN the stream is forwarded through the cache
+    forwarded = [item async for item in cache.tee(key="response_cache:/chat/completions:abc", stream=stream())]
+
+    # THEN the stream is forwarded unchanged and stored as a list of events
+    assert forwarded == [(chunk, 200) for chunk in chunks]
+    cache.redis.set.assert_called_once()
+    events = cache.redis.set.call_args.kwargs["value"]
+    cache.redis.get.return_value = events.encode()
+
+    # WHEN the cached stream is replayed
+    events = await cache.get(key="response_cache:/chat/completions:abc")
+    replayed = b"".join([chunk async for chunk, _ in cache.replay(events=events)])
+
+    # THEN the events are replayed as server-sent events with cached usage
+    assert replayed.count(b"data: ") == 4
+    assert replayed.endswith(b"data: [DONE]\n\n")
+    assert b'"cached": true' in replayed
+
+
+@pytest.mark.asyncio
+async def test_tee_does_not_store_failed_stream(cache):
+    # GIVEN a stream which fails
+    async def stream():
+        yield b'data: {"id": "1", "choices": []}\n\n', 200
+        yield b'{"detail": "Request timed out, model is too busy."}', 504
+
+    # WHEN the stream is forwarded through the cache
+    [item async for item in cache.tee(key="response_cache:/chat/completions:abc", stream=stream())]
+
+    # THEN nothing is stored
+    cache.redis.set.assert_not_called()
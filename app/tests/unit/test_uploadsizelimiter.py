@@ -0,0 +1,89 @@
+from fastapi import FastAPI, UploadFile
+import httpx
+import pytest
+
+from app.helpers._uploadsizelimiter import UploadSizeLimiter
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimiter, max_size=1_000, paths=["/v1/files"])
+    received = []
+
+    @app.post("/v1/files")
+    async def upload(file: UploadFile):
+        received.append(file.size)
+        return {"size": file.size}
+
+    @app.post("/v1/other")
+    async def other(file: UploadFile):
+        return {"size": file.size}
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    client.received = received
+
+    return client
+
+
+@pytest.mark.asyncio
+async def test_upload_under_limit_is_accepted(client):
+    response = await client.post("/v1/files", files={"file": ("test.txt", b"a" * 500)})
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 500}
+
+
+@pytest.mark.asyncio
+async def test_upload_with_too_large_content_length_is_rejected_before_the_body_is_read(client):
+    response = await client.post("/v1/files", files={"file": ("test.txt", b"a" * 2_000)})
+
+    assert response.status_code == 413
+    assert client.received == []
+
+
+@pytest.mark.asyncio
+async def test_chunked_upload_is_cut_when_the_limit_is_exceeded(client):
+    # GIVEN a chunked body without content length
+    sent = []
+
+    async def body():
+        yield b'--boundary\r\nContent-Disposition: form-data; name="file"; filename="test.txt"\r\n\r\n'
+        for _ in range(100):
+            sent.append(100)
+            yield b"a" * 100
+        yield b"\r\n--boundary--\r\n"
+
+    # WHEN the body is sent
+    response = await client.post("/v1/files", content=body(), headers={"content-type": "multipart/form-data; boundary=boundary"})
+
+    # THEN the request is rejected once the limit is exceeded, before the whole body is sent to the endpoint
+    assert response.status_code == 413
+    assert client.received == []
+    assert sum(sent) < 10_000
+
+
+@pytest.mark.asyncio
+async def test_other_paths_are_not_limited(client):
+    response = await client.post("/v1/other", files={"file": ("test.txt", b"a" * 2_000)})
+
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_rejected_upload_returns_the_limit_of_the_path():
+    # GIVEN a limiter of an endpoint with its own limit
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimiter, max_size=1_000, paths=["/v1/audio/transcriptions"], detail="File size limit exceeded (max: 1000 bytes).")
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(file: UploadFile):
+        return {"size": file.size}
+
+    # WHEN a larger file is uploaded
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/v1/audio/transcriptions", files={"file": ("audio.wav", b"a" * 2_000)})
+
+    # THEN the error returns the limit of the endpoint
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File size limit exceeded (max: 1000 bytes)."}
@@ -0,0 +1,122 @@
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.helpers._usagemanager import UsageManager
+from app.sql.models import Usage
+
+
+def _timestamp(value: str) -> int:
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def test_split_date_range_in_days_hours_and_raw_bounds():
+    # GIVEN a range from the middle of an hour to the middle of an hour 2 days later
+    date_from, date_to = _timestamp("2025-07-01T22:30:00"), _timestamp("2025-07-03T01:15:00")
+
+    # WHEN the range is split
+    ranges = UsageManager.split_date_range(date_from=date_from, date_to=date_to)
+
+    # THEN full days and full hours are served by the rollups, partial hours by the usage table
+    assert ranges["daily"] == [(datetime(2025, 7, 2), datetime(2025, 7, 3))]
+    assert ranges["hourly"] == [(datetime(2025, 7, 1, 23), datetime(2025, 7, 2)), (datetime(2025, 7, 3), datetime(2025, 7, 3, 1))]
+    assert ranges["raw"] == [(datetime(2025, 7, 1, 22, 30), datetime(2025, 7, 1, 23)), (datetime(2025, 7, 3, 1), datetime(2025, 7, 3, 1, 15, 0, 1))]
+
+
+def test_split_date_range_within_an_hour():
+    ranges = UsageManager.split_date_range(date_from=_timestamp("2025-07-01T10:10:00"), date_to=_timestamp("2025-07-01T10:50:00"))
+
+    assert ranges == {"daily": [], "hourly": [], "raw": [(datetime(2025, 7, 1, 10, 10), datetime(2025, 7, 1, 10, 50, 0, 1))]}
+
+
+def test_split_date_range_aligned_on_hours():
+    ranges = UsageManager.split_date_range(date_from=_timestamp("2025-07-01T10:00:00"), date_to=_timestamp("2025-07-01T12:00:00"))
+
+    # the end of the range is included, so the requests of its last second are read from the usage table
+    assert ranges["daily"] == []
+    assert ranges["hourly"] == [(datetime(2025, 7, 1, 10), datetime(2025, 7, 1, 12))]
+    assert ranges["raw"] == [(datetime(2025, 7, 1, 12), datetime(2025, 7, 1, 12, 0, 0, 1))]
+
+
+@pytest.mark.asyncio
+async def test_get_usage_aggregation_combines_rollups_and_usage():
+    # GIVEN daily, hourly and raw aggregations
+    session = MagicMock()
+    rows = [(10, 1.5, 1000, 0.02, 8), (3, 0.5, 300, 0.01, 2), (1, None, 50, None, 0)]
+    session.execute = AsyncMock(side_effect=[MagicMock(first=MagicMock(return_value=row)) for row in rows])
+
+    # WHEN the usage of a range covering days, hours and partial hours is aggregated
+    aggregation = await UsageManager.get_usage_aggregation(session, 1, _timestamp("2025-07-01T22:30:00"), _timestamp("2025-07-03T01:15:00"))
+
+    # THEN the aggregations are summed, the carbon footprint being averaged over the requests with a footprint
+    assert session.execute.await_count == 3
+    assert aggregation["total_requests"] == 14
+    assert aggregation["total_albert_coins"] == 2.0
+    assert aggregation["total_tokens"] == 1350
+    assert aggregation["total_co2"] == pytest.approx(0.03 / 10 * 1000)
+
+
+@pytest.mark.asyncio
+async def test_add_to_rollups_upserts_hourly_and_daily_rollups():
+    # GIVEN a usage record
+    session = MagicMock(execute=AsyncMock())
+    usage = Usage(datetime=datetime(2025, 7, 1, 10, 42), user_id=1, model="albert-small", endpoint="/v1/chat/completions", prompt_tokens=10, total_tokens=15, cost=0.1)  # fmt: off
+
+    # WHEN the record is added to the rollups
+    await UsageManager.add_to_rollups(session=session, usage=usage)
+
+    # THEN the rollups of the hour and of the day are incremented
+    statements = [call.args[0].compile(dialect=postgresql.dialect()) for call in session.execute.await_args_list]
+    assert [statement.params["period"] for statement in statements] == [datetime(2025, 7, 1, 10), datetime(2025, 7, 1)]
+    assert "usage_hourly" in str(statements[0]) and "usage_daily" in str(statements[1])
+    assert "ON CONFLICT (user_id, period, model, endpoint) DO UPDATE SET requests = (usage_hourly.requests + excluded.requests)" in str(statements[0])
+    assert statements[0].params["kgco2eq_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_add_to_rollups_skips_usage_without_model():
+    session = MagicMock(execute=AsyncMock())
+
+    await UsageManager.add_to_rollups(session=session, usage=Usage(datetime=datetime(2025, 7, 1), user_id=1, endpoint="/v1/models"))
+
+    session.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_maintain_partitions_creates_next_partitions_and_drops_old_ones():
+    # GIVEN monthly partitions of the usage table from October 2024
+    session = MagicMock(execute=AsyncMock(), commit=AsyncMock())
+    partitions = ["usage_2024_10", "usage_2024_11", "usage_2024_12", "usage_2025_01", "usage_2025_02", "usage_2025_03"]
+    session.execute.side_effect = lambda statement: MagicMock(scalars=MagicMock(return_value=partitions))
+
+    # WHEN the partitions are maintained in February 2025 with a retention of 2 months
+    dropped = await UsageManager.maintain_partitions(session=session, retention_months=2, today=date(2025, 2, 14))
+
+    # THEN the missing partitions of the current month and of the next months are created, with the records of their month stored in the
+    # default partition, and the partitions and rollups older than December 2024 are dropped
+    statements = [str(call.args[0]) for call in session.execute.call_args_list]
+    assert "CREATE TABLE IF NOT EXISTS usage_default PARTITION OF usage DEFAULT" in statements
+    assert (
+        [statement for statement in statements if statement.startswith(("CREATE TABLE usage_", "WITH moved", "ALTER TABLE"))]
+        == [
+            "CREATE TABLE usage_2025_04 (LIKE usage INCLUDING DEFAULTS)",
+            "WITH moved AS (DELETE FROM usage_default WHERE datetime >= '2025-04-01' AND datetime < '2025-05-01' RETURNING *) INSERT INTO usage_2025_04 SELECT * FROM moved",  # fmt: off
+            "ALTER TABLE usage ATTACH PARTITION usage_2025_04 FOR VALUES FROM ('2025-04-01') TO ('2025-05-01')",
+        ]
+    )
+    assert dropped == ["usage_2024_10", "usage_2024_11"]
+    assert statements[-5:-3] == ["DROP TABLE usage_2024_10", "DROP TABLE usage_2024_11"]
+    assert statements[-3:] == [
+        "DELETE FROM usage_default WHERE datetime < '2024-12-01 00:00:00'",
+        "DELETE FROM usage_hourly WHERE usage_hourly.period < :period_1",
+        "DELETE FROM usage_daily WHERE usage_daily.period < :period_1",
+    ]
+    assert session.execute.call_args_list[-1].args[0].compile().params["period_1"] == datetime(2024, 12, 1)
+    session.commit.assert_awaited_once()
+
+
+def test_add_months():
+    assert UsageManager.add_months(date(2025, 11, 30), 2) == date(2026, 1, 1)
+    assert UsageManager.add_months(date(2025, 1, 15), -1) == date(2024, 12, 1)
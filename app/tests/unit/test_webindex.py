@@ -0,0 +1,52 @@
+import pytest
+
+from app.helpers._webindex import WebIndex
+from app.schemas.chunks import Chunk
+from app.schemas.search import SearchMethod
+
+
+@pytest.fixture
+def index():
+    chunks = [
+        Chunk(id=1, content="Albert est une API d'intelligence artificielle", metadata={"document_name": "https://albert.fr.md"}),
+        Chunk(id=2, content="Les impôts se déclarent en ligne chaque année", metadata={"document_name": "https://impots.gouv.fr.md"}),
+        Chunk(id=3, content="La carte d'identité se renouvelle en mairie", metadata={"document_name": "https://service-public.fr.md"}),
+    ]
+    embeddings = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.6, 0.8]]
+
+    return WebIndex(chunks=chunks, embeddings=embeddings)
+
+
+def test_semantic_search(index):
+    # GIVEN a query vector close to the second chunk
+    searches = index.search(method=SearchMethod.SEMANTIC, query_prompt="", query_vector=[0.0, 2.0, 0.0], k=2)
+
+    # THEN scores are cosine similarities, sorted by decreasing score
+    assert [search.chunk.id for search in searches] == [2, 3]
+    assert searches[0].score == pytest.approx(1.0)
+    assert searches[1].score == pytest.approx(0.6)
+    assert all(search.method == SearchMethod.SEMANTIC for search in searches)
+
+
+def test_lexical_search(index):
+    # GIVEN a query matching the terms of the third chunk only
+    searches = index.search(method=SearchMethod.LEXICAL, query_prompt="Renouveler sa carte identité", query_vector=[1.0, 0.0, 0.0], k=3)
+
+    # THEN only the chunks containing a term of the query are returned
+    assert [search.chunk.id for search in searches] == [3]
+    assert searches[0].score > 0
+
+
+def test_hybrid_search(index):
+    # GIVEN a query whose terms match the third chunk and whose vector is close to the first chunk
+    searches = index.search(method=SearchMethod.HYBRID, query_prompt="carte identité", query_vector=[1.0, 0.0, 0.0], k=2, rff_k=20)
+
+    # THEN the third chunk, ranked in both rankings, comes before the first chunk, ranked first by semantic search only
+    assert [search.chunk.id for search in searches] == [3, 1]
+    assert searches[0].score == pytest.approx(1 / 21 + 1 / 23)
+
+
+def test_search_score_threshold(index):
+    searches = index.search(method=SearchMethod.SEMANTIC, query_prompt="", query_vector=[0.0, 1.0, 0.0], k=3, score_threshold=0.7)
+
+    assert [search.chunk.id for search in searches] == [2]
@@ -1,9 +1,12 @@
+import asyncio
+import httpx
 import pytest
-import requests
+import time
 from fastapi import UploadFile
 from typing import List
 
-from app.helpers._websearchmanager import WebSearchManager
+from app.helpers._contentcache import ContentCache
+from app.helpers._websearchmanager import WEB_PAGE_CACHE_REQUESTS, WebSearchManager
 
 
 timeout = 5
@@ -18,31 +21,35 @@ class DummyWebSearch:
         return self.urls[:k]
 
 
-class FakeResponse:
-    def __init__(self, status_code, text):
-        self.status_code = status_code
-        self.text = text
+@pytest.fixture
+def mock_transport(monkeypatch):
+    """Replace the shared HTTP client of the web search managers by a client with a mock transport."""
+
+    def set_handler(handler):
+        monkeypatch.setattr(WebSearchManager, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True))
+
+    return set_handler
 
 
 @pytest.mark.asyncio
-async def test_get_results_success(monkeypatch):
+async def test_get_results_success(mock_transport):
     urls = ["http://service-public.fr/page"]
     web_search = DummyWebSearch(urls)
     manager = WebSearchManager(web_search, None)
     # restrict to the domain
     manager.limited_domains = ["service-public.fr"]
 
-    def fake_get(url, headers, timeout):
-        assert url == urls[0]
-        return FakeResponse(200, "hello world")
+    def handler(request):
+        assert str(request.url) == urls[0]
+        return httpx.Response(200, text="hello world")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    mock_transport(handler)
     results = await manager.get_results(query="query", k=1)
 
     assert len(results) == 1
     file_item = results[0]
     assert isinstance(file_item, UploadFile)
-    assert file_item.filename == f"{urls[0]}.html"
+    assert file_item.filename == f"{urls[0]}.md"
 
     # Read the content from the in-memory file
     content = await file_item.read()
@@ -50,77 +57,190 @@ async def test_get_results_success(monkeypatch):
 
 
 @pytest.mark.asyncio
-async def test_get_results_filters_invalid_url(monkeypatch):
+async def test_get_results_filters_invalid_url(mock_transport):
     urls = ["not a url"]
     web_search = DummyWebSearch(urls)
     manager = WebSearchManager(web_search, None)
 
     # ensure no request is made
-    def fake_get(*args, **kwargs):
-        pytest.skip("requests.get should not be called for invalid URL")
+    def handler(request):
+        pytest.skip("no request should be made for invalid URL")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    mock_transport(handler)
     results = await manager.get_results(query="query", k=1)
     assert results == []
 
 
 @pytest.mark.asyncio
-async def test_get_results_filters_unauthorized_domain(monkeypatch):
+async def test_get_results_filters_unauthorized_domain(mock_transport):
     urls = ["http://unauthorized.com/page?injection=service-public.fr"]
     web_search = DummyWebSearch(urls)
     manager = WebSearchManager(web_search, None)
     # only allow a different domain
     manager.limited_domains = ["allowed.com"]
 
-    def fake_get(*args, **kwargs):
-        pytest.skip("requests.get should not be called for unauthorized domain")
+    def handler(request):
+        pytest.skip("no request should be made for unauthorized domain")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    mock_transport(handler)
     results = await manager.get_results(query="query", k=1)
     assert results == []
 
 
 @pytest.mark.asyncio
-async def test_get_results_handles_request_exception(monkeypatch):
+async def test_get_results_handles_request_exception(mock_transport):
     urls = ["http://allowed.com/page"]
     web_search = DummyWebSearch(urls)
     manager = WebSearchManager(web_search, None)
     manager.limited_domains = ["allowed.com"]
 
-    def fake_get(url, headers, timeout):
-        raise requests.RequestException("network error")
+    def handler(request):
+        raise httpx.ConnectError("network error")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    mock_transport(handler)
     results = await manager.get_results(query="query", k=1)
     assert results == []
 
 
 @pytest.mark.asyncio
-async def test_get_results_handles_non_200_status(monkeypatch):
+async def test_get_results_handles_non_200_status(mock_transport):
     urls = ["http://allowed.com/page"]
     web_search = DummyWebSearch(urls)
     manager = WebSearchManager(web_search, None)
     manager.limited_domains = ["allowed.com"]
 
-    def fake_get(url, headers, timeout):
-        return FakeResponse(404, "not found")
+    def handler(request):
+        return httpx.Response(404, text="not found")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    mock_transport(handler)
     results = await manager.get_results(query="query", k=1)
     assert results == []
 
 
 @pytest.mark.asyncio
-async def test_get_results_subdomain_allowed(monkeypatch):
+async def test_get_results_subdomain_allowed(mock_transport):
     urls = ["http://sub.allowed.com/page"]
     web_search = DummyWebSearch(urls)
     manager = WebSearchManager(web_search, None)
     manager.limited_domains = ["allowed.com"]
 
-    def fake_get(url, headers, timeout):
-        return FakeResponse(200, "<html/>")
+    def handler(request):
+        return httpx.Response(200, text="<html/>")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    mock_transport(handler)
     results = await manager.get_results(query="query", k=1)
     assert len(results) == 1
-    assert results[0].filename == f"{urls[0]}.html"
+    assert results[0].filename == f"{urls[0]}.md"
+
+
+@pytest.mark.asyncio
+async def test_get_results_skips_redirect_to_unauthorized_domain(mock_transport):
+    urls = ["http://allowed.com/page"]
+    web_search = DummyWebSearch(urls)
+    manager = WebSearchManager(web_search, None)
+    manager.limited_domains = ["allowed.com"]
+
+    def handler(request):
+        if request.url.host == "allowed.com":
+            return httpx.Response(302, headers={"Location": "http://unauthorized.com/page"})
+        return httpx.Response(200, text="<html/>")
+
+    mock_transport(handler)
+    results = await manager.get_results(query="query", k=1)
+    assert results == []
+
+
+@pytest.mark.asyncio
+async def test_get_results_skips_too_large_pages(mock_transport):
+    urls = ["http://allowed.com/small", "http://allowed.com/large"]
+    web_search = DummyWebSearch(urls)
+    manager = WebSearchManager(web_search, None, max_size=10)
+
+    def handler(request):
+        return httpx.Response(200, text="small" if request.url.path == "/small" else "a" * 100)
+
+    mock_transport(handler)
+    results = await manager.get_results(query="query", k=2)
+    assert [result.filename for result in results] == ["http://allowed.com/small.md"]
+
+
+@pytest.mark.asyncio
+async def test_get_results_concurrent_in_rank_order_with_deadline(mock_transport):
+    urls = ["http://a.com/slow", "http://b.com/fast", "http://c.com/too-slow", "http://a.com/fast"]
+    web_search = DummyWebSearch(urls)
+    manager = WebSearchManager(web_search, None, max_concurrency=4, max_concurrency_per_host=1, timeout=0.5)
+    delays = {"http://a.com/slow": 0.2, "http://b.com/fast": 0.0, "http://c.com/too-slow": 5, "http://a.com/fast": 0.0}
+    active = {"a.com": 0}
+    max_active = {"a.com": 0}
+
+    async def handler(request):
+        host = request.url.host
+        if host == "a.com":
+            active[host] += 1
+            max_active[host] = max(max_active[host], active[host])
+        await asyncio.sleep(delays[str(request.url)])
+        if host == "a.com":
+            active[host] -= 1
+        return httpx.Response(200, text=str(request.url))
+
+    mock_transport(handler)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await manager.get_results(query="query", k=4)
+
+    # pages are fetched concurrently, the page not fetched before the deadline is skipped, and results are in rank order
+    assert loop.time() - start < 1
+    assert [result.filename for result in results] == ["http://a.com/slow.md", "http://b.com/fast.md", "http://a.com/fast.md"]
+    assert max_active["a.com"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_results_cache_with_revalidation(mock_transport, tmp_path):
+    urls = ["http://allowed.com/page"]
+    web_search = DummyWebSearch(urls)
+    manager = WebSearchManager(web_search, None, cache=ContentCache(directory=str(tmp_path), max_size=10_000), cache_ttl=60)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text="<html><script>var a = 1;</script><h1>Title</h1></html>", headers={"ETag": '"v1"'})
+
+    mock_transport(handler)
+    hits = WEB_PAGE_CACHE_REQUESTS.labels(result="hit")._value.get()
+    revalidated = WEB_PAGE_CACHE_REQUESTS.labels(result="revalidated")._value.get()
+
+    # first fetch stores the cleaned text, second fetch is served from the cache
+    first = await (await manager.get_results(query="query", k=1))[0].read()
+    second = await (await manager.get_results(query="query", k=1))[0].read()
+    assert first == second
+    assert b"Title" in first and b"var a" not in first
+    assert len(requests) == 1
+    assert WEB_PAGE_CACHE_REQUESTS.labels(result="hit")._value.get() == hits + 1
+
+    # stale entry is revalidated with a conditional request
+    manager.cache_ttl = 0
+    third = await (await manager.get_results(query="query", k=1))[0].read()
+    assert third == first
+    assert len(requests) == 2 and requests[1].headers["If-None-Match"] == '"v1"'
+    assert WEB_PAGE_CACHE_REQUESTS.labels(result="revalidated")._value.get() == revalidated + 1
+
+
+@pytest.mark.asyncio
+async def test_get_results_negative_cache(mock_transport, tmp_path):
+    urls = ["http://allowed.com/page"]
+    web_search = DummyWebSearch(urls)
+    manager = WebSearchManager(web_search, None, cache=ContentCache(directory=str(tmp_path), max_size=10_000), cache_negative_ttl=60)
+    requests = []
+
+    def handler(request):
+        requests.append(time.time())
+        return httpx.Response(500)
+
+    mock_transport(handler)
+
+    # failing page is not fetched again before the negative cache ttl
+    assert await manager.get_results(query="query", k=1) == []
+    assert await manager.get_results(query="query", k=1) == []
+    assert len(requests) == 1
@@ -0,0 +1,29 @@
+import mmap
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO
+
+import pymupdf
+
+
+def open_pdf(file: BinaryIO) -> pymupdf.Document:
+    """
+    Open a PDF document from a file handle. Uploaded files are spooled on disk once they exceed the spool size: the file is then memory mapped
+    and opened without being copied in memory, small files spooled in memory are read.
+
+    Args:
+        file(BinaryIO): The file handle of the PDF document.
+
+    Returns:
+        pymupdf.Document: The PDF document, the memory map is released when the document is garbage collected.
+    """
+    file.seek(0)
+    if isinstance(file, SpooledTemporaryFile) and file.name is None:  # spooled in memory, fileno() would write the file on disk
+        return pymupdf.open(stream=file.read(), filetype="pdf")
+
+    try:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):  # in-memory file or empty file
+        file.seek(0)
+        return pymupdf.open(stream=file.read(), filetype="pdf")
+
+    return pymupdf.open(stream=memoryview(buffer), filetype="pdf")
@@ -6,10 +6,12 @@ import logging
 from typing import Optional
 
 from fastapi import HTTPException, Request, Response
+import orjson
 from sqlalchemy import func, select, update
 from starlette.responses import StreamingResponse
 
 from app.helpers._streamingresponsewithstatuscode import StreamingResponseWithStatusCode
+from app.helpers._usagemanager import UsageManager
 from app.sql.models import Usage, User
 from app.sql.session import get_db_session
 from app.utils.configuration import configuration
@@ -154,6 +156,7 @@ def extract_usage_from_streaming_response(response: StreamingResponse, start_tim
                         usage.kwh_max = data["usage"].get("carbon", {}).get("kWh", {}).get("max", None)
                         usage.kgco2eq_min = data["usage"].get("carbon", {}).get("kgCO2eq", {}).get("min", None)
                         usage.kgco2eq_max = data["usage"].get("carbon", {}).get("kgCO2eq", {}).get("max", None)
+                        usage.cached = data["usage"].get("cached", False)
 
         # Set usage.status with the captured status code before calling write_usage
         if response_status_code is not None:
@@ -175,7 +178,7 @@ async def extract_usage_from_response(response: Response, start_time: datetime,
     try:
         body = {}
         if hasattr(response, "body") and response.body:
-            body = json.loads(response.body)
+            body = orjson.loads(response.body)
 
         usage.model = body.get("model", None)
         response_usage = body.get("usage", {})
@@ -187,6 +190,7 @@ async def extract_usage_from_response(response: Response, start_time: datetime,
         usage.kwh_max = response_usage.get("carbon", {}).get("kWh", {}).get("max", None)
         usage.kgco2eq_min = response_usage.get("carbon", {}).get("kgCO2eq", {}).get("min", None)
         usage.kgco2eq_max = response_usage.get("carbon", {}).get("kgCO2eq", {}).get("max", None)
+        usage.cached = response_usage.get("cached", False)
 
     except Exception as e:
         logger.warning(f"Failed to parse JSON response body: {response.body} ({e})")
@@ -217,6 +221,8 @@ async def log_usage(response: Optional[Response], usage: Usage, start_time: date
     async for session in get_db_session():
         session.add(usage)
         try:
+            # rollups are updated in the transaction of the usage record, to stay consistent with the usage table
+            await UsageManager.add_to_rollups(session=session, usage=usage)
             await session.commit()
         except Exception as e:
             logger.error(f"Failed to log usage: {e}")
@@ -233,6 +239,10 @@ async def update_budget(usage: Usage):
     if usage.cost is None or usage.cost == 0:
         return
 
+    # responses served from the response cache can be free
+    if usage.cached and not configuration.settings.response_cache_charge_hits:
+        return
+
     user_id = usage.user_id
     cost = usage.cost
 
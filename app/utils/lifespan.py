@@ -1,6 +1,10 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
+import os
+import signal
 import traceback
 from types import SimpleNamespace
+from typing import Optional
 
 from coredis import ConnectionPool, Redis
 from fastapi import FastAPI
@@ -11,23 +15,33 @@ from app.clients.parser import BaseParserClient as ParserClient
 from app.clients.vector_store import BaseVectorStoreClient as VectorStoreClient
 from app.clients.web_search_engine import BaseWebSearchEngineClient as WebSearchEngineClient
 from app.helpers._agentmanager import AgentManager
+from app.helpers._contentcache import ContentCache
 from app.helpers._documentmanager import DocumentManager
 from app.helpers._identityaccessmanager import IdentityAccessManager
 from app.helpers._limiter import Limiter
 from app.helpers._multiagentmanager import MultiAgentManager
 from app.helpers._parsermanager import ParserManager
+from app.helpers._responsecache import ResponseCache
+from app.helpers._usagemanager import UsageManager
 from app.helpers._usagetokenizer import UsageTokenizer
 from app.helpers._websearchmanager import WebSearchManager
-from app.helpers.models import ModelRegistry
+from app.helpers.models import EmbeddingsBatcher, ModelRegistry
 from app.helpers.models.routers import ModelRouter
 from app.schemas.core.configuration import Configuration
 from app.schemas.core.context import GlobalContext
+from app.schemas.models import ModelType
+from app.sql.session import get_db_session
 from app.utils.configuration import get_configuration
 from app.utils.context import global_context
 from app.utils.logging import init_logger
 
 logger = init_logger(name=__name__)
 
+_reload_lock = asyncio.Lock()
+
+USAGE_PARTITIONS_INTERVAL = 24 * 60 * 60  # seconds between two maintenances of the usage partitions
+COLLECTION_COUNTERS_INTERVAL = 24 * 60 * 60  # seconds between two repairs of the collection counters
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -46,22 +60,74 @@ async def lifespan(app: FastAPI):
     assert (await redis_test_client.ping()).decode("ascii") == "PONG", "Redis database is not reachable."
     assert await vector_store.check() if vector_store else True, "Vector store database is not reachable."
 
-    dependencies = SimpleNamespace(mcp_bridge=mcp_bridge, parser=parser, redis=redis, vector_store=vector_store, web_search_engine=web_search_engine)
+    # helpers which don't depend on the models are built once and kept by the reloads of the models, the size of the content cache is
+    # computed by scanning its directory, in a thread to not block the event loop
+    content_cache = await asyncio.to_thread(ContentCache, directory=configuration.settings.content_cache_directory, max_size=configuration.settings.content_cache_max_size) if configuration.settings.content_cache_directory else None  # fmt: off
+    parser_manager = ParserManager(parser=parser, max_workers=configuration.settings.parser_max_workers, content_cache=content_cache) if parser else None  # fmt: off
+
+    dependencies = SimpleNamespace(
+        mcp_bridge=mcp_bridge,
+        parser=parser,
+        redis=redis,
+        vector_store=vector_store,
+        web_search_engine=web_search_engine,
+        content_cache=content_cache,
+        parser_manager=parser_manager,
+    )
 
     # setup global context
     await _setup_model_registry(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_identity_access_manager(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_limiter(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_tokenizer(configuration=configuration, global_context=global_context, dependencies=dependencies)
+    await _setup_response_cache(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_agent_manager(configuration=configuration, global_context=global_context, dependencies=dependencies)
     await _setup_document_manager(configuration=configuration, global_context=global_context, dependencies=dependencies)
 
+    # hot reload of models (SIGHUP signal or configuration file watch)
+    reload_tasks = set()
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGHUP, lambda: _schedule_reload(tasks=reload_tasks, dependencies=dependencies))
+    except (NotImplementedError, RuntimeError, ValueError):  # not supported platform or not in main thread
+        logger.debug(msg="SIGHUP signal handler not available, models reload by signal is disabled.")
+
+    watcher = None
+    if configuration.settings.models_reload_interval:
+        watcher = asyncio.create_task(
+            _watch_configuration_file(configuration=configuration, dependencies=dependencies, interval=configuration.settings.models_reload_interval)
+        )
+
+    # monthly partitions of the usage table
+    partitions_watcher = None
+    if configuration.settings.monitoring_postgres_enabled:
+        retention_months = configuration.settings.monitoring_postgres_usage_retention_months
+        await _maintain_usage_partitions(retention_months=retention_months)
+        partitions_watcher = asyncio.create_task(_watch_usage_partitions(retention_months=retention_months, interval=USAGE_PARTITIONS_INTERVAL))
+
+    # document and chunk counters of the collections, repaired in background as the first repair counts the chunks of the existing documents
+    counters_watcher = None
+    if global_context.document_manager:
+        counters_watcher = asyncio.create_task(_watch_collection_counters(interval=COLLECTION_COUNTERS_INTERVAL))
+
     yield
 
     # cleanup resources when app shuts down
+    with suppress(NotImplementedError, RuntimeError, ValueError):
+        loop.remove_signal_handler(signal.SIGHUP)
+
+    for task in [watcher, partitions_watcher, counters_watcher]:
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
     if vector_store:
         await vector_store.close()
 
+    ParserManager.shutdown()
+    await WebSearchManager.close()
+
 
 async def _setup_model_registry(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
     routers = []
@@ -69,12 +135,18 @@ async def _setup_model_registry(configuration: Configuration, global_context: Gl
         providers = []
         for provider in model.providers:
             try:
-                # model provider can be not reatachable to API start up
-                provider = ModelClient.import_module(type=provider.type)(
+                # model provider can be not reatachable to API start up, client initialization is blocking so run it in a thread to not block requests during reload
+                provider = await asyncio.to_thread(
+                    ModelClient.import_module(type=provider.type),
                     redis=dependencies.redis,
                     metrics_retention_ms=configuration.settings.metrics_retention_ms,
                     **provider.model_dump(),
                 )
+                if configuration.settings.embeddings_batching_max_wait_ms and model.type == ModelType.TEXT_EMBEDDINGS_INFERENCE:
+                    provider.batcher = EmbeddingsBatcher(
+                        max_wait_ms=configuration.settings.embeddings_batching_max_wait_ms,
+                        max_batch_size=configuration.settings.embeddings_batching_max_size,
+                    )
                 providers.append(provider)
             except Exception:
                 logger.debug(msg=traceback.format_exc())
@@ -102,6 +174,103 @@ async def _setup_model_registry(configuration: Configuration, global_context: Gl
     global_context.model_registry = ModelRegistry(routers=routers)
 
 
+async def reload_models(dependencies: SimpleNamespace) -> bool:
+    """
+    Reload the models from the configuration file without restarting the API.
+
+    A new model registry (and the managers that depend on it) is built aside, then swapped in the global context. The helpers which don't
+    depend on the models (content cache, parser manager) are kept. In-flight requests keep
+    references to the previous model clients and finish on them, the previous clients are released once they are no longer referenced.
+    If the new configuration is invalid or a required model is unreachable, the current models are kept.
+
+    Args:
+        dependencies(SimpleNamespace): The dependencies initialized at API start up.
+
+    Returns:
+        bool: True if the models have been reloaded, False otherwise.
+    """
+    async with _reload_lock:
+        try:
+            configuration = Configuration()
+            staging = GlobalContext()
+            await _setup_model_registry(configuration=configuration, global_context=staging, dependencies=dependencies)
+            await _setup_agent_manager(configuration=configuration, global_context=staging, dependencies=dependencies)
+            await _setup_document_manager(configuration=configuration, global_context=staging, dependencies=dependencies)
+        except Exception:
+            logger.error(msg=f"models reload failed, keep current models: {traceback.format_exc()}")
+            return False
+
+        # no await between assignments, so a request sees either the previous or the new registry with its managers
+        global_context.model_registry = staging.model_registry
+        global_context.agent_manager = staging.agent_manager
+        global_context.document_manager = staging.document_manager
+
+    logger.info(msg=f"models reloaded ({len(staging.model_registry.models)} models).")
+
+    return True
+
+
+def _schedule_reload(tasks: set, dependencies: SimpleNamespace) -> None:
+    # keep a reference to the task to avoid garbage collection before completion
+    task = asyncio.create_task(reload_models(dependencies=dependencies))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+async def _watch_configuration_file(configuration: Configuration, dependencies: SimpleNamespace, interval: int) -> None:
+    last_modified = os.path.getmtime(configuration.config_file)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            modified = os.path.getmtime(configuration.config_file)
+        except OSError:  # file can be temporarily missing during an atomic replacement
+            continue
+
+        if modified != last_modified:
+            last_modified = modified
+            logger.info(msg=f"configuration file ({configuration.config_file}) changed, reload models.")
+            await reload_models(dependencies=dependencies)
+
+
+async def _maintain_usage_partitions(retention_months: Optional[int]) -> None:
+    async for session in get_db_session():
+        try:
+            dropped = await UsageManager.maintain_partitions(session=session, retention_months=retention_months)
+            if dropped:
+                logger.info(msg=f"usage partitions older than the retention dropped: {", ".join(dropped)}.")
+        except Exception as e:
+            # like the usage logging, a failure does not prevent the API from running
+            logger.error(msg=f"Failed to maintain the partitions of the usage table: {e}")
+            await session.rollback()
+
+
+async def _watch_usage_partitions(retention_months: Optional[int], interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await _maintain_usage_partitions(retention_months=retention_months)
+
+
+async def _repair_collection_counters() -> None:
+    # the document manager is read at each repair, as it is replaced by the reload of the models
+    if not global_context.document_manager:
+        return
+
+    async for session in get_db_session():
+        try:
+            repaired = await global_context.document_manager.repair_collection_counters(session=session)
+            if repaired:
+                logger.info(msg=f"counters of {repaired} collections repaired.")
+        except Exception as e:
+            logger.error(msg=f"Failed to repair the counters of the collections: {e}")
+            await session.rollback()
+
+
+async def _watch_collection_counters(interval: int) -> None:
+    while True:
+        await _repair_collection_counters()
+        await asyncio.sleep(interval)
+
+
 async def _setup_identity_access_manager(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
     global_context.identity_access_manager = IdentityAccessManager(
         master_key=configuration.settings.auth_master_key,
@@ -119,19 +288,34 @@ async def _setup_tokenizer(configuration: Configuration, global_context: GlobalC
     global_context.tokenizer = UsageTokenizer(tokenizer=configuration.settings.usage_tokenizer)
 
 
+async def _setup_response_cache(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
+    if not configuration.settings.response_cache_ttl:
+        global_context.response_cache = None
+        return
+
+    global_context.response_cache = ResponseCache(
+        redis=dependencies.redis,
+        ttl=configuration.settings.response_cache_ttl,
+        max_size=configuration.settings.response_cache_max_size,
+    )
+
+
 async def _setup_agent_manager(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
     assert global_context.model_registry, "Set model registry in global context before setting up agent manager."
     global_context.agent_manager = AgentManager(
         mcp_bridge=dependencies.mcp_bridge,
         model_registry=global_context.model_registry,
         max_iterations=configuration.settings.mcp_max_iterations,
+        tools_cache_ttl=configuration.settings.mcp_tools_cache_ttl,
+        tool_call_timeout=configuration.settings.mcp_tool_call_timeout,
     )
 
 
 async def _setup_document_manager(configuration: Configuration, global_context: GlobalContext, dependencies: SimpleNamespace):
     assert global_context.model_registry, "Set model registry in global context before setting up document manager."
 
-    web_search_manager, parser_manager, multi_agent_manager = None, None, None
+    web_search_manager, multi_agent_manager = None, None
+    content_cache, parser_manager = dependencies.content_cache, dependencies.parser_manager
 
     if dependencies.vector_store is None:
         global_context.document_manager = None
@@ -143,15 +327,23 @@ async def _setup_document_manager(configuration: Configuration, global_context:
             query_model=global_context.model_registry(model=configuration.settings.search_web_query_model),
             limited_domains=configuration.settings.search_web_limited_domains,
             user_agent=configuration.settings.search_web_user_agent,
+            max_concurrency=configuration.settings.search_web_max_concurrency,
+            max_concurrency_per_host=configuration.settings.search_web_max_concurrency_per_host,
+            timeout=configuration.settings.search_web_timeout,
+            max_size=configuration.settings.search_web_max_size,
+            cache=content_cache,
+            cache_ttl=configuration.settings.search_web_cache_ttl,
+            cache_negative_ttl=configuration.settings.search_web_cache_negative_ttl,
         )
 
-    if dependencies.parser:
-        parser_manager = ParserManager(parser=dependencies.parser)
-
     if configuration.settings.search_multi_agents_synthesis_model:
         multi_agent_manager = MultiAgentManager(
             synthesis_model=global_context.model_registry(model=configuration.settings.search_multi_agents_synthesis_model),
             reranker_model=global_context.model_registry(model=configuration.settings.search_multi_agents_reranker_model),
+            max_concurrency=configuration.settings.search_multi_agents_reranker_max_concurrency,
+            quorum=configuration.settings.search_multi_agents_quorum,
+            timeout=configuration.settings.search_multi_agents_timeout,
+            content_cache=content_cache,
         )
 
     global_context.document_manager = DocumentManager(
@@ -160,4 +352,5 @@ async def _setup_document_manager(configuration: Configuration, global_context:
         parser_manager=parser_manager,
         web_search_manager=web_search_manager,
         multi_agent_manager=multi_agent_manager,
+        content_cache=content_cache,
     )
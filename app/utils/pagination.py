@@ -0,0 +1,96 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, List, Literal, Optional
+
+import orjson
+from pydantic import BaseModel
+from sqlalchemy import DateTime, Select, literal, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.utils.exceptions import InvalidCursorException
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Encode the values of the order columns of the last item of a page into an opaque cursor.
+
+    Args:
+        values(Any): The values of the order columns, the last one being the unique ID of the item.
+
+    Returns:
+        str: The cursor, to get the next page.
+    """
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode()
+
+
+def decode_cursor(cursor: str, columns: List[ColumnElement]) -> List[Any]:
+    """
+    Decode a cursor into the values of the order columns.
+
+    Args:
+        cursor(str): The cursor.
+        columns(List[ColumnElement]): The order columns.
+
+    Returns:
+        List[Any]: The values of the order columns.
+    """
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, orjson.JSONDecodeError, UnicodeEncodeError):
+        raise InvalidCursorException()
+
+    if not isinstance(values, list) or len(values) != len(columns) or any(value is None for value in values):
+        raise InvalidCursorException()
+
+    try:
+        return [datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value for column, value in zip(columns, values)]
+    except (TypeError, ValueError):
+        raise InvalidCursorException()
+
+
+def paginate(statement: Select, columns: List[ColumnElement], order_direction: Literal["asc", "desc"] = "asc", offset: int = 0, limit: int = 10, cursor: Optional[str] = None) -> Select:  # fmt: off
+    """
+    Order and paginate a statement. With a cursor, the page starts after the item of the cursor (keyset pagination): unlike an offset, the
+    rows before the page are not scanned, and the rows inserted or deleted meanwhile do not shift the pages. The offset is kept for backward
+    compatibility, it is ignored if a cursor is provided.
+
+    Args:
+        statement(Select): The statement to paginate.
+        columns(List[ColumnElement]): The order columns, the last one being unique (ID) so that the order is deterministic.
+        order_direction(Literal["asc", "desc"]): The order direction.
+        offset(int): The offset of the page, if no cursor is provided.
+        limit(int): The size of the page.
+        cursor(Optional[str]): The cursor returned with the previous page.
+
+    Returns:
+        Select: The ordered and paginated statement.
+    """
+    statement = statement.order_by(*[getattr(column, order_direction)() for column in columns]).limit(limit=limit)
+    if cursor is None:
+        return statement.offset(offset=offset)
+
+    values = tuple_(*[literal(value, type_=column.type) for column, value in zip(columns, decode_cursor(cursor=cursor, columns=columns))])
+    return statement.where(tuple_(*columns) > values if order_direction == "asc" else tuple_(*columns) < values)
+
+
+def get_next_cursor(data: List[BaseModel], limit: int, order_by: str = "id") -> Optional[str]:
+    """
+    Get the cursor of the next page from the items of a page.
+
+    Args:
+        data(List[BaseModel]): The items of the page.
+        limit(int): The size of the page.
+        order_by(str): The order field of the items (null values being ordered as empty strings), the items being also ordered by ID.
+
+    Returns:
+        Optional[str]: The cursor of the next page, None if the page is the last one.
+    """
+    if len(data) < limit:
+        return None
+
+    if order_by == "id":
+        return encode_cursor(data[-1].id)
+
+    value = getattr(data[-1], order_by)
+    return encode_cursor("" if value is None else value, data[-1].id)
@@ -0,0 +1,71 @@
+"""
+Benchmark of the CPU time spent to format an embeddings response, between the model API response and the API response body.
+
+Usage: python scripts/benchmark_embeddings_response.py --inputs 256 --dimensions 1024 --iterations 20
+"""
+
+import argparse
+import json
+import random
+import time
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+import httpx
+import orjson
+
+from app.schemas.embeddings import Embeddings
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--inputs", type=int, default=256, help="Number of inputs of the embeddings request.")
+parser.add_argument("--dimensions", type=int, default=1024, help="Number of dimensions of the embeddings.")
+parser.add_argument("--iterations", type=int, default=20, help="Number of iterations.")
+
+USAGE = {"prompt_tokens": 2560, "completion_tokens": 0, "total_tokens": 2560, "cost": 0.0, "carbon": {"kWh": {"min": None, "max": None}, "kgCO2eq": {"min": None, "max": None}}, "details": []}  # fmt: off
+
+
+def previous_path(content: bytes) -> bytes:
+    # model client: decode, add usage and id, encode
+    response = httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=content)
+    data = response.json()
+    data.update({"model": "embeddings-small", "id": "request-123", "usage": USAGE})
+    response = httpx.Response(status_code=200, content=json.dumps(data))
+
+    # endpoint: decode, validate, encode
+    return JSONResponse(content=Embeddings(**response.json()).model_dump(), status_code=response.status_code).body
+
+
+def fast_path(content: bytes) -> bytes:
+    # model client: decode, add usage and id, encode
+    response = httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=content)
+    data = orjson.loads(response.content)
+    data.update({"model": "embeddings-small", "id": "request-123", "usage": USAGE})
+    response = httpx.Response(status_code=200, headers={"Content-Type": "application/json"}, content=orjson.dumps(data))
+
+    # endpoint: pass through
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json").body
+
+
+def benchmark(function, content: bytes, iterations: int) -> float:
+    function(content)  # warm up
+    start = time.process_time()
+    for _ in range(iterations):
+        function(content)
+
+    return (time.process_time() - start) / iterations * 1000
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    data = [{"object": "embedding", "index": index, "embedding": [random.uniform(-1, 1) for _ in range(args.dimensions)]} for index in range(args.inputs)]  # fmt: off
+    content = json.dumps({"object": "list", "data": data, "model": "embeddings-small", "usage": {"prompt_tokens": 2560, "total_tokens": 2560}}).encode()  # fmt: off
+
+    assert orjson.loads(previous_path(content))["data"] == orjson.loads(fast_path(content))["data"]
+
+    previous = benchmark(function=previous_path, content=content, iterations=args.iterations)
+    fast = benchmark(function=fast_path, content=content, iterations=args.iterations)
+
+    print(f"embeddings response of {args.inputs} inputs x {args.dimensions} dimensions ({len(content) / 1e6:.1f} MB)")
+    print(f"previous path: {previous:.1f} ms CPU per request")
+    print(f"fast path:     {fast:.1f} ms CPU per request ({previous / fast:.1f}x)")